@@ -1,12 +1,16 @@
 locals {
   policies_obj  = can(jsondecode(var.policies)) ? jsondecode(var.policies) : yamldecode(var.policies)
   policies_json = can(jsondecode(var.policies)) ? var.policies : jsonencode(yamldecode(var.policies))
-  policy_name   = var.policy_name != "" ? var.policy_name : local.policies_obj.policies[0].name
+  bundle        = length(var.bundle_policy_names) > 0
+  policy_name = local.bundle ? var.bundle_policy_names[0] : (
+    var.policy_name != "" ? var.policy_name : local.policies_obj.policies[0].name
+  )
   policy_obj = one([
     for p in local.policies_obj.policies : p if p.name == local.policy_name
   ])
   function_prefix  = try(local.policy_obj.mode["function-prefix"], "custodian-")
-  function_name    = "${local.function_prefix}${local.policy_obj.name}"
+  function_base    = local.bundle ? coalesce(var.bundle_name, "bundle-${local.policy_name}") : local.policy_obj.name
+  function_name    = "${local.function_prefix}${local.function_base}"
   description      = "cloud-custodian lambda policy"
   handler          = try(local.policy_obj.mode.handler, "custodian_policy.run")
   layers           = try(local.policy_obj.mode.layers, [])
@@ -35,7 +39,7 @@ locals {
   mode_type = try(local.policy_obj.mode.type, null)
 
   periodic_mode = local.mode_type == "periodic" && local.schedule != null && local.schedule != ""
-  schedule      = try(local.policy_obj.mode.schedule, null)
+  schedule      = var.schedule != "" ? var.schedule : try(local.policy_obj.mode.schedule, null)
 
   schedule_mode        = local.mode_type == "schedule" && local.schedule != null && local.schedule != ""
   schedule_timezone    = try(local.policy_obj.mode.timezone, "Etc/UTC")
@@ -76,7 +80,7 @@ data "external" "validate_policy" {
   program = ["python3", "${path.module}/ops/validate_lambda_policy.py"]
   query = {
     policies    = var.policies
-    policy_name = var.policy_name
+    policy_name = local.bundle ? local.policy_name : var.policy_name
   }
 }
 
@@ -86,15 +90,27 @@ data "aws_iam_role" "custodian_role" {
 }
 
 data "external" "package_lambda" {
-  program = ["python3", "${path.module}/ops/package_lambda_policy.py"]
+  program = [
+    "python3",
+    "${path.module}/ops/${local.bundle ? "package_lambda_bundle.py" : "package_lambda_policy.py"}"
+  ]
   query = {
-    policies          = var.policies
-    policy_name       = var.policy_name
-    execution_options = jsonencode(var.execution_options)
-    function_name     = local.function_name
-    role              = local.role
-    valid             = data.external.validate_policy.result.valid
-    force_deploy      = tostring(var.force_deploy)
+    policies            = var.policies
+    policy_name         = var.policy_name
+    policy_names        = jsonencode(var.bundle_policy_names)
+    bundle_concurrency  = tostring(var.bundle_concurrency)
+    execution_options   = jsonencode(var.execution_options)
+    function_name       = local.function_name
+    role                = local.role
+    valid               = data.external.validate_policy.result.valid
+    force_deploy        = tostring(var.force_deploy)
+    package_pruning     = jsonencode(var.package_pruning)
+    archive_size_budget = jsonencode(var.archive_size_budget)
+    tags_in_archive     = tostring(var.tags_in_archive)
+    hash_only           = tostring(var.hash_only)
+    policy_snapshot     = tostring(var.policy_snapshot)
+    remote_cache        = var.remote_cache
+    regions             = jsonencode(var.regions)
   }
 }
 
@@ -201,7 +217,8 @@ resource "aws_scheduler_schedule" "schedule" {
   group_name = local.schedule_group_name
 
   flexible_time_window {
-    mode = "OFF"
+    mode                      = var.flexible_time_window_minutes == null ? "OFF" : "FLEXIBLE"
+    maximum_window_in_minutes = var.flexible_time_window_minutes
   }
 
   schedule_expression          = local.schedule
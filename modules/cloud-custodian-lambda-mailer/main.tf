@@ -39,9 +39,11 @@ data "aws_iam_role" "custodian_role" {
 data "external" "package_lambda" {
   program = ["python3", "${path.module}/../../ops/package_lambda_mailer.py"]
   query = {
-    mailer_config = local.mailer_config
-    lambda_name   = local.lambda_name
-    force_deploy  = tostring(var.force_deploy)
+    mailer_config   = local.mailer_config
+    lambda_name     = local.lambda_name
+    force_deploy    = tostring(var.force_deploy)
+    tags_in_archive = tostring(var.tags_in_archive)
+    remote_cache    = var.remote_cache
   }
 }
 
@@ -31,3 +31,21 @@ variable "force_deploy" {
   type        = bool
   default     = false
 }
+
+variable "tags_in_archive" {
+  description = <<EOT
+    Write tags, including custodian-info and force-deploy, to the archived config.json.
+    Set to false to apply tags to the Lambda function only, so tag and force_deploy changes do not change source_code_hash.
+  EOT
+  type        = bool
+  default     = true
+}
+
+variable "remote_cache" {
+  description = <<EOT
+    Optional: Shared archive cache for CI runners, either a directory (path or file:// URL) or an HTTP URL accepting GET and PUT.
+    Archives are fetched on a hit, verified against their recorded hash, and uploaded after a build on a miss.
+  EOT
+  type        = string
+  default     = ""
+}
@@ -2,17 +2,51 @@ locals {
   policies_obj  = can(jsondecode(var.policies)) ? jsondecode(var.policies) : yamldecode(var.policies)
   policies_json = can(jsondecode(var.policies)) ? var.policies : jsonencode(yamldecode(var.policies))
   policy_names  = [for p in local.policies_obj.policies : p.name]
+  bundled_names = toset(flatten(values(var.bundles)))
 }
 
 module "custodian_policy" {
   source = "../.."
 
-  for_each = toset(local.policy_names)
+  for_each = setsubtract(toset(local.policy_names), local.bundled_names)
 
-  policies          = var.policies
-  policy_name       = each.key
-  execution_options = var.execution_options
-  regions           = var.regions
-  architecture      = var.architecture
-  force_deploy      = var.force_deploy
+  policies            = var.policies
+  policy_name         = each.key
+  execution_options   = var.execution_options
+  schedule            = try(var.schedule_plan[each.key].schedule, "")
+  regions             = var.regions
+  architecture        = var.architecture
+  force_deploy        = var.force_deploy
+  package_pruning     = var.package_pruning
+  archive_size_budget = var.archive_size_budget
+  tags_in_archive     = var.tags_in_archive
+  hash_only           = var.hash_only
+  policy_snapshot     = var.policy_snapshot
+  remote_cache        = var.remote_cache
+
+  flexible_time_window_minutes = try(var.schedule_plan[each.key].flexible_time_window_minutes, null)
+}
+
+module "custodian_bundle" {
+  source = "../.."
+
+  for_each = var.bundles
+
+  policies            = var.policies
+  bundle_name         = each.key
+  bundle_policy_names = each.value
+  bundle_concurrency  = var.bundle_concurrency
+  execution_options   = var.execution_options
+  schedule            = try(var.schedule_plan[each.key].schedule, "")
+  regions             = var.regions
+  architecture        = var.architecture
+  force_deploy        = var.force_deploy
+  package_pruning     = var.package_pruning
+  archive_size_budget = var.archive_size_budget
+  tags_in_archive     = var.tags_in_archive
+  hash_only           = var.hash_only
+  policy_snapshot     = var.policy_snapshot
+  remote_cache        = var.remote_cache
+
+  flexible_time_window_minutes = try(var.schedule_plan[each.key].flexible_time_window_minutes, null)
 }
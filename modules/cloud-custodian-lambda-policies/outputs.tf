@@ -15,37 +15,50 @@ output "policies_json" {
 
 output "regions" {
   description = "Map of policy names to their deployed regions"
-  value = {
-    for name, policy in module.custodian_policy :
-    name => policy.regions
-  }
+  value = merge(
+    { for name, policy in module.custodian_policy : name => policy.regions },
+    merge([
+      for bundle, names in var.bundles : { for name in names : name => module.custodian_bundle[bundle].regions }
+    ]...)
+  )
 }
 
 output "mode_type" {
   description = "Map of policy names to their Cloud Custodian mode types"
-  value = {
-    for name, policy in module.custodian_policy :
-    name => policy.mode_type
-  }
+  value = merge(
+    { for name, policy in module.custodian_policy : name => policy.mode_type },
+    merge([
+      for bundle, names in var.bundles : { for name in names : name => module.custodian_bundle[bundle].mode_type }
+    ]...)
+  )
 }
 
 output "lambda_function_arn" {
   description = "Map of policy names to Lambda function ARNs by region"
-  value = {
-    for name, policy in module.custodian_policy :
-    name => policy.lambda_function_arn
-  }
+  value = merge(
+    { for name, policy in module.custodian_policy : name => policy.lambda_function_arn },
+    merge([
+      for bundle, names in var.bundles : { for name in names : name => module.custodian_bundle[bundle].lambda_function_arn }
+    ]...)
+  )
 }
 
 output "lambda_function_name" {
   description = "Map of policy names to Lambda function names by region"
-  value = {
-    for name, policy in module.custodian_policy :
-    name => policy.lambda_function_name
-  }
+  value = merge(
+    { for name, policy in module.custodian_policy : name => policy.lambda_function_name },
+    merge([
+      for bundle, names in var.bundles : { for name in names : name => module.custodian_bundle[bundle].lambda_function_name }
+    ]...)
+  )
 }
 
 output "policies" {
   description = "Map of policy names to their complete module outputs"
   value       = module.custodian_policy
 }
+
+output "bundles" {
+  description = "Map of bundle names to their complete module outputs"
+  value       = module.custodian_bundle
+}
@@ -52,3 +52,85 @@ variable "force_deploy" {
   type        = bool
   default     = false
 }
+
+variable "package_pruning" {
+  description = <<EOT
+    Optional: Prune non-runtime files (tests, type stubs, docs, dist-info) and debug symbols from packages in `mode.packages`. Directories with an `__init__.py` are never pruned.
+    Set to `{}` to enable with the default ruleset. Supports `rules`, `strip_debug`, `dry_run` and per-package overrides under `packages`.
+    When `boto3` or `botocore` are bundled, service models the policy does not use are dropped; keep extra ones with `botocore_services` or disable with `service_models = false`.
+  EOT
+  type        = any
+  default     = null
+}
+
+variable "archive_size_budget" {
+  description = <<EOT
+    Optional: Size limits checked against an estimate of the archive before it is built, `compressed_mb` (default 50) and `uncompressed_mb` (default 250).
+    Packaging fails early with the size of each package when the estimate exceeds them. Set `enabled = false` to skip the check.
+  EOT
+  type        = any
+  default     = null
+}
+
+variable "tags_in_archive" {
+  description = <<EOT
+    Write tags, including custodian-info and force-deploy, to the archived config.json.
+    Set to false to apply tags to the Lambda function only, so tag and force_deploy changes do not change source_code_hash.
+  EOT
+  type        = bool
+  default     = true
+}
+
+variable "hash_only" {
+  description = <<EOT
+    For speculative plans that are never applied: report the archive hash recorded for unchanged inputs without building the zip.
+    An archive is still built when no hash has been recorded for the inputs.
+  EOT
+  type        = bool
+  default     = false
+}
+
+variable "bundles" {
+  description = <<EOT
+    Optional: Map of bundle names to the periodic or schedule policies deployed together as one function, see `bundle_policy_names`.
+    Bundled policies are not deployed on their own. `python3 -m ops.bundle` lists the policies that can share a function.
+  EOT
+  type        = map(list(string))
+  default     = {}
+}
+
+variable "bundle_concurrency" {
+  description = "Number of bundled policies run at once. With 1 they run one after another in the listed order."
+  type        = number
+  default     = 1
+}
+
+variable "schedule_plan" {
+  description = <<EOT
+    Optional: Map of policy or bundle names to a `schedule` replacing `mode.schedule` and a `flexible_time_window_minutes` for schedule mode.
+    `python3 -m ops.schedule_plan` prints a plan that spreads policies firing at the same time.
+  EOT
+  type = map(object({
+    schedule                     = optional(string, "")
+    flexible_time_window_minutes = optional(number)
+  }))
+  default = {}
+}
+
+variable "policy_snapshot" {
+  description = <<EOT
+    Package a pre-resolved snapshot of the policy with a handler that uses it.
+    Resource modules are imported while the function initializes and the account id is read from the function ARN instead of an STS call.
+  EOT
+  type        = bool
+  default     = false
+}
+
+variable "remote_cache" {
+  description = <<EOT
+    Optional: Shared archive cache for CI runners, either a directory (path or file:// URL) or an HTTP URL accepting GET and PUT.
+    Archives are fetched on a hit, verified against their recorded hash, and uploaded after a build on a miss.
+  EOT
+  type        = string
+  default     = ""
+}
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+In-process API for the Cloud Custodian Lambda operations.
+
+The scripts under ops/ are Terraform external data sources that read a query
+from stdin, print the result and exit. The functions here take the same query as
+a dictionary and return the same result, raising instead of exiting:
+
+- ValidationError: the query or the policy is invalid
+- RuntimeError: packaging or rendering failed
+
+so many policies can be processed in one warm interpreter, from threads or a
+long-running service:
+
+    from ops import api
+
+    results = api.run_many(api.validate_policy, [{"policies": p} for p in documents])
+
+Query values may be strings, as Terraform passes them, or dicts, lists and
+booleans, which are encoded the same way.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ops.common import ValidationError
+from ops import (
+    get_cloudwatch_event_pattern,
+    get_config_rule_params,
+    package_lambda_policy,
+    validate_lambda_policy,
+)
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+__all__ = [
+    "ValidationError",
+    "check_policy",
+    "config_rule_params",
+    "event_pattern",
+    "normalize_query",
+    "package_mailer",
+    "package_policy",
+    "run_many",
+    "validate_mailer",
+    "validate_policy",
+]
+
+
+def normalize_query(query):
+    """Encode query values the way Terraform passes them to external data sources.
+
+    Args:
+        query: Dictionary of query parameters
+
+    Returns:
+        dict: Query with string values
+    """
+    normalized = {}
+    for key, value in query.items():
+        if isinstance(value, bool):
+            value = str(value).lower()
+        elif value is None:
+            value = ""
+        elif isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        elif not isinstance(value, str):
+            value = str(value)
+        normalized[key] = value
+    return normalized
+
+
+def check_policy(query):
+    """Validate a policy, returning the messages even if it is invalid.
+
+    Returns:
+        dict: valid ("true" or "false"), info_messages, error_messages and policy_name
+
+    Raises:
+        ValidationError: If the policies cannot be parsed
+    """
+    return validate_lambda_policy.process_policies(normalize_query(query))
+
+
+def validate_policy(query):
+    """Validate a policy, see ops/validate_lambda_policy.py.
+
+    Raises:
+        ValidationError: If the policy is invalid
+    """
+    return validate_lambda_policy.run(normalize_query(query))
+
+
+def package_policy(query):
+    """Package a policy, see ops/package_lambda_policy.py.
+
+    Raises:
+        ValidationError: If required fields are missing or the input is invalid
+        RuntimeError: If packaging fails
+    """
+    return package_lambda_policy.run(normalize_query(query))
+
+
+def event_pattern(query):
+    """Render the event pattern of a policy, see ops/get_cloudwatch_event_pattern.py.
+
+    Raises:
+        ValidationError: If the policy is invalid or has no events
+        RuntimeError: If rendering fails
+    """
+    return get_cloudwatch_event_pattern.process_policies(normalize_query(query))
+
+
+def config_rule_params(query):
+    """Render the config rule parameters of a policy, see ops/get_config_rule_params.py.
+
+    Raises:
+        ValidationError: If the policy is invalid
+        RuntimeError: If rendering fails
+    """
+    return get_config_rule_params.process_policies(normalize_query(query))
+
+
+def validate_mailer(query):
+    """Validate a mailer config, see ops/validate_lambda_mailer.py.
+
+    Raises:
+        ValidationError: If the config or its templates are invalid
+    """
+    # The mailer modules need c7n-mailer, which policy-only users may not install
+    from ops import validate_lambda_mailer
+
+    return validate_lambda_mailer.process_mailer(normalize_query(query))
+
+
+def package_mailer(query):
+    """Package the mailer, see ops/package_lambda_mailer.py.
+
+    Raises:
+        ValidationError: If required fields are missing
+        RuntimeError: If packaging fails
+    """
+    from ops import package_lambda_mailer
+
+    return package_lambda_mailer.run(normalize_query(query))
+
+
+def run_many(func, queries, workers=DEFAULT_WORKERS):
+    """Call an API function for many queries on a thread pool.
+
+    Args:
+        func: API function, such as validate_policy
+        queries: Iterable of query dictionaries
+        workers: Maximum number of queries processed at once
+
+    Returns:
+        list: Per query, in order, {"result": ...} or {"error": message, "error_type": name}
+    """
+
+    def call(query):
+        try:
+            return {"result": func(query)}
+        except (ValidationError, RuntimeError) as e:
+            return {"error": str(e), "error_type": type(e).__name__}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(call, queries))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Estimate the size of a Cloud Custodian lambda archive without building it.
+
+The files a package adds to the archive are read from the RECORD of its
+installed distribution, falling back to a scan of the package directory. Sizes
+are compressed with per-extension ratios measured on c7n, boto3 and botocore.
+A pruner drops the files it would drop from the build, with the same package
+directory rule. Debug symbols the pruner would strip are still counted, so the
+estimate stays on the safe side for packages with native objects.
+
+The estimate is checked against a size budget before packaging, so a policy
+whose mode.packages exceed Lambda's limits fails before the build. The budget
+is read from the archive_size_budget query parameter, a JSON object with
+(all optional):
+- compressed_mb: limit of the zip, default 50, Lambda's direct upload limit
+- uncompressed_mb: limit of the unzipped archive, default 250, Lambda's limit
+- enabled: false disables the check
+
+Can also be run directly to estimate an archive with extra packages:
+
+    python3 -m ops.archive_size boto3 requests
+"""
+
+import argparse
+import importlib.metadata
+import importlib.util
+import json
+import os
+import sys
+
+from ops.common import ValidationError
+
+MB = 1024 * 1024
+DEFAULT_BUDGET = {"compressed_mb": 50, "uncompressed_mb": 250}
+
+# Deflate ratios, compressed over uncompressed size, by file extension
+COMPRESSION_RATIOS = {
+    ".py": 0.26,
+    ".json": 0.1,
+    ".so": 0.35,
+    ".gz": 1.0,
+    ".zip": 1.0,
+    ".whl": 1.0,
+}
+DEFAULT_COMPRESSION_RATIO = 0.5
+
+# Local file header and central directory entry, without the two file names
+ZIP_ENTRY_BYTES = 76
+
+
+def parse_size_budget(query, key="archive_size_budget"):
+    """Parse the archive size budget from the query.
+
+    Args:
+        query: Dictionary with query parameters
+        key: Key in query containing the JSON budget
+
+    Returns:
+        dict: compressed_mb and uncompressed_mb, or None if the check is disabled
+
+    Raises:
+        ValidationError: If the budget is not a JSON object of positive limits
+    """
+    content = query.get(key)
+    try:
+        options = json.loads(content) if isinstance(content, str) and content else content
+    except json.JSONDecodeError as e:
+        raise ValidationError(f"Could not parse '{key}' as JSON: {e}")
+
+    if options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise ValidationError(f"'{key}' must be a JSON object/dictionary")
+    if not options.get("enabled", True):
+        return None
+
+    budget = dict(DEFAULT_BUDGET)
+    for name in DEFAULT_BUDGET:
+        value = options.get(name, budget[name])
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValidationError(f"'{key}.{name}' must be a positive number")
+        budget[name] = value
+    return budget
+
+
+def distribution_files(module):
+    """Return (archive path, size) of the files of a module from distribution RECORDs.
+
+    Args:
+        module: Top-level module name
+
+    Returns:
+        list or None: Files, or None if no installed distribution records them
+    """
+    names = importlib.metadata.packages_distributions().get(module)
+    if not names:
+        return None
+
+    files = []
+    for name in sorted(set(names)):
+        try:
+            records = importlib.metadata.distribution(name).files
+        except importlib.metadata.PackageNotFoundError:  # pragma: no cover
+            records = None
+        if records is None:
+            return None
+        for record in records:
+            if record.parts[0] not in (module, f"{module}.py"):
+                continue
+            size = record.size
+            if size is None:
+                try:
+                    size = os.path.getsize(record.locate())
+                except OSError:
+                    continue
+            files.append((record.as_posix(), size))
+    return files
+
+
+def scanned_files(module):
+    """Return (archive path, size) of the files of a module found on disk.
+
+    Raises:
+        ValidationError: If the module is not installed
+    """
+    spec = importlib.util.find_spec(module)
+    if spec is None:
+        raise ValidationError(f"Package '{module}' is not installed")
+
+    if not spec.submodule_search_locations:
+        return [(os.path.basename(spec.origin), os.path.getsize(spec.origin))]
+
+    files = []
+    for path in spec.submodule_search_locations:
+        for root, dirs, names in os.walk(path):
+            arc_prefix = os.path.relpath(root, os.path.dirname(path))
+            for name in names:
+                files.append(
+                    (
+                        os.path.join(arc_prefix, name).replace(os.sep, "/"),
+                        os.path.getsize(os.path.join(root, name)),
+                    )
+                )
+    return files
+
+
+def archived(path):
+    """Return True if the archive builder adds the file, see PythonPackageArchive."""
+    return "__pycache__" not in path.split("/") and not path.endswith((".pyc", ".c"))
+
+
+def compressed_size(path, size):
+    """Estimate the bytes a file takes in the zip, with its entry headers."""
+    ratio = COMPRESSION_RATIOS.get(os.path.splitext(path)[1], DEFAULT_COMPRESSION_RATIO)
+    return int(size * ratio) + ZIP_ENTRY_BYTES + 2 * len(path.encode())
+
+
+def estimate_archive_size(modules, pruner=None):
+    """Estimate the size of an archive of modules.
+
+    Args:
+        modules: Top-level modules in the archive, as from archive_modules
+        pruner: Optional PackagePruner used for the build
+
+    Returns:
+        dict: compressed and uncompressed bytes, files, and the same per package
+
+    Raises:
+        ValidationError: If a module is not installed
+    """
+    prune = pruner is not None and not pruner.dry_run
+    packages = {}
+    for module in modules:
+        files = distribution_files(module)
+        if files is None:
+            files = scanned_files(module)
+        if prune:
+            pruner.add_package_dirs(path for path, _ in files)
+        stats = {"files": 0, "uncompressed": 0, "compressed": 0}
+        for path, size in files:
+            if not archived(path) or (prune and pruner.should_prune(path)):
+                continue
+            stats["files"] += 1
+            stats["uncompressed"] += size
+            stats["compressed"] += compressed_size(path, size)
+        packages[module] = stats
+
+    return {
+        "files": sum(s["files"] for s in packages.values()),
+        "uncompressed": sum(s["uncompressed"] for s in packages.values()),
+        "compressed": sum(s["compressed"] for s in packages.values()),
+        "packages": packages,
+    }
+
+
+def format_breakdown(estimate):
+    """Format the per package sizes of an estimate, largest first."""
+    lines = []
+    for module, stats in sorted(estimate["packages"].items(), key=lambda i: -i[1]["compressed"]):
+        lines.append(
+            f"{module}: {stats['compressed'] / MB:.1f} MB compressed, "
+            f"{stats['uncompressed'] / MB:.1f} MB uncompressed ({stats['files']} files)"
+        )
+    return lines
+
+
+def check_size_budget(estimate, budget):
+    """Check an estimate against a size budget.
+
+    Args:
+        estimate: Result of estimate_archive_size
+        budget: Result of parse_size_budget
+
+    Raises:
+        ValidationError: If the estimate exceeds the budget, with the per
+            package sizes
+    """
+    exceeded = [
+        f"{estimate[kind] / MB:.1f} MB {kind} exceeds the budget of {budget[f'{kind}_mb']} MB"
+        for kind in ("compressed", "uncompressed")
+        if estimate[kind] > budget[f"{kind}_mb"] * MB
+    ]
+    if exceeded:
+        raise ValidationError(
+            f"Estimated archive size {' and '.join(exceeded)}: "
+            + "; ".join(format_breakdown(estimate))
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the size of a policy archive")
+    parser.add_argument("packages", nargs="*", help="Packages added with mode.packages")
+    args = parser.parse_args()
+
+    try:
+        estimate = estimate_archive_size(sorted({"c7n"}.union(args.packages)))
+    except ValidationError as e:
+        print(f"Failed to estimate archive size: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(estimate, indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
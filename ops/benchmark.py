@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Measure how a built policy archive starts, the way the Lambda runtime runs it.
+
+Each run unpacks the zip into a clean task directory and starts a fresh
+interpreter that can only import the archive contents and the modules the
+Lambda python runtime provides. It imports custodian_policy (the init phase),
+then invokes run with a synthetic event for the policy mode (the first invoke).
+AWS is stubbed: every API call succeeds with empty lists and maps for its
+output, as for an account without matching resources, and the calls are listed in the report.
+
+The report has the median init and first invoke times, peak RSS against the
+function memory, and the import time per top-level package for both phases, so
+archives built with different packaging options can be compared:
+
+    python3 -m ops.benchmark build/custodian-my-policy/<hash>.zip --runs 5
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import statistics
+import subprocess  # nosec B404
+import sys
+import tempfile
+import zipfile
+
+from ops.common import LAMBDA_RUNTIME_MODULES, ValidationError, link_module
+
+try:
+    from c7n.cwe import CloudWatchEvents
+except ImportError:  # pragma: no cover
+    print("Cloud Custodian (c7n) package is not installed. Please install it", file=sys.stderr)
+    sys.exit(1)
+
+# Memory size the module uses when mode.memory is not set
+DEFAULT_MEMORY_MB = 512
+TOP_IMPORTS = 15
+STUB_ACCOUNT_ID = "123456789012"
+INVOKE_MARKER = "benchmark-phase: invoke"
+# Seconds before a cold start is reported as hung
+RUN_TIMEOUT = 300
+
+# Responses for the calls that need more than an empty result
+STUB_RESPONSES = {
+    "sts.GetCallerIdentity": {
+        "Account": STUB_ACCOUNT_ID,
+        "Arn": f"arn:aws:sts::{STUB_ACCOUNT_ID}:assumed-role/custodian/benchmark",
+        "UserId": "benchmark",
+    },
+    "iam.ListAccountAliases": {"AccountAliases": []},
+    # The log shipper thread stops without it and the handler blocks on flush
+    "logs.PutLogEvents": {"nextSequenceToken": "benchmark"},
+}
+
+DRIVER = """\
+import json
+import os
+import resource
+import sys
+import time
+
+task_dir, runtime_dir, event_path = sys.argv[1:4]
+sys.path[:0] = [task_dir, runtime_dir]
+os.chdir(task_dir)
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+start = time.perf_counter()
+import custodian_policy
+init_seconds = time.perf_counter() - start
+init_rss_mb = peak_rss_mb()
+
+import botocore.client
+
+calls = []
+responses = {responses!r}
+
+
+def stub_api_call(self, operation_name, api_params):
+    name = "%s.%s" % (self.meta.service_model.service_name, operation_name)
+    calls.append(name)
+    # Empty collections for the output members, as for an account without resources
+    response = {{}}
+    shape = self.meta.service_model.operation_model(operation_name).output_shape
+    for member, member_shape in (shape.members.items() if shape is not None else ()):
+        if member_shape.type_name in ("list", "map"):
+            response[member] = [] if member_shape.type_name == "list" else {{}}
+    response.update(responses.get(name, {{}}))
+    response["ResponseMetadata"] = {{"HTTPStatusCode": 200, "RequestId": "benchmark"}}
+    return response
+
+
+botocore.client.BaseClient._make_api_call = stub_api_call
+
+
+class Context:
+    function_name = os.environ["AWS_LAMBDA_FUNCTION_NAME"]
+    function_version = "$LATEST"
+    invoked_function_arn = "arn:aws:lambda:%s:{account}:function:%s" % (
+        os.environ["AWS_REGION"], function_name)
+    memory_limit_in_mb = os.environ["AWS_LAMBDA_FUNCTION_MEMORY_SIZE"]
+    aws_request_id = "benchmark"
+    log_group_name = "/aws/lambda/" + function_name
+    log_stream_name = "benchmark"
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+with open(event_path) as fh:
+    event = json.load(fh)
+
+print("{marker}", file=sys.stderr, flush=True)
+error = None
+start = time.perf_counter()
+try:
+    custodian_policy.run(event, Context())
+except Exception as e:
+    error = "%s: %s" % (type(e).__name__, e)
+invoke_seconds = time.perf_counter() - start
+
+print(json.dumps({{
+    "init_seconds": init_seconds,
+    "first_invoke_seconds": invoke_seconds,
+    "init_rss_mb": init_rss_mb,
+    "peak_rss_mb": peak_rss_mb(),
+    "api_calls": calls,
+    "error": error,
+}}))
+""".format(responses=STUB_RESPONSES, account=STUB_ACCOUNT_ID, marker=INVOKE_MARKER)
+
+
+def synthetic_event(policy, region="us-east-1"):
+    """Build an event of the kind that triggers the policy's mode.
+
+    Args:
+        policy: Policy dictionary from the archive config.json
+        region: Region the event comes from
+
+    Returns:
+        dict: Event for the policy handler
+    """
+    mode = policy.get("mode", {})
+    mode_type = mode.get("type")
+    now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    event = {
+        "version": "0",
+        "id": "benchmark",
+        "account": STUB_ACCOUNT_ID,
+        "time": now,
+        "region": region,
+        "resources": [],
+        "detail": {},
+    }
+
+    if mode_type == "cloudtrail" and mode.get("events"):
+        trail_event = mode["events"][0]
+        if isinstance(trail_event, str):
+            trail_event = dict(CloudWatchEvents.get(trail_event) or {}, event=trail_event)
+        event.update(
+            {
+                "source": "aws." + trail_event.get("source", "").split(".")[0],
+                "detail-type": "AWS API Call via CloudTrail",
+                "detail": {
+                    "eventSource": trail_event.get("source"),
+                    "eventName": trail_event.get("event"),
+                    "awsRegion": region,
+                    "requestParameters": {},
+                    "responseElements": {},
+                    "userIdentity": {"accountId": STUB_ACCOUNT_ID, "type": "AssumedRole"},
+                },
+            }
+        )
+    elif mode_type in ("config-rule", "config-poll-rule"):
+        return {
+            "invokingEvent": json.dumps(
+                {"messageType": "ScheduledNotification", "notificationCreationTime": now}
+            ),
+            "ruleParameters": "{}",
+            "resultToken": "benchmark",
+            "accountId": STUB_ACCOUNT_ID,
+        }
+    else:
+        event.update({"source": "aws.events", "detail-type": "Scheduled Event"})
+    return event
+
+
+def parse_import_times(stderr):
+    """Sum -X importtime self times per top-level package for each phase.
+
+    Args:
+        stderr: Standard error of the driver
+
+    Returns:
+        dict: Phase (init, invoke) to {package: milliseconds}, largest first
+    """
+    phases = {"init": {}, "invoke": {}}
+    phase = "init"
+    for line in stderr.splitlines():
+        if line.strip() == INVOKE_MARKER:
+            phase = "invoke"
+            continue
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            self_us, _, name = [part.strip() for part in line[len("import time:") :].split("|")]
+            package = name.split(".", 1)[0]
+            phases[phase][package] = phases[phase].get(package, 0) + int(self_us) / 1000
+        except ValueError:
+            continue
+    return {
+        phase: {
+            name: round(ms, 1)
+            for name, ms in sorted(times.items(), key=lambda i: -i[1])[:TOP_IMPORTS]
+        }
+        for phase, times in phases.items()
+    }
+
+
+def run_once(task_dir, runtime_dir, event_path, env):
+    """Start one clean interpreter and return its measurements."""
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as fh:
+        fh.write(DRIVER)
+        driver_path = fh.name
+    try:
+        result = subprocess.run(  # nosec B603
+            [sys.executable, "-I", "-S", "-X", "importtime", driver_path]
+            + [task_dir, runtime_dir, event_path],
+            capture_output=True,
+            text=True,
+            env=env,
+            timeout=RUN_TIMEOUT,
+            check=False,
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Archive did not finish starting within {RUN_TIMEOUT} seconds")
+    finally:
+        os.unlink(driver_path)
+
+    if result.returncode != 0 or not result.stdout.strip():
+        raise RuntimeError(f"Archive failed to start: {result.stderr.strip()[-2000:]}")
+    measurements = json.loads(result.stdout.strip().splitlines()[-1])
+    measurements["imports_ms"] = parse_import_times(result.stderr)
+    return measurements
+
+
+def benchmark_archive(zip_path, runs=3, event=None, region="us-east-1"):
+    """Measure init and first invoke of a policy archive.
+
+    Args:
+        zip_path: Archive built by package_lambda_policy
+        runs: Number of cold starts, each in a fresh interpreter
+        event: Optional event, default a synthetic event for the policy mode
+        region: Region set in the function environment
+
+    Returns:
+        dict: Archive details, median timings, peak RSS and import breakdown
+
+    Raises:
+        ValidationError: If the archive is not a policy archive
+        RuntimeError: If the archive fails to start
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            config = json.loads(archive.read("config.json"))
+            file_count = len(archive.infolist())
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise ValidationError(f"Not a policy archive: {zip_path}: {e}")
+
+    policy = config["policies"][0]
+    mode = policy.get("mode", {})
+    memory_mb = int(mode.get("memory", DEFAULT_MEMORY_MB))
+    with open(zip_path, "rb") as fh:
+        sha256_hex = hashlib.sha256(fh.read()).hexdigest()
+
+    samples = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        runtime_dir = os.path.join(temp_dir, "runtime")
+        os.makedirs(runtime_dir)
+        for module_name in LAMBDA_RUNTIME_MODULES:
+            link_module(module_name, runtime_dir)
+
+        event_path = os.path.join(temp_dir, "event.json")
+        with open(event_path, "w") as fh:
+            json.dump(event if event is not None else synthetic_event(policy, region), fh)
+
+        env = {
+            "PATH": os.environ.get("PATH", ""),
+            "HOME": temp_dir,
+            "AWS_REGION": region,
+            "AWS_DEFAULT_REGION": region,
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+            "AWS_LAMBDA_FUNCTION_NAME": policy["name"],
+            "AWS_LAMBDA_FUNCTION_MEMORY_SIZE": str(memory_mb),
+            "TZ": "UTC",
+        }
+
+        for i in range(max(1, runs)):
+            # A fresh task directory per run, like a new execution environment
+            task_dir = os.path.join(temp_dir, f"task-{i}")
+            with zipfile.ZipFile(zip_path) as archive:
+                archive.extractall(task_dir)  # nosec B202
+            env["LAMBDA_TASK_ROOT"] = task_dir
+            samples.append(run_once(task_dir, runtime_dir, event_path, env))
+
+    def median(key):
+        return round(statistics.median(s[key] for s in samples), 4)
+
+    peak_rss_mb = median("peak_rss_mb")
+    return {
+        "zip_path": zip_path,
+        "sha256_hex": sha256_hex,
+        "size_bytes": os.path.getsize(zip_path),
+        "files": file_count,
+        "policy_name": policy["name"],
+        "mode": mode.get("type"),
+        "runs": len(samples),
+        "init_seconds": median("init_seconds"),
+        "first_invoke_seconds": median("first_invoke_seconds"),
+        "init_rss_mb": median("init_rss_mb"),
+        "peak_rss_mb": peak_rss_mb,
+        "memory_mb": memory_mb,
+        "memory_headroom_mb": round(memory_mb - peak_rss_mb, 1),
+        "imports_ms": samples[0]["imports_ms"],
+        "api_calls": samples[0]["api_calls"],
+        "errors": sorted({s["error"] for s in samples if s["error"]}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold starts of built policy archives")
+    parser.add_argument("archives", nargs="+", help="Archives to compare")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per archive")
+    parser.add_argument("--event", default=None, help="JSON file with the event to invoke with")
+    parser.add_argument("--region", default="us-east-1", help="Function region")
+    args = parser.parse_args()
+
+    event = None
+    if args.event:
+        with open(args.event) as fh:
+            event = json.load(fh)
+
+    try:
+        results = [
+            benchmark_archive(path, runs=args.runs, event=event, region=args.region)
+            for path in args.archives
+        ]
+    except (ValidationError, RuntimeError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
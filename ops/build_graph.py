@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Make-like incremental build graph over a repository of policies.
+
+Every policy becomes a chain of nodes:
+
+    document -> outputs ---------------------------> event_pattern / config_rule
+        |                                          /
+        +-> validate ------------------------------+-> archive
+                       packages (mode.packages) -/
+                       modules (bundled files) -/
+                       handler, c7n, options ---/
+
+Source nodes (documents, the handler template, the c7n version, the installed
+distributions and the bundled module files) are evaluated on every run and are
+cheap. Every other node is up to date when the digests of its inputs match
+those recorded in the previous run, and its recorded value is reused. A node
+whose value did not change stops the rebuild there, so a vars edit only rebuilds
+the policies whose resolved document changed, and a filter edit rebuilds the
+archive but not the event pattern. Package version discovery and archive builds
+are shared by policies with the same mode.packages.
+
+Out of date nodes run in topological order on a bounded worker pool:
+
+    python3 -m ops.build_graph policies/ --role arn:aws:iam::123456789012:role/custodian
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ops.common import ValidationError, canonical_json
+from ops.manifest import FILE_INDEX_PATH, FileIndex, archive_fingerprint
+from ops.package_lambda_policy import (
+    archive_modules,
+    get_lambda_package_versions,
+    process_exec_options,
+)
+from ops.prune import parse_prune_options
+from ops.watch import (
+    STAGE_RUNNERS,
+    expand_policy_paths,
+    load_policy_file,
+    output_document,
+    policy_query,
+    stage_inputs,
+)
+
+try:
+    from c7n.mu import PolicyHandlerTemplate
+    from c7n.version import version
+except ImportError:  # pragma: no cover
+    print("Cloud Custodian (c7n) package is not installed. Please install it", file=sys.stderr)
+    sys.exit(1)
+
+BUILD_GRAPH_PATH = os.path.join("build", ".build-graph.json")
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def value_digest(value):
+    """Return the sha256 hex digest of a JSON-serializable value."""
+    return hashlib.sha256(canonical_json(value).encode("utf-8")).hexdigest()
+
+
+class Node:
+    """A step in the build graph.
+
+    Args:
+        name: Unique node name
+        func: Called with the values of deps, in order, and returns a JSON-serializable value
+        deps: Names of the nodes whose values func takes
+        source: Evaluate on every run instead of reusing the recorded value
+        check: Optional callable that returns False if a recorded value is unusable
+    """
+
+    def __init__(self, name, func, deps=(), source=False, check=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.source = source
+        self.check = check
+
+
+class BuildGraph:
+    """Nodes with recorded state, evaluated in dependency order.
+
+    Args:
+        state_path: JSON file recording node stamps and values, None keeps it in memory
+    """
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+        self.nodes = {}
+        self.state = {}
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path) as fh:
+                    self.state = json.load(fh)
+            except (OSError, ValueError):
+                self.state = {}
+
+    def add(self, name, func, deps=(), source=False, check=None):
+        """Add a node, a node that already exists is kept.
+
+        Returns:
+            str: The node name
+        """
+        if name not in self.nodes:
+            self.nodes[name] = Node(name, func, deps, source, check)
+        return name
+
+    def order(self):
+        """Return the node names in topological order.
+
+        Raises:
+            ValidationError: If a dependency is missing or the graph has a cycle
+        """
+        pending = {}
+        for node in self.nodes.values():
+            missing = [d for d in node.deps if d not in self.nodes]
+            if missing:
+                raise ValidationError(f"Node '{node.name}' depends on unknown nodes {missing}")
+            pending[node.name] = set(node.deps)
+
+        ordered = []
+        ready = sorted(n for n, deps in pending.items() if not deps)
+        while ready:
+            name = ready.pop(0)
+            ordered.append(name)
+            for other in sorted(pending):
+                if name in pending[other]:
+                    pending[other].discard(name)
+                    if not pending[other]:
+                        ready.append(other)
+            del pending[name]
+        if pending:
+            raise ValidationError(f"Build graph has a cycle through {sorted(pending)}")
+        return ordered
+
+    def stamp(self, node, results):
+        """Digest of a node's name and the digests of its inputs."""
+        return value_digest([node.name] + [results[d]["digest"] for d in node.deps])
+
+    def evaluate(self, node, results, dry_run=False):
+        """Evaluate one node whose dependencies have results.
+
+        Returns:
+            dict: status (built, up_to_date, stale, failed or skipped), digest, value,
+            seconds and error
+        """
+        failed = [d for d in node.deps if results[d]["status"] in ("failed", "skipped")]
+        if failed:
+            return {"status": "skipped", "digest": None, "error": f"{failed[0]} failed"}
+
+        stamp = self.stamp(node, results)
+        recorded = self.state.get(node.name, {})
+        if (
+            not node.source
+            and recorded.get("stamp") == stamp
+            and (node.check is None or node.check(recorded["value"]))
+        ):
+            return {
+                "status": "up_to_date",
+                "digest": recorded["digest"],
+                "value": recorded["value"],
+            }
+        if dry_run and not node.source:
+            return {"status": "stale", "digest": None}
+
+        start = time.perf_counter()
+        try:
+            value = node.func(*(results[d]["value"] for d in node.deps))
+        except (ValidationError, RuntimeError) as e:
+            return {"status": "failed", "digest": None, "error": str(e)}
+        return {
+            "status": "built",
+            "stamp": stamp,
+            "digest": value_digest(value),
+            "value": value,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+    def run(self, workers=DEFAULT_WORKERS, dry_run=False):
+        """Evaluate every node, running out of date ones on a worker pool.
+
+        Args:
+            workers: Maximum number of nodes evaluated at once
+            dry_run: Report out of date nodes as stale instead of building them
+
+        Returns:
+            dict: Node name to result
+        """
+        order = self.order()
+        dependents = {name: [] for name in order}
+        waiting = {}
+        for name in order:
+            waiting[name] = len(self.nodes[name].deps)
+            for dep in self.nodes[name].deps:
+                dependents[dep].append(name)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+
+            def submit(name):
+                return pool.submit(self.evaluate, self.nodes[name], results, dry_run)
+
+            futures = {submit(n): n for n in order if not waiting[n]}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    results[name] = future.result()
+                    for other in dependents[name]:
+                        waiting[other] -= 1
+                        if not waiting[other]:
+                            futures[submit(other)] = other
+
+        if not dry_run:
+            self.record(results)
+        return results
+
+    def record(self, results):
+        """Record built nodes and write the state file."""
+        for name, result in results.items():
+            if result["status"] == "built" and not self.nodes[name].source:
+                self.state[name] = {k: result[k] for k in ("stamp", "digest", "value")}
+        if not self.state_path:
+            return
+        directory = os.path.dirname(self.state_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(self.state, fh, sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+
+def installed_distributions():
+    """Return the installed distribution names and versions on sys.path.
+
+    Distribution metadata directories are named <name>-<version>.dist-info, so
+    listing them is enough to notice an install, upgrade or removal.
+    """
+    found = set()
+    for entry in sys.path:
+        if os.path.isdir(entry):
+            found.update(f for f in os.listdir(entry) if f.endswith((".dist-info", ".egg-info")))
+    return sorted(found)
+
+
+class PolicyBuildGraph:
+    """Build graph of the validate, package and output stages of policy files.
+
+    Args:
+        paths: Policy files or directories of policy files
+        role: Lambda execution role ARN written to the packaged config
+        execution_options: Dict of execution-options
+        package_pruning: Optional pruning options, see ops/prune.py
+        state_path: JSON file recording the previous run
+    """
+
+    def __init__(
+        self,
+        paths,
+        role="",
+        execution_options=None,
+        package_pruning=None,
+        state_path=BUILD_GRAPH_PATH,
+    ):
+        self.paths = paths
+        self.base_query = {
+            "role": role,
+            "execution_options": json.dumps(execution_options or {}),
+            "package_pruning": json.dumps(package_pruning),
+        }
+        self.state_path = state_path
+        self.index = FileIndex(FILE_INDEX_PATH)
+
+    def load_documents(self, changed=None):
+        """Parse the policy files.
+
+        Args:
+            changed: Optional paths of the changed files, only their policies are planned
+
+        Returns:
+            tuple: (policy name to document, file path to error message)
+
+        Raises:
+            ValidationError: If a policy name is defined in more than one file
+        """
+        documents, errors, origin = {}, {}, {}
+        files = expand_policy_paths(self.paths)
+        if changed is not None:
+            changed = {os.path.normpath(p) for p in changed}
+            files = [f for f in files if os.path.normpath(f) in changed]
+        for path in files:
+            try:
+                loaded = load_policy_file(path)
+            except (OSError, ValidationError) as e:
+                errors[path] = str(e)
+                continue
+            for name, document in loaded.items():
+                if name in origin:
+                    raise ValidationError(
+                        f"Policy '{name}' is defined in both {origin[name]} and {path}"
+                    )
+                origin[name] = path
+                documents[name] = document
+        return documents, errors
+
+    def build(self, documents):
+        """Create the graph nodes for the policies.
+
+        Returns:
+            BuildGraph: Graph with shared and per-policy nodes
+        """
+        graph = BuildGraph(self.state_path)
+        base_query = self.base_query
+
+        def options():
+            # Raises ValidationError here, so every archive is skipped on bad options
+            return {
+                "exec_options": process_exec_options(base_query),
+                "prune_options": parse_prune_options(base_query),
+            }
+
+        graph.add("options", options, source=True)
+        graph.add("c7n", lambda: version, source=True)
+        graph.add("handler", lambda: value_digest(PolicyHandlerTemplate), source=True)
+        graph.add("environment", installed_distributions, source=True)
+
+        for name, document in sorted(documents.items()):
+            policy = document["policies"][0]
+            packages = sorted(p for p in policy.get("mode", {}).get("packages", []) or [] if p)
+            package_key = ",".join(packages)
+
+            graph.add(f"document:{name}", lambda d=document: d, source=True)
+            graph.add(f"outputs:{name}", output_document, deps=[f"document:{name}"], source=True)
+            graph.add(
+                f"packages:{package_key}",
+                lambda _env, p=packages: get_lambda_package_versions(p),
+                deps=["environment"],
+            )
+            graph.add(
+                f"modules:{package_key}",
+                lambda _env, p=packages: archive_fingerprint({}, archive_modules(p), self.index),
+                deps=["environment"],
+                source=True,
+            )
+            graph.add(
+                f"validate:{name}",
+                lambda d, _c7n: STAGE_RUNNERS["validate"](policy_query(d, base_query)),
+                deps=[f"document:{name}", "c7n"],
+            )
+            graph.add(
+                f"archive:{name}",
+                lambda _valid, d, opts, *_: STAGE_RUNNERS["package"](
+                    policy_query(d, base_query), opts["exec_options"], opts["prune_options"]
+                ),
+                deps=[
+                    f"validate:{name}",
+                    f"document:{name}",
+                    "options",
+                    f"packages:{package_key}",
+                    f"modules:{package_key}",
+                    "handler",
+                    "c7n",
+                ],
+                check=lambda result: os.path.exists(result.get("zip_path", "")),
+            )
+            for stage in ("event_pattern", "config_rule"):
+                if stage in stage_inputs(document):
+                    graph.add(
+                        f"{stage}:{name}",
+                        lambda _valid, d, s=stage: STAGE_RUNNERS[s](policy_query(d, base_query)),
+                        deps=[f"validate:{name}", f"outputs:{name}"],
+                    )
+        return graph
+
+    def run(self, changed=None, workers=DEFAULT_WORKERS, dry_run=False):
+        """Rebuild the out of date policy stages.
+
+        Args:
+            changed: Optional paths of the changed files, None checks every file
+            workers: Maximum number of stages run at once
+            dry_run: Only report what is out of date
+
+        Returns:
+            dict: Summary with the rebuilt, stale and failed stages per policy
+        """
+        start = time.perf_counter()
+        documents, errors = self.load_documents(changed)
+        graph = self.build(documents)
+        results = graph.run(workers=workers, dry_run=dry_run)
+        self.index.save()
+
+        summary = {"rebuilt": {}, "stale": {}, "failed": dict(errors), "up_to_date": 0}
+        for node, result in results.items():
+            if graph.nodes[node].source:
+                continue
+            status = result["status"]
+            if status == "up_to_date":
+                summary["up_to_date"] += 1
+            elif status == "built":
+                summary["rebuilt"][node] = result["seconds"]
+            elif status == "stale":
+                summary["stale"][node] = None
+            else:
+                summary["failed"][node] = result["error"]
+        summary["stale"] = sorted(summary["stale"])
+        summary["seconds"] = round(time.perf_counter() - start, 4)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the out of date stages of policies")
+    parser.add_argument("paths", nargs="+", help="Policy files or directories")
+    parser.add_argument("--role", default="", help="Lambda execution role ARN")
+    parser.add_argument("--execution-options", default="{}", help="Execution options as JSON")
+    parser.add_argument("--package-pruning", default="null", help="Package pruning options as JSON")
+    parser.add_argument("--changed", nargs="*", default=None, help="Only plan these changed files")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker pool size")
+    parser.add_argument("--dry-run", action="store_true", help="Only list out of date stages")
+    args = parser.parse_args()
+
+    try:
+        planner = PolicyBuildGraph(
+            args.paths,
+            role=args.role,
+            execution_options=json.loads(args.execution_options),
+            package_pruning=json.loads(args.package_pruning),
+        )
+        summary = planner.run(changed=args.changed, workers=args.workers, dry_run=args.dry_run)
+    except (ValueError, ValidationError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(summary, indent=2, sort_keys=True))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Shared build directory that is safe to use from concurrent Terraform runs.
+
+Archive contents are stored once in a content-addressed blob store under
+build/.blobs/, and build/<key>/<name> is a hard link to the blob (a symlink or a
+copy where links are not supported). Blobs and links are written to a temporary
+file and renamed into place while holding a per-key file lock, so readers only
+ever see complete files.
+
+Publishing or reusing an archive renews its lease, the last use recorded for the
+key in build/<key>/.leases.json. Leases are kept per key rather than in the file
+mtime, as the hard links of every key sharing a blob are one inode. Other links
+under the key are only removed once their lease has expired, so a zip that
+another workspace or module instance is about to upload is never deleted
+underneath it. A blob is deleted when no key links to it any more, and the gc
+command evicts least recently used blobs outside their lease to fit a size budget:
+
+    python3 -m ops.build_store gc --max-bytes 2G
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# How long an archive is kept after it was last published or reused
+LEASE_SECONDS = 24 * 60 * 60
+
+LOCK_DIR = ".locks"
+LEASE_FILE = ".leases.json"
+BLOB_DIR = ".blobs"
+BLOB_LOCK = "blobs"
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+class BuildStore:
+    """Per-key build directories with locking, atomic publish and lease-based cleanup.
+
+    Args:
+        root: Root build directory
+        lease_seconds: Seconds an archive is kept after its last use
+    """
+
+    # Files under a key that are build artifacts, other files such as the build
+    # manifest are left alone
+    ARTIFACT_SUFFIXES = (".zip",)
+
+    def __init__(self, root="build", lease_seconds=LEASE_SECONDS):
+        self.root = root
+        self.lease_seconds = lease_seconds
+
+    def directory(self, key):
+        """Return the build directory for a key."""
+        return os.path.join(self.root, key)
+
+    @contextlib.contextmanager
+    def lock(self, key, shared=False):
+        """Hold a lock on a key for the duration of the block, exclusive by default."""
+        lock_dir = os.path.join(self.root, LOCK_DIR)
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f"{key}.lock"), "a+") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _write_atomic(self, directory, name, write):
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                write(fh)
+            os.replace(temp_path, os.path.join(directory, name))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temp_path)
+            raise
+
+    def leases(self, key):
+        """Return the last use of each artifact under a key.
+
+        Artifacts without a recorded lease, e.g. from an older layout, fall back
+        to the mtime of their link.
+
+        Args:
+            key: Build key
+
+        Returns:
+            dict: Artifact name to last use as a Unix timestamp
+        """
+        directory = self.directory(key)
+        if not os.path.isdir(directory):
+            return {}
+        try:
+            with open(os.path.join(directory, LEASE_FILE)) as fh:
+                recorded = json.load(fh)
+        except (OSError, ValueError):
+            recorded = {}
+        if not isinstance(recorded, dict):
+            recorded = {}
+        leases = {}
+        for name in self._artifacts(directory):
+            if isinstance(recorded.get(name), (int, float)):
+                leases[name] = recorded[name]
+            else:
+                with contextlib.suppress(OSError):
+                    leases[name] = os.lstat(os.path.join(directory, name)).st_mtime
+        return leases
+
+    def _save_leases(self, key, leases):
+        content = json.dumps(leases, indent=2, sort_keys=True).encode("utf-8")
+        self._write_atomic(self.directory(key), LEASE_FILE, lambda fh: fh.write(content))
+
+    def _renew(self, key, name):
+        leases = self.leases(key)
+        leases[name] = time.time()
+        self._save_leases(key, leases)
+
+    def blob_path(self, name):
+        """Return the blob store path for an artifact name."""
+        return os.path.join(self.root, BLOB_DIR, name[:2], name)
+
+    def _store_blob(self, src_path, name):
+        blob = self.blob_path(name)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            with open(src_path, "rb") as src:
+                self._write_atomic(
+                    os.path.dirname(blob), name, lambda fh: shutil.copyfileobj(src, fh)
+                )
+        return blob
+
+    def _link(self, blob, directory, name):
+        final_path = os.path.join(directory, name)
+        if os.path.exists(final_path) and os.path.samefile(final_path, blob):
+            return final_path
+
+        temp_path = os.path.join(directory, f".{name}.{os.getpid()}.link.tmp")
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        try:
+            os.link(blob, temp_path)
+        except OSError:
+            try:
+                os.symlink(os.path.relpath(blob, directory), temp_path)
+            except OSError:
+                shutil.copy2(blob, temp_path)
+        os.replace(temp_path, final_path)
+        return final_path
+
+    def publish(self, src_path, key, name):
+        """Publish a file under a key, then remove links whose lease expired.
+
+        Args:
+            src_path: File to publish
+            key: Build key, the Lambda function name
+            name: File name, the archive hash
+
+        Returns:
+            str: Absolute path of the published file
+        """
+        directory = self.directory(key)
+        # Publishers share the blob store, deleting blobs needs it exclusively
+        with self.lock(BLOB_LOCK, shared=True):
+            blob = self._store_blob(src_path, name)
+            with self.lock(key):
+                os.makedirs(directory, exist_ok=True)
+                final_path = self._link(blob, directory, name)
+                self._renew(key, name)
+                released = self._collect(key, keep=name)
+        if released:
+            with self.lock(BLOB_LOCK):
+                self._release(released)
+        return os.path.abspath(final_path)
+
+    def retain(self, key, name):
+        """Renew the lease of a published file.
+
+        Returns:
+            bool: False if the file no longer exists
+        """
+        path = os.path.join(self.directory(key), name)
+        with self.lock(key):
+            if not os.path.exists(path):
+                return False
+            self._renew(key, name)
+            return True
+
+    def write_json(self, key, name, data):
+        """Atomically write a JSON document under a key."""
+        directory = self.directory(key)
+        content = json.dumps(data, indent=2, sort_keys=True).encode("utf-8")
+        with self.lock(key):
+            os.makedirs(directory, exist_ok=True)
+            self._write_atomic(directory, name, lambda fh: fh.write(content))
+
+    def keys(self):
+        """Return the build keys that have a directory under the root."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            k
+            for k in os.listdir(self.root)
+            if not k.startswith(".") and os.path.isdir(os.path.join(self.root, k))
+        )
+
+    def _artifacts(self, directory):
+        return [
+            f
+            for f in os.listdir(directory)
+            if f.endswith(self.ARTIFACT_SUFFIXES) and not f.startswith(".")
+        ]
+
+    def _collect(self, key, keep):
+        """Remove expired links and stale temp files, returning the removed names."""
+        directory = self.directory(key)
+        expiry = time.time() - self.lease_seconds
+        leases = self.leases(key)
+        removed = []
+        for f in os.listdir(directory):
+            path = os.path.join(directory, f)
+            if f == keep:
+                continue
+            with contextlib.suppress(OSError):
+                if f in leases:
+                    expired = leases[f] < expiry
+                else:
+                    # Temp files are removed once stale, e.g. after a killed run
+                    expired = f.endswith(".tmp") and os.lstat(path).st_mtime < expiry
+                if expired:
+                    os.unlink(path)
+                    removed.append(f)
+                    leases.pop(f, None)
+        self._save_leases(key, leases)
+        return removed
+
+    def references(self):
+        """Map artifact names to the keys linking to them."""
+        refs = {}
+        for key in self.keys():
+            for f in self._artifacts(self.directory(key)):
+                refs.setdefault(f, []).append(key)
+        return refs
+
+    def blobs(self):
+        """Return (name, path, size, mtime) for every blob."""
+        blob_root = os.path.join(self.root, BLOB_DIR)
+        found = []
+        if not os.path.isdir(blob_root):
+            return found
+        expiry = time.time() - self.lease_seconds
+        for prefix in sorted(os.listdir(blob_root)):
+            for name in sorted(os.listdir(os.path.join(blob_root, prefix))):
+                path = os.path.join(blob_root, prefix, name)
+                stat = os.stat(path)
+                if name.endswith(".tmp"):
+                    # Left by a killed run
+                    if stat.st_mtime < expiry:
+                        with contextlib.suppress(OSError):
+                            os.unlink(path)
+                    continue
+                found.append((name, path, stat.st_size, stat.st_mtime))
+        return found
+
+    def _release(self, names):
+        """Delete blobs that are no longer linked from any key."""
+        if not names:
+            return 0
+        refs = self.references()
+        reclaimed = 0
+        for name in names:
+            blob = self.blob_path(name)
+            if name not in refs and os.path.exists(blob):
+                reclaimed += os.path.getsize(blob)
+                os.unlink(blob)
+        return reclaimed
+
+    def _adopt(self, key, name):
+        """Move a plain file left by an older layout into the blob store."""
+        path = os.path.join(self.directory(key), name)
+        if os.path.islink(path) or os.stat(path).st_nlink > 1:
+            return 0
+        blob = self.blob_path(name)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.link(path, blob)
+            return 0
+
+        # A duplicate of an existing blob, its lease is already recorded for the key
+        size = os.path.getsize(path)
+        self._link(blob, self.directory(key), name)
+        return size
+
+    def gc(self, max_bytes=None):
+        """Collect expired links and unreferenced blobs, then fit the size budget.
+
+        Each key keeps its most recently used artifact regardless of its lease
+        or the budget, as it is the archive last deployed for the key. When the
+        blobs still exceed max_bytes, the least recently used other blobs
+        outside the leases of every key linking them are evicted along with
+        their links.
+
+        Args:
+            max_bytes: Optional size budget for the blob store
+
+        Returns:
+            dict: Summary with reclaimed bytes and what remains
+        """
+        expiry = time.time() - self.lease_seconds
+        report = {"reclaimed_bytes": 0, "removed_links": 0, "evicted_blobs": 0}
+        current = set()
+        last_used = {}
+
+        with self.lock(BLOB_LOCK):
+            for key in self.keys():
+                with self.lock(key):
+                    # Record the fallback leases before adopting replaces the files
+                    leases = self.leases(key)
+                    for name in leases:
+                        with contextlib.suppress(OSError):
+                            report["reclaimed_bytes"] += self._adopt(key, name)
+                    if leases:
+                        self._save_leases(key, leases)
+                        newest = max(leases, key=leases.get)
+                        current.add(newest)
+                        report["removed_links"] += len(self._collect(key, keep=newest))
+                    for name, used in self.leases(key).items():
+                        last_used[name] = max(used, last_used.get(name, used))
+
+            refs = self.references()
+            blobs = []
+            for name, path, size, mtime in self.blobs():
+                used = last_used.get(name, mtime)
+                if name not in refs:
+                    os.unlink(path)
+                    report["reclaimed_bytes"] += size
+                    report["evicted_blobs"] += 1
+                else:
+                    blobs.append((used, name, path, size))
+
+            total = sum(size for _, _, _, size in blobs)
+            for used, name, path, size in sorted(blobs):
+                if max_bytes is None or total <= max_bytes:
+                    break
+                if used >= expiry or name in current:
+                    continue
+                for key in refs[name]:
+                    with self.lock(key):
+                        with contextlib.suppress(OSError):
+                            os.unlink(os.path.join(self.directory(key), name))
+                            report["removed_links"] += 1
+                os.unlink(path)
+                total -= size
+                report["reclaimed_bytes"] += size
+                report["evicted_blobs"] += 1
+
+        report["blobs"] = len(self.blobs())
+        report["blob_bytes"] = sum(size for _, _, size, _ in self.blobs())
+        report["over_budget"] = max_bytes is not None and report["blob_bytes"] > max_bytes
+        return report
+
+
+def parse_size(value):
+    """Parse a byte count with an optional K, M, G or T suffix."""
+    value = str(value).strip().upper().rstrip("B")
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the shared build directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    gc_parser = subparsers.add_parser("gc", help="Remove unused and least recently used archives")
+    gc_parser.add_argument("--root", default="build", help="Root build directory")
+    gc_parser.add_argument("--max-bytes", default=None, help="Size budget, e.g. 500M or 2G")
+    gc_parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=LEASE_SECONDS,
+        help="Seconds an archive is kept after its last use",
+    )
+    args = parser.parse_args()
+
+    try:
+        max_bytes = parse_size(args.max_bytes) if args.max_bytes else None
+    except ValueError:
+        print(f"Invalid size: {args.max_bytes}", file=sys.stderr)
+        sys.exit(1)
+
+    store = BuildStore(args.root, lease_seconds=args.lease_seconds)
+    print(json.dumps(store.gc(max_bytes), indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
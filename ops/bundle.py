@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Bundle periodic policies into one Lambda function.
+
+Every policy normally gets its own function, so many small policies on the same
+schedule each pay for a cold start and a c7n import. Policies whose modes are
+identical apart from their tags, meaning the same type, schedule, role,
+packages and function settings, can share one archive instead. Its handler runs
+the policies one after another, or with bounded concurrency, in one warm
+interpreter. Each policy is timed, and a failing policy is logged without
+stopping the others.
+
+Bundles are planned from a policies file, printing the groups to use for the
+bundles variable of the policies module:
+
+    python3 -m ops.bundle policies.yml
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+
+from ops.common import (
+    ValidationError,
+    canonical_json,
+    canonicalize_policies,
+    validate_format,
+)
+from ops.policy_snapshot import SNAPSHOT_PATH
+
+BUNDLE_TYPES = {"periodic", "schedule"}
+DEFAULT_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+
+BUNDLE_HANDLER_TEMPLATE = f"""\
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from c7n import handler
+from c7n.policy import PolicyCollection
+from c7n.structure import StructureParser
+
+log = logging.getLogger("custodian.bundle")
+
+policy_config = None
+policy_data = None
+
+
+def init(context):
+    global policy_config, policy_data
+    with open("config.json") as f:
+        policy_data = json.load(f)
+    exec_options = policy_data.setdefault("execution-options", {{}})
+    # The function is bound to its region, take it from the function ARN rather
+    # than a boto session lookup that depends on the environment
+    if not exec_options.get("regions"):
+        exec_options["regions"] = [context.invoked_function_arn.split(":")[3]]
+    if os.path.exists("{SNAPSHOT_PATH}"):
+        with open("{SNAPSHOT_PATH}") as f:
+            resource_types = json.load(f)["resource_types"]
+        if not exec_options.get("account_id"):
+            exec_options["account_id"] = context.invoked_function_arn.split(":")[4]
+    else:
+        resource_types = StructureParser().get_resource_types(policy_data)
+    policy_config = handler.init_config(policy_data)
+    handler.load_resources(resource_types)
+
+
+def run_policy(policy, event, context):
+    start = time.time()
+    result = {{"policy": policy.name, "status": "ok"}}
+    try:
+        # validation provides for an initialization point for some filters/actions
+        policy.validate()
+        policy.push(event, context)
+    except Exception as e:
+        log.exception("error during policy execution: %s", policy.name)
+        result.update(status="failed", error="%s: %s" % (type(e).__name__, e))
+    result["seconds"] = round(time.time() - start, 3)
+    return result
+
+
+def run(event, context):
+    # default event.detail for EB Scheduler is '{{}}', not {{}}
+    if event.get("detail") == "{{}}":
+        event["detail"] = {{}}
+    if policy_config is None:
+        init(context)
+
+    policies = PolicyCollection.from_data(policy_data, policy_config)
+    concurrency = policy_data.get("bundle", {{}}).get("concurrency", 1)
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda p: run_policy(p, event, context), policies))
+    else:
+        results = [run_policy(p, event, context) for p in policies]
+
+    log.info("Bundle results %s", json.dumps(results))
+    failed = [r["policy"] for r in results if r["status"] == "failed"]
+    if failed and not handler.C7N_CATCH_ERR:
+        raise RuntimeError("Bundled policies failed: %s" % ", ".join(failed))
+    return {{"policies": results}}
+"""
+
+
+def bundle_key(policy):
+    """Return the part of a policy that must match for it to share a function.
+
+    Args:
+        policy: Canonical policy dictionary
+
+    Returns:
+        str: Canonical JSON of the policy mode without its tags
+    """
+    mode = policy.get("mode", {})
+    return canonical_json({k: v for k, v in mode.items() if k != "tags"})
+
+
+def select_policies(policies_dict, policy_names):
+    """Extract the named policies from a policies dictionary, in the given order.
+
+    Args:
+        policies_dict: Parsed policies dictionary
+        policy_names: Names of the policies to bundle
+
+    Returns:
+        dict: Policies dictionary with the named policies and the original vars
+
+    Raises:
+        ValidationError: If a name is missing, repeated or not found
+    """
+    if not policy_names:
+        raise ValidationError("A bundle must name at least one policy")
+    if len(set(policy_names)) != len(policy_names):
+        raise ValidationError(f"Bundle policy names must be unique: {policy_names}")
+
+    by_name = {}
+    for policy in policies_dict.get("policies", []):
+        if isinstance(policy, dict) and "name" in policy:
+            if policy["name"] in by_name:
+                raise ValidationError(
+                    f"Multiple policies with name '{policy['name']}' found. "
+                    "Policy names must be unique."
+                )
+            by_name[policy["name"]] = policy
+
+    missing = [name for name in policy_names if name not in by_name]
+    if missing:
+        raise ValidationError(f"Policies {missing} not found. Available policies: {list(by_name)}")
+
+    result = {k: v for k, v in policies_dict.items() if k == "vars"}
+    result["policies"] = [by_name[name] for name in policy_names]
+    return result
+
+
+def validate_bundle(policy_list):
+    """Validate that policies can share one function.
+
+    Args:
+        policy_list: List of canonical policies
+
+    Raises:
+        ValidationError: If a policy mode cannot be bundled or differs from the first
+    """
+    first = policy_list[0]
+    for policy in policy_list:
+        mode_type = policy.get("mode", {}).get("type")
+        if mode_type not in BUNDLE_TYPES:
+            raise ValidationError(
+                f"Policy '{policy['name']}' has mode {mode_type}, bundles support "
+                f"{sorted(BUNDLE_TYPES)}"
+            )
+        if bundle_key(policy) != bundle_key(first):
+            mode, first_mode = policy["mode"], first["mode"]
+            differences = sorted(
+                k
+                for k in set(mode).union(first_mode)
+                if k != "tags" and mode.get(k) != first_mode.get(k)
+            )
+            raise ValidationError(
+                f"Policy '{policy['name']}' cannot share a function with "
+                f"'{first['name']}', mode {', '.join(differences)} differ"
+            )
+
+
+def parse_bundle_concurrency(query):
+    """Parse the bundle_concurrency query parameter.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        int: Number of policies run at once, default 1
+
+    Raises:
+        ValidationError: If the value is not an integer between 1 and MAX_CONCURRENCY
+    """
+    value = query.get("bundle_concurrency") or str(DEFAULT_CONCURRENCY)
+    try:
+        concurrency = int(value)
+    except ValueError:
+        raise ValidationError(f"bundle_concurrency must be an integer, got '{value}'")
+    if not 1 <= concurrency <= MAX_CONCURRENCY:
+        raise ValidationError(f"bundle_concurrency must be between 1 and {MAX_CONCURRENCY}")
+    return concurrency
+
+
+def plan_bundles(policies_dict, min_size=2):
+    """Group the policies that can share a function.
+
+    Args:
+        policies_dict: Parsed policies dictionary
+        min_size: Smallest group reported as a bundle
+
+    Returns:
+        dict: Bundle name to the sorted policy names it holds. Names are the mode
+        type and a digest of the shared mode, so they stay stable as policies
+        are added to a group.
+    """
+    groups = {}
+    for policy in canonicalize_policies(policies_dict).get("policies", []):
+        if policy.get("mode", {}).get("type") not in BUNDLE_TYPES:
+            continue
+        digest = hashlib.sha256(bundle_key(policy).encode("utf-8")).hexdigest()
+        name = f"{policy['mode']['type']}-{digest[:8]}"
+        groups.setdefault(name, []).append(policy["name"])
+    return {name: sorted(names) for name, names in sorted(groups.items()) if len(names) >= min_size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group policies that can share a Lambda function")
+    parser.add_argument("path", help="Policies file in JSON or YAML")
+    parser.add_argument("--min-size", type=int, default=2, help="Smallest group to bundle")
+    args = parser.parse_args()
+
+    try:
+        with open(args.path) as fh:
+            policies_dict = validate_format({"policies": fh.read()}, "policies")
+        print(json.dumps(plan_bundles(policies_dict, args.min_size), indent=2))
+    except (OSError, ValidationError) as e:
+        print(f"Failed to plan bundles: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
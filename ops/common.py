@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 """Common utilities for Cloud Custodian Lambda operations."""
+
+import importlib
 import json
+import os
 import sys
 import datetime
+import threading
+import time
 
 try:
     import yaml
@@ -38,12 +43,72 @@ ALLOWED_TYPES = {
 }
 
 
+# Modules provided by the AWS Lambda python runtime
+LAMBDA_RUNTIME_MODULES = [
+    "boto3",
+    "botocore",
+    "s3transfer",
+    "jmespath",
+    "dateutil",
+    "six",
+    "urllib3",
+]
+
+
 class ValidationError(Exception):
     """Custom exception for validation errors."""
 
     pass
 
 
+class StageTimer:
+    """Record start offsets and durations of pipeline stages, including concurrent ones."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def run(self, name, func, *args, **kwargs):
+        """Call func, recording its timing under name."""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.stages[name] = (start - self.origin, end - self.origin)
+
+    def critical_path(self):
+        """Return the chain of stages that determined the total run time.
+
+        Starting from the stage that finished last, each step goes back to the
+        stage that finished last before the current one started.
+        """
+        path = []
+        remaining = dict(self.stages)
+        bound = float("inf")
+        while True:
+            candidates = {n: t for n, t in remaining.items() if t[1] <= bound}
+            if not candidates:
+                break
+            name = max(candidates, key=lambda n: candidates[n][1])
+            path.append(name)
+            bound = remaining.pop(name)[0]
+        return list(reversed(path))
+
+    def report(self):
+        """Stage timings in seconds with the critical path."""
+        return {
+            "stages": {
+                name: {"start": round(start, 4), "seconds": round(end - start, 4)}
+                for name, (start, end) in sorted(self.stages.items(), key=lambda i: i[1])
+            },
+            "critical_path": self.critical_path(),
+            "total_seconds": round(max((e for _, e in self.stages.values()), default=0), 4),
+        }
+
+
 def return_result(result):
     """Print result and exit."""
     print(json.dumps(result))
@@ -56,6 +121,38 @@ def return_error(message):
     sys.exit(1)
 
 
+def read_query():
+    """Read the Terraform external data source query from stdin.
+
+    Returns:
+        dict: Query dictionary
+    """
+    try:
+        return json.load(sys.stdin)
+    except json.JSONDecodeError as e:
+        return_error(f"Failed to parse input JSON: {e}")
+    except Exception as e:  # pragma: no cover
+        return_error(f"Unexpected error reading input: {type(e).__name__}: {e}")
+
+
+def run_cli(run):
+    """Run a script's query function as a Terraform external data source.
+
+    The query functions return results and raise ValidationError or RuntimeError,
+    so they can be called in process, see ops/api.py. This adapter is the only
+    place that prints and exits.
+
+    Args:
+        run: Function taking the query dictionary and returning the result
+    """
+    query = read_query()
+    try:
+        result = run(query)
+    except (ValidationError, RuntimeError) as e:
+        return_error(str(e))
+    return_result(result)
+
+
 def format_validation_errors(errors, prefix):
     """Format validation errors consistently.
 
@@ -170,6 +267,46 @@ def parse_policies(query, policies_key="policies"):
         return validate_format(query, policies_key)
 
 
+def canonical_value(value):
+    """Return a JSON-ready copy of a parsed value with sorted keys and plain scalars.
+
+    Args:
+        value: Value parsed from JSON or YAML
+
+    Returns:
+        Value with dict keys sorted and stringified, tuples as lists and dates as ISO strings
+    """
+    if isinstance(value, dict):
+        items = {k if isinstance(k, str) else json.dumps(k): v for k, v in value.items()}
+        return {k: canonical_value(items[k]) for k in sorted(items)}
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(v) for v in value]
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def canonicalize_policies(policies_dict):
+    """Normalize parsed policies so semantically identical input serializes identically.
+
+    YAML anchors in ``vars`` are resolved when the policies are parsed, so ``vars``
+    is dropped. Keys are sorted and scalars normalized by canonical_value, which
+    makes JSON and YAML input, or input with a different key order, equivalent.
+
+    Args:
+        policies_dict: Dictionary returned by parse_policies
+
+    Returns:
+        dict: Canonical policies dictionary
+    """
+    return canonical_value({k: v for k, v in policies_dict.items() if k != "vars"})
+
+
+def canonical_json(value, **kwargs):
+    """Serialize a value with sorted keys, for config.json and cache keys."""
+    return json.dumps(canonical_value(value), sort_keys=True, **kwargs)
+
+
 def validate_policy_structure(policies_dict):
     """
     Validates that the policy contains one policy under the array policies
@@ -223,6 +360,9 @@ def validate_policy_mode(policy_dict, allowed_types=ALLOWED_TYPES):
 def validate_with_custodian(policies_dict):
     """Validate using Cloud Custodian's internal validation.
 
+    This is where the scripts build their Policy, with the options of
+    Config.empty(). Hand the returned instance on instead of building another.
+
     Args:
         policies_dict: Dictionary containing policy data
 
@@ -261,6 +401,36 @@ def get_force_deploy_tags(force_deploy):
     return {"force-deploy": datetime.datetime.utcnow().isoformat() + "Z"}
 
 
+def tags_in_archive(query):
+    """Return True if tags should be written to the archived config.json.
+
+    When disabled, tags only reach the function through the custodian_tags output,
+    so tag and force_deploy changes no longer change the archive hash.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        bool: Value of the tags_in_archive query parameter, default True
+    """
+    return query.get("tags_in_archive", "true").lower() == "true"
+
+
+def link_module(module_name, target_dir):
+    """Symlink an importable module into target_dir the way the archive lays it out."""
+    module = importlib.import_module(module_name)
+    # six sets an empty __path__ to support six.moves, so fall back to __file__
+    if getattr(module, "__path__", None):
+        for directory in module.__path__:
+            link = os.path.join(target_dir, module_name)
+            if not os.path.exists(link):
+                os.symlink(directory, link)
+    elif getattr(module, "__file__", None):
+        link = os.path.join(target_dir, os.path.basename(module.__file__))
+        if not os.path.exists(link):
+            os.symlink(module.__file__, link)
+
+
 def hex_ascii_encoder(digest_bytes):
     """Convert hash digest bytes to hexadecimal ASCII bytes
 
@@ -276,10 +446,13 @@ def hex_ascii_encoder(digest_bytes):
 def copy_archive(archive, hex_hash, function_name, build_root="build"):
     """Copy archive to build directory with hash-based filename
 
+    The archive is published atomically under a per-function lock, and other
+    archives for the function are kept until their lease expires, see
+    ops/build_store.py.
+
     Args:
         archive: Archive object with .path attribute
         hex_hash: Hexadecimal hash string for filename
-        region: AWS region for directory structure
         function_name: Lambda function name for directory structure
         build_root: Root build directory (default: "build")
 
@@ -289,19 +462,10 @@ def copy_archive(archive, hex_hash, function_name, build_root="build"):
     Raises:
         Exception: If directory creation or file copy fails
     """
-    import os
-    import shutil
+    from ops.build_store import BuildStore
 
     try:
-        build_directory = os.path.join(build_root, function_name)
-        if os.path.exists(build_directory):
-            shutil.rmtree(build_directory)
-        os.makedirs(build_directory, exist_ok=True)
-
-        final_zip_path = os.path.join(build_directory, f"{hex_hash}.zip")
-        shutil.copy2(archive.path, final_zip_path)
-
-        return os.path.abspath(final_zip_path)
+        return BuildStore(build_root).publish(archive.path, function_name, f"{hex_hash}.zip")
     except OSError as e:
         raise RuntimeError(f"Failed to create build directory or copy file: {e}")
     except AttributeError as e:
@@ -310,6 +474,58 @@ def copy_archive(archive, hex_hash, function_name, build_root="build"):
         raise RuntimeError(f"Unexpected error during archive copy: {type(e).__name__}: {e}")
 
 
+def load_cached_build(function_name, cache_key, build_root="build", require_zip=True):
+    """Return the result of a previous build with the same cache key.
+
+    A returned zip has its lease renewed so it is not cleaned up by other builds.
+
+    Args:
+        function_name: Lambda function name for directory structure
+        cache_key: Digest of every input that affects the archive
+        build_root: Root build directory (default: "build")
+        require_zip: Only return results whose zip file still exists
+
+    Returns:
+        dict: Cached result, or None if there is no usable cached build
+    """
+    from ops.build_store import BuildStore
+
+    manifest_path = os.path.join(build_root, function_name, "manifest.json")
+    try:
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    result = manifest.get("result", {})
+    if manifest.get("cache_key") != cache_key:
+        return None
+
+    zip_path = result.get("zip_path", "")
+    retained = bool(zip_path) and BuildStore(build_root).retain(
+        function_name, os.path.basename(zip_path)
+    )
+    if require_zip and not (retained and os.path.exists(zip_path)):
+        return None
+    return result
+
+
+def save_cached_build(function_name, cache_key, result, build_root="build"):
+    """Record a build result so an identical build can be skipped.
+
+    Args:
+        function_name: Lambda function name for directory structure
+        cache_key: Digest of every input that affects the archive
+        result: Result dictionary with zip_path and hashes
+        build_root: Root build directory (default: "build")
+    """
+    from ops.build_store import BuildStore
+
+    BuildStore(build_root).write_json(
+        function_name, "manifest.json", {"cache_key": cache_key, "result": result}
+    )
+
+
 def get_package_versions(packages):
     """Get package versions for specified packages.
 
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Match EventBridge event patterns against events locally.
+
+A pattern is compiled once into nested checks, then evaluated against events
+without calling AWS. The EventBridge pattern semantics implemented are:
+
+- exact values, matched against any element of an array
+- prefix, suffix and equals-ignore-case
+- anything-but, with values, prefix, suffix, equals-ignore-case or wildcard
+- numeric comparisons
+- exists
+- cidr
+- wildcard
+- $or
+
+Arrays of objects are flattened, so each field of a pattern may match a
+different element, as EventBridge does.
+
+Event corpora are JSONL files of EventBridge events. Raw CloudTrail records,
+one per line or in a {"Records": [...]} file line, are wrapped the way
+EventBridge delivers them. For every event mode policy in a policies file, the
+pattern from ops/get_cloudwatch_event_pattern.py is matched against the
+corpus. The match rate per policy and the events that matched are reported,
+with the throughput of the matcher:
+
+    python3 -m ops.event_match events.jsonl --policies policies.yml
+"""
+
+import argparse
+import ipaddress
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from ops.common import ValidationError, canonicalize_policies, validate_format
+from ops.get_cloudwatch_event_pattern import ALLOWED_TYPES, generate_event_pattern
+
+NUMERIC_OPERATORS = {
+    "=": lambda a, b: a == b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+TOP_EVENTS = 10
+
+
+def is_number(value):
+    """Return True for JSON numbers, which excludes booleans."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def resolve(event, path):
+    """Return the leaf values at a path of an event, flattening arrays.
+
+    Args:
+        event: Event dictionary
+        path: Tuple of keys
+
+    Returns:
+        list: Values found, empty if the path does not exist
+    """
+    values = [event]
+    for key in path:
+        found = []
+        for value in values:
+            if isinstance(value, dict) and key in value:
+                child = value[key]
+                if isinstance(child, list):
+                    found.extend(child)
+                else:
+                    found.append(child)
+        if not found:
+            return []
+        values = found
+    return values
+
+
+def compile_wildcard(expression):
+    """Compile a wildcard expression, where * matches any characters and \\* a star."""
+    parts = re.split(r"(\\\*|\*)", expression)
+    regex = "".join(".*" if p == "*" else re.escape("*" if p == "\\*" else p) for p in parts)
+    return re.compile(regex, re.DOTALL).fullmatch
+
+
+def compile_string_matcher(name, operand):
+    """Compile a prefix, suffix, equals-ignore-case or wildcard matcher for strings.
+
+    Args:
+        name: Matcher name
+        operand: String, or {"equals-ignore-case": string} for prefix and suffix
+
+    Returns:
+        callable: Function of a value returning True if it matches
+
+    Raises:
+        ValidationError: If the operand is not valid for the matcher
+    """
+    ignore_case = False
+    if name in ("prefix", "suffix") and isinstance(operand, dict):
+        if list(operand) != ["equals-ignore-case"]:
+            raise ValidationError(f"Invalid {name} matcher: {json.dumps(operand)}")
+        operand, ignore_case = operand["equals-ignore-case"], True
+    if not isinstance(operand, str):
+        raise ValidationError(f"{name} matcher needs a string: {json.dumps(operand)}")
+
+    if name == "wildcard":
+        match = compile_wildcard(operand)
+        return lambda v: isinstance(v, str) and match(v) is not None
+    if name == "equals-ignore-case":
+        operand = operand.casefold()
+        return lambda v: isinstance(v, str) and v.casefold() == operand
+    if ignore_case:
+        operand = operand.casefold()
+        if name == "prefix":
+            return lambda v: isinstance(v, str) and v.casefold().startswith(operand)
+        return lambda v: isinstance(v, str) and v.casefold().endswith(operand)
+    if name == "prefix":
+        return lambda v: isinstance(v, str) and v.startswith(operand)
+    return lambda v: isinstance(v, str) and v.endswith(operand)
+
+
+def compile_numeric(operand):
+    """Compile a numeric matcher such as [">", 0, "<=", 5].
+
+    Raises:
+        ValidationError: If the comparisons are malformed
+    """
+    if not isinstance(operand, list) or not operand or len(operand) % 2:
+        raise ValidationError(f"Invalid numeric matcher: {json.dumps(operand)}")
+    comparisons = []
+    for operator, limit in zip(operand[::2], operand[1::2]):
+        if operator not in NUMERIC_OPERATORS or not is_number(limit):
+            raise ValidationError(f"Invalid numeric matcher: {json.dumps(operand)}")
+        comparisons.append((NUMERIC_OPERATORS[operator], limit))
+    return lambda v: is_number(v) and all(compare(v, limit) for compare, limit in comparisons)
+
+
+def compile_cidr(operand):
+    """Compile a cidr matcher for IP address strings.
+
+    Raises:
+        ValidationError: If the operand is not a network
+    """
+    try:
+        network = ipaddress.ip_network(operand, strict=False)
+    except (TypeError, ValueError) as e:
+        raise ValidationError(f"Invalid cidr matcher: {e}")
+
+    def match(value):
+        try:
+            return ipaddress.ip_address(value) in network
+        except (TypeError, ValueError):
+            return False
+
+    return match
+
+
+def compile_anything_but(operand):
+    """Compile an anything-but matcher, which fails on the excluded values.
+
+    Raises:
+        ValidationError: If the operand is not valid
+    """
+    if isinstance(operand, dict):
+        if len(operand) != 1:
+            raise ValidationError(f"Invalid anything-but matcher: {json.dumps(operand)}")
+        name, inner = next(iter(operand.items()))
+        if name not in ("prefix", "suffix", "equals-ignore-case", "wildcard"):
+            raise ValidationError(f"Invalid anything-but matcher: {json.dumps(operand)}")
+        excluded = [
+            compile_string_matcher(name, value)
+            for value in (inner if isinstance(inner, list) else [inner])
+        ]
+        return lambda v: isinstance(v, str) and not any(m(v) for m in excluded)
+
+    values = operand if isinstance(operand, list) else [operand]
+    literal = compile_literals(values)
+    return lambda v: not isinstance(v, dict) and not literal(v)
+
+
+def compile_literals(values):
+    """Compile exact values, strings by set lookup and numbers by value."""
+    strings = frozenset(v for v in values if isinstance(v, str))
+    numbers = [v for v in values if is_number(v)]
+    others = [v for v in values if v is None or isinstance(v, bool)]
+
+    def match(value):
+        if isinstance(value, str):
+            return value in strings
+        if is_number(value):
+            return any(value == n for n in numbers)
+        return any(value is o for o in others)
+
+    return match
+
+
+def compile_matcher(matcher):
+    """Compile one element of a pattern value list.
+
+    Returns:
+        tuple: (match function, exists), exists is False and the function None
+        for {"exists": false}, which matches missing fields
+
+    Raises:
+        ValidationError: If the matcher is unknown or malformed
+    """
+    if len(matcher) != 1:
+        raise ValidationError(f"Invalid matcher: {json.dumps(matcher)}")
+    name, operand = next(iter(matcher.items()))
+    if name == "exists":
+        if not isinstance(operand, bool):
+            raise ValidationError(f"exists matcher needs true or false: {json.dumps(operand)}")
+        return (lambda v: not isinstance(v, dict)) if operand else None, operand
+    if name in ("prefix", "suffix", "equals-ignore-case", "wildcard"):
+        return compile_string_matcher(name, operand), True
+    if name == "numeric":
+        return compile_numeric(operand), True
+    if name == "anything-but":
+        return compile_anything_but(operand), True
+    if name == "cidr":
+        return compile_cidr(operand), True
+    raise ValidationError(f"Unknown matcher '{name}'")
+
+
+def compile_field(path, matchers):
+    """Compile the value list of a field into a check of an event.
+
+    Raises:
+        ValidationError: If the value list or a matcher is invalid
+    """
+    if not isinstance(matchers, list) or not matchers:
+        raise ValidationError(f"Pattern field {'.'.join(path)} must be a non-empty list")
+
+    literals = [m for m in matchers if not isinstance(m, dict)]
+    checks = [compile_literals(literals)] if literals else []
+    match_missing = False
+    for matcher in (m for m in matchers if isinstance(m, dict)):
+        check, exists = compile_matcher(matcher)
+        if exists is False:
+            match_missing = True
+        else:
+            checks.append(check)
+
+    if len(checks) == 1 and not match_missing:
+        check = checks[0]
+        if len(path) == 1:
+            key = path[0]
+
+            def check_top(event):
+                value = event.get(key)
+                if isinstance(value, list):
+                    return any(check(v) for v in value)
+                return key in event and check(value)
+
+            return check_top
+        return lambda event: any(check(v) for v in resolve(event, path))
+
+    def check_field(event):
+        values = resolve(event, path)
+        if not values:
+            return match_missing
+        return any(check(v) for v in values for check in checks)
+
+    return check_field
+
+
+def compile_object(pattern, path=()):
+    """Compile the fields of a pattern object into a list of checks.
+
+    Raises:
+        ValidationError: If the pattern is invalid
+    """
+    if not isinstance(pattern, dict):
+        raise ValidationError(f"Pattern {'.'.join(path) or 'root'} must be an object")
+
+    checks = []
+    for key, value in pattern.items():
+        if key == "$or":
+            if not isinstance(value, list) or len(value) < 2:
+                raise ValidationError("$or needs a list of at least two patterns")
+            alternatives = [compile_object(alternative, path) for alternative in value]
+            checks.append(
+                lambda event, alternatives=alternatives: any(
+                    all(check(event) for check in alternative) for alternative in alternatives
+                )
+            )
+        elif isinstance(value, dict):
+            checks.extend(compile_object(value, path + (key,)))
+        else:
+            checks.append(compile_field(path + (key,), value))
+    return checks
+
+
+def compile_pattern(pattern):
+    """Compile an EventBridge event pattern.
+
+    Args:
+        pattern: Pattern as a dictionary or JSON string
+
+    Returns:
+        callable: Function of an event dictionary returning True if it matches
+
+    Raises:
+        ValidationError: If the pattern is invalid
+    """
+    if isinstance(pattern, str):
+        try:
+            pattern = json.loads(pattern)
+        except json.JSONDecodeError as e:
+            raise ValidationError(f"Could not parse event pattern: {e}")
+    checks = compile_object(pattern)
+    if not checks:
+        raise ValidationError("Event pattern must not be empty")
+    return lambda event: all(check(event) for check in checks)
+
+
+def to_eventbridge_event(record):
+    """Wrap a raw CloudTrail record as EventBridge delivers it, other events are unchanged."""
+    if "detail-type" in record or "eventSource" not in record:
+        return record
+    event_source = record["eventSource"]
+    detail_type = (
+        "AWS Console Sign In via CloudTrail"
+        if event_source == "signin.amazonaws.com"
+        else "AWS API Call via CloudTrail"
+    )
+    return {
+        "version": "0",
+        "detail-type": detail_type,
+        "source": "aws." + event_source.split(".", 1)[0],
+        "account": record.get("recipientAccountId", ""),
+        "time": record.get("eventTime", ""),
+        "region": record.get("awsRegion", ""),
+        "resources": [],
+        "detail": record,
+    }
+
+
+def read_events(paths):
+    """Yield the events of JSONL corpora.
+
+    Raises:
+        ValidationError: If a file cannot be read or a line is not JSON
+    """
+    for path in paths:
+        try:
+            with open(path) as fh:
+                for number, line in enumerate(fh, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValidationError(f"{path}:{number} is not JSON: {e}")
+                    for record in data.get("Records", [data]) if isinstance(data, dict) else []:
+                        yield to_eventbridge_event(record)
+        except OSError as e:
+            raise ValidationError(f"Could not read {path}: {e}")
+
+
+def event_name(event):
+    """Return a label for an event, the API call name for CloudTrail events."""
+    detail = event.get("detail")
+    if isinstance(detail, dict) and "eventName" in detail:
+        return f"{detail.get('eventSource', '')}:{detail['eventName']}"
+    return str(event.get("detail-type", ""))
+
+
+def policy_patterns(policies_dict):
+    """Return policy name to event pattern for the event mode policies in a file.
+
+    Raises:
+        ValidationError: If a pattern cannot be generated
+    """
+    patterns = {}
+    for policy in canonicalize_policies(policies_dict).get("policies", []):
+        mode = policy.get("mode", {})
+        if mode.get("type") not in ALLOWED_TYPES:
+            continue
+        try:
+            pattern = generate_event_pattern(mode["type"], mode.get("events"), mode.get("pattern"))
+        except ValidationError as e:
+            raise ValidationError(f"Policy '{policy['name']}': {e}") from e
+        patterns[policy["name"]] = json.loads(pattern)
+    return patterns
+
+
+def match_events(patterns, events):
+    """Match events against several patterns.
+
+    Args:
+        patterns: Name to event pattern
+        events: Iterable of event dictionaries
+
+    Returns:
+        dict: events, seconds, events_per_second and per pattern matched,
+        match_rate and top_events, the most frequent matched events
+
+    Raises:
+        ValidationError: If a pattern is invalid
+    """
+    compiled = []
+    for name, pattern in patterns.items():
+        try:
+            compiled.append((name, compile_pattern(pattern), Counter()))
+        except ValidationError as e:
+            raise ValidationError(f"Pattern '{name}': {e}") from e
+
+    total = 0
+    seconds = 0.0
+    for event in events:
+        total += 1
+        start = time.perf_counter()
+        matched = [counter for _, match, counter in compiled if match(event)]
+        seconds += time.perf_counter() - start
+        for counter in matched:
+            counter[event_name(event)] += 1
+
+    report = {
+        "events": total,
+        "seconds": round(seconds, 6),
+        "events_per_second": round(total / seconds) if seconds else None,
+        "patterns": {},
+    }
+    for name, _, counter in compiled:
+        matched = sum(counter.values())
+        report["patterns"][name] = {
+            "matched": matched,
+            "match_rate": round(matched / total, 6) if total else 0.0,
+            "top_events": dict(counter.most_common(TOP_EVENTS)),
+        }
+    return report
+
+
+def read_pattern_files(paths):
+    """Return file name to pattern for pattern JSON files."""
+    patterns = {}
+    for path in paths:
+        with open(path) as fh:
+            patterns[os.path.basename(path).split(".", 1)[0]] = json.load(fh)
+    return patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match event patterns against event corpora")
+    parser.add_argument("events", nargs="+", help="JSONL files of events or CloudTrail records")
+    parser.add_argument("--policies", help="Policies file, matching each event mode policy")
+    parser.add_argument(
+        "--pattern", action="append", default=[], help="Event pattern JSON file, repeatable"
+    )
+    args = parser.parse_args()
+
+    try:
+        patterns = read_pattern_files(args.pattern)
+        if args.policies:
+            with open(args.policies) as fh:
+                patterns.update(
+                    policy_patterns(validate_format({"policies": fh.read()}, "policies"))
+                )
+        if not patterns:
+            raise ValidationError("No event patterns, use --policies or --pattern")
+        report = match_events(patterns, read_events(args.events))
+    except (OSError, json.JSONDecodeError, ValidationError) as e:
+        print(f"Failed to match events: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
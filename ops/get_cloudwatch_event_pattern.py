@@ -12,17 +12,16 @@ Outputs:
 
 """
 
-import json
 import sys
 
 from ops.common import (
     validate_policy_structure,
-    return_result,
-    return_error,
+    run_cli,
     validate_with_custodian,
     validate_policy_mode,
     ValidationError,
     parse_policies,
+    canonicalize_policies,
 )
 
 try:
@@ -101,6 +100,24 @@ def validate_event_pattern(policy_dict):
     return events, pattern
 
 
+def policy_event_pattern(policy_instance):
+    """Generate the CloudWatch event pattern of a validated policy.
+
+    Args:
+        policy_instance: Cloud Custodian Policy from validate_with_custodian
+
+    Returns:
+        String representation of the event pattern
+
+    Raises:
+        ValidationError: If the policy has no events or pattern, or generation fails
+    """
+    events, pattern = validate_event_pattern(policy_instance.data)
+    return generate_event_pattern(
+        policy_instance.data["mode"]["type"], events=events, pattern=pattern
+    )
+
+
 def process_policies(query):
     """Process a query that should contain policies and return event pattern.
 
@@ -113,30 +130,15 @@ def process_policies(query):
     Raises:
         ValidationError: If processing fails
     """
-    policies_dict = parse_policies(query)
+    policies_dict = canonicalize_policies(parse_policies(query))
     policy_list = validate_policy_structure(policies_dict)
-    event_type = validate_policy_mode(policy_list[0], ALLOWED_TYPES)
-    validate_with_custodian(policies_dict)
-    events, pattern = validate_event_pattern(policy_list[0])
-    event_pattern = generate_event_pattern(event_type, events=events, pattern=pattern)
-    return {"event_pattern": event_pattern}
+    validate_policy_mode(policy_list[0], ALLOWED_TYPES)
+    policy_instance = validate_with_custodian(policies_dict)
+    return {"event_pattern": policy_event_pattern(policy_instance)}
 
 
 def main():
-    try:
-        query = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        return_error(f"Failed to parse input JSON: {e}")
-    except Exception as e:  # pragma: no cover
-        return_error(f"Unexpected error reading input: {type(e).__name__}: {e}")
-
-    try:
-        result = process_policies(query)
-        return_result(result)
-    except ValidationError as e:
-        return_error(str(e))
-    except RuntimeError as e:
-        return_error(str(e))
+    run_cli(process_policies)
 
 
 if __name__ == "__main__":
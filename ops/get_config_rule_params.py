@@ -12,23 +12,16 @@ Outputs a JSON object: { ...config rule params... }
 import json
 import sys
 
-from types import SimpleNamespace
 from ops.common import (
     validate_format,
     validate_policy_structure,
     validate_policy_mode,
     validate_with_custodian,
-    ValidationError,
-    return_result,
-    return_error,
+    run_cli,
 )
 
 try:
     from c7n.mu import ConfigRule, PolicyLambda
-    from c7n.policy import Policy
-    from c7n.resources import load_resources
-    from c7n.schema import StructureParser
-    from c7n.exceptions import PolicyValidationError
 except ImportError:  # pragma: no cover
     print(
         "Cloud Custodian (c7n) package is not installed. Please install it",
@@ -38,52 +31,39 @@ except ImportError:  # pragma: no cover
 
 
 ALLOWED_TYPES = {"config-rule", "config-poll-rule"}
+FUNCTION_ARN = "arn:aws:lambda:us-east-1:123456789012:function:dummy"
 
 
-def create_policy_objects(policy_dict):
-    """Create policy_lambda and config_rule from policy.
+class ConfigRuleLambda(PolicyLambda):
+    """PolicyLambda without a code archive, which the config rule parameters do not use.
 
     Args:
-        policy_dict: Dictionary containing policy configuration
+        policy: Validated Cloud Custodian Policy
+        arn: Function ARN used as the rule source
+    """
+
+    def __init__(self, policy, arn=FUNCTION_ARN):
+        self.policy = policy
+        self.arn = arn
+
+
+def create_policy_objects(policy_instance):
+    """Create policy_lambda and config_rule from a validated policy.
+
+    Args:
+        policy_instance: Cloud Custodian Policy from validate_with_custodian
 
     Returns:
         Tuple of (policy_lambda, config_rule)
 
     Raises:
-        ValidationError: If object creation fails
+        RuntimeError: If object creation fails
     """
     try:
-        policy_structure = {"policies": [policy_dict]}
-        structure = StructureParser()
-        structure.validate(policy_structure)
-        rtypes = structure.get_resource_types(policy_structure)
-        load_resources(rtypes)
-
-        options = SimpleNamespace(
-            region="us-east-1",
-            profile=None,
-            assume_role=None,
-            session_policy=None,
-            external_id=None,
-            account_id=None,
-            role=None,
-            session_name=None,
-            metrics=None,
-            metrics_enabled=False,
-            tracer=None,
-            cache=None,
-            cache_period=0,
-        )
-
-        policy = Policy(policy_dict, options=options)
-        policy_lambda = PolicyLambda(policy)
-        policy_lambda.arn = "arn:aws:lambda:us-east-1:123456789012:function:dummy"
-        config_rule = ConfigRule(policy_dict["mode"], session_factory=None)
-
+        policy_lambda = ConfigRuleLambda(policy_instance)
+        config_rule = ConfigRule(policy_instance.data["mode"], session_factory=None)
         return policy_lambda, config_rule
-    except PolicyValidationError as e:
-        raise ValidationError(str(e))
-    except Exception as e:  # pragma: no cover
+    except Exception as e:
         raise RuntimeError(f"Unexpected error creating policy objects: {type(e).__name__}: {e}")
 
 
@@ -128,26 +108,13 @@ def process_policies(query):
     policies_dict = validate_format(query, "policies")
     policy_list = validate_policy_structure(policies_dict)
     validate_policy_mode(policy_list[0], ALLOWED_TYPES)
-    validate_with_custodian(policies_dict)
-    policy_lambda, config_rule = create_policy_objects(policy_list[0])
+    policy_instance = validate_with_custodian(policies_dict)
+    policy_lambda, config_rule = create_policy_objects(policy_instance)
     return extract_config_rule_params(policy_lambda, config_rule)
 
 
 def main():
-    try:
-        query = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        return_error(f"Failed to parse input JSON: {e}")
-    except Exception as e:  # pragma: no cover
-        return_error(f"Unexpected error reading input: {type(e).__name__}: {e}")
-
-    try:
-        params = process_policies(query)
-        return_result(params)
-    except ValidationError as e:
-        return_error(str(e))
-    except RuntimeError as e:
-        return_error(str(e))
+    run_cli(process_policies)
 
 
 if __name__ == "__main__":
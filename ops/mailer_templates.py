@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Collect and precompile Cloud Custodian mailer templates.
+
+Templates are compiled with Jinja2's module compiler using the same environment
+settings c7n_mailer renders with, so syntax errors surface when the mailer is
+validated and the Lambda can load compiled modules instead of parsing sources
+on every cold start.
+"""
+
+import hashlib
+import os
+import sys
+
+from ops.common import ValidationError
+from ops.manifest import FileIndex
+
+try:
+    import jinja2
+    from c7n_mailer.utils import get_jinja_env
+except ImportError:  # pragma: no cover
+    print(
+        "Cloud Custodian mailer (c7n-mailer) package is not installed. Please install it",
+        file=sys.stderr,
+    )
+    sys.exit(1)
+
+
+TEMPLATE_EXTENSION = ".j2"
+COMPILED_TEMPLATES_DIR = "msg-templates-compiled"
+TEMPLATE_INDEX_PATH = os.path.join("build", ".mailer-template-index.json")
+
+# Prepended to the mailer entry source. c7n_mailer builds a new environment for
+# every render, so a single loader is shared to keep compiled modules cached for
+# the life of the container, falling back to the template sources.
+COMPILED_TEMPLATES_ENTRY = f"""\
+import sys
+
+import jinja2
+from c7n_mailer import utils
+
+
+class CachedModuleLoader(jinja2.ModuleLoader):
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.modules = {{}}
+
+    def load(self, environment, name, globals=None):
+        mod = self.modules.get(name)
+        if mod is None:
+            module = "%s.%s" % (self.package_name, self.get_template_key(name))
+            try:
+                mod = __import__(module, None, None, ["root"])
+            except ImportError as e:
+                raise jinja2.TemplateNotFound(name) from e
+            sys.modules.pop(module, None)
+            self.modules[name] = mod
+        return environment.template_class.from_module_dict(
+            environment, mod.__dict__, globals or {{}})
+
+
+compiled_loader = CachedModuleLoader("{COMPILED_TEMPLATES_DIR}")
+source_jinja_env = utils.get_jinja_env
+
+
+def get_jinja_env(template_folders):
+    env = source_jinja_env(template_folders)
+    env.loader = jinja2.ChoiceLoader([compiled_loader, env.loader])
+    return env
+
+
+utils.get_jinja_env = get_jinja_env
+
+"""
+
+
+def iter_template_files(folders):
+    """Yield template files in deterministic order.
+
+    Args:
+        folders: Template folder paths, missing folders are skipped
+
+    Yields:
+        tuple: (template name, absolute path)
+    """
+    for d in sorted(set(folders or [])):
+        if not os.path.exists(d):
+            continue
+
+        template_files = sorted(
+            [f for f in os.listdir(d) if os.path.splitext(f)[1] == TEMPLATE_EXTENSION]
+        )
+        for t in template_files:
+            yield t, os.path.join(d, t)
+
+
+def effective_templates(template_files):
+    """Resolve shadowed template names, later folders win.
+
+    Args:
+        template_files: Iterable of (template name, path) in folder order
+
+    Returns:
+        dict: Template name to the path that is packaged, sorted by name
+    """
+    effective = {}
+    for name, path in template_files:
+        effective[name] = path
+    return {name: effective[name] for name in sorted(effective)}
+
+
+def find_shadowed(template_files):
+    """Find template names provided by more than one folder.
+
+    Args:
+        template_files: Iterable of (template name, path) in folder order
+
+    Returns:
+        dict: Template name to every path providing it, the last one is packaged
+    """
+    paths = {}
+    for name, path in template_files:
+        paths.setdefault(name, []).append(path)
+    return {name: found for name, found in sorted(paths.items()) if len(found) > 1}
+
+
+class TemplateIndex(FileIndex):
+    """FileIndex of template files that also records which templates compiled.
+
+    Files whose size and mtime are unchanged since the last run are not re-read,
+    and templates that compiled before are not compiled again.
+
+    Args:
+        path: JSON file the index is loaded from and saved to, None keeps it in memory
+    """
+
+    def scan(self, folders):
+        """Index the templates in the folders.
+
+        Args:
+            folders: Template folder paths
+
+        Returns:
+            list: (template name, path, entry) in folder order
+        """
+        return [(name, path, self.entry(path)) for name, path in iter_template_files(folders)]
+
+    def mark_valid(self, path):
+        """Record that a template compiled without errors."""
+        self.update(path, valid=True)
+
+
+def template_digest(scanned):
+    """Deterministic digest of the packaged templates.
+
+    Args:
+        scanned: Output of TemplateIndex.scan
+
+    Returns:
+        str: sha256 hex digest over the effective template names and content hashes
+    """
+    hashes = {path: entry["sha256"] for _, path, entry in scanned}
+    effective = effective_templates((name, path) for name, path, _ in scanned)
+    hasher = hashlib.sha256()
+    for name, path in effective.items():
+        hasher.update(f"{name}\0{hashes[path]}\n".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def compile_templates(templates):
+    """Compile templates to Jinja2 module source.
+
+    Args:
+        templates: Dict of template name to (source, filename)
+
+    Returns:
+        dict: Compiled module filename to python source, in template name order
+
+    Raises:
+        ValidationError: If any template has a syntax error
+    """
+    env = get_jinja_env([])
+    compiled = {}
+    errors = []
+
+    for name in sorted(templates):
+        source, filename = templates[name]
+        try:
+            code = env.compile(source, name, filename, raw=True, defer_init=True)
+        except jinja2.TemplateSyntaxError as e:
+            errors.append(f"{filename or name}:{e.lineno}: {e.message}")
+            continue
+        compiled[jinja2.ModuleLoader.get_module_filename(name)] = code
+
+    if errors:
+        bulleted = "\n".join(f"  - {line}" for line in errors)
+        raise ValidationError(f"Mailer template syntax errors:\n{bulleted}")
+
+    return compiled
+
+
+def validate_templates(folders, index=None):
+    """Compile every template in the folders, raising on syntax errors.
+
+    Args:
+        folders: Template folder paths
+        index: Optional TemplateIndex, templates that compiled before are skipped
+
+    Returns:
+        list: Names of the templates in the folders
+
+    Raises:
+        ValidationError: If any template has a syntax error
+    """
+    index = index or TemplateIndex()
+    scanned = index.scan(folders)
+
+    templates = {}
+    for name, path, entry in scanned:
+        if entry.get("valid"):
+            continue
+        with open(path) as fh:
+            # Validate every file, including shadowed ones, under a unique key
+            templates[path] = (fh.read(), path)
+
+    compile_templates(templates)
+    for path in templates:
+        index.mark_valid(path)
+
+    return sorted({name for name, _, _ in scanned})
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Fingerprint the inputs of a Cloud Custodian lambda archive.
+
+The fingerprint covers everything that ends up in the zip: the generated
+config.json and handler, the digest of every file copied from the bundled
+modules, and the options that change how those files are added. File digests
+are kept in a persistent index keyed on path, size and mtime, so unchanged files
+are not re-read.
+
+A build manifest records the archive hashes for a fingerprint. Plans can then
+report the source_code_hash of an archive that was built before without
+building it again, and every real build is checked against the recorded hash.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import zlib
+
+FILE_INDEX_PATH = os.path.join("build", ".package-file-index.json")
+
+
+class FileIndex:
+    """Persistent index of file content hashes keyed on path, size and mtime.
+
+    Extra fields stored on an entry are kept while the content hash is unchanged.
+
+    Args:
+        path: JSON file the index is loaded from and saved to, None keeps it in memory
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.reads = 0
+        self._dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path) as fh:
+                    self.entries = json.load(fh)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def entry(self, path):
+        """Return the index entry for a file, hashing it only if it changed."""
+        stat = os.stat(path)
+        cached = self.entries.get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached
+
+        with open(path, "rb") as fh:
+            content = fh.read()
+        self.reads += 1
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": hashlib.sha256(content).hexdigest(),
+        }
+        if cached and cached["sha256"] == entry["sha256"]:
+            entry = dict(cached, **entry)
+        self.entries[path] = entry
+        self._dirty = True
+        return entry
+
+    def digest(self, path):
+        """Return the sha256 hex digest of a file."""
+        return self.entry(path)["sha256"]
+
+    def update(self, path, **fields):
+        """Store extra fields on an indexed file."""
+        entry = self.entries[path]
+        if any(entry.get(k) != v for k, v in fields.items()):
+            entry.update(fields)
+            self._dirty = True
+
+    def save(self):
+        """Write the index back to disk if anything changed."""
+        if not self.path or not self._dirty:
+            return
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(self.entries, fh, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+
+
+def module_files(modules):
+    """List the files PythonPackageArchive.add_modules copies for the modules.
+
+    Args:
+        modules: Top-level module names
+
+    Returns:
+        list: Sorted (archive path, file path) tuples
+    """
+    files = []
+    for name in modules:
+        module = importlib.import_module(name)
+        if not hasattr(module, "__path__"):
+            path = module.__file__
+            if path.endswith(".pyc"):
+                path = path[:-1]
+            files.append((os.path.basename(path), path))
+            continue
+
+        # Like add_modules, a module with an empty __path__ such as six adds nothing
+        for directory in module.__path__:
+            for root, dirs, filenames in os.walk(directory):
+                arc_prefix = os.path.relpath(root, os.path.dirname(directory))
+                if "__pycache__" in dirs:
+                    dirs.remove("__pycache__")
+                for f in filenames:
+                    if f.endswith(".pyc") or f.endswith(".c"):
+                        continue
+                    files.append((os.path.join(arc_prefix, f), os.path.join(root, f)))
+    return sorted(files)
+
+
+def archive_fingerprint(contents, modules, index=None, options=None):
+    """Deterministic fingerprint of an archive's inputs.
+
+    Args:
+        contents: Dict of archive path to generated file contents
+        modules: Top-level modules copied into the archive
+        index: Optional FileIndex used for module file digests
+        options: JSON-serializable options that change how files are added
+
+    Returns:
+        str: sha256 hex digest
+    """
+    index = index or FileIndex()
+    hasher = hashlib.sha256()
+    # Compressed bytes depend on the zlib build
+    hasher.update(f"zlib\0{zlib.ZLIB_RUNTIME_VERSION}\n".encode("utf-8"))
+    hasher.update(f"options\0{json.dumps(options, sort_keys=True)}\n".encode("utf-8"))
+
+    for arc_path, path in module_files(modules):
+        hasher.update(f"{arc_path}\0{index.digest(path)}\n".encode("utf-8"))
+
+    for arc_path in sorted(contents):
+        content = contents[arc_path]
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        hasher.update(f"{arc_path}\0{hashlib.sha256(content).hexdigest()}\n".encode("utf-8"))
+
+    return hasher.hexdigest()
+
+
+def check_prediction(predicted, result):
+    """Check a built archive against the hashes recorded for its fingerprint.
+
+    Args:
+        predicted: Result recorded for the fingerprint, or None
+        result: Result of the build
+
+    Raises:
+        RuntimeError: If the built archive hash differs from the recorded one
+    """
+    if predicted and predicted.get("sha256_hex") != result["sha256_hex"]:
+        raise RuntimeError(
+            f"Archive hash {result['sha256_hex']} does not match the hash "
+            f"{predicted.get('sha256_hex')} recorded for the same inputs"
+        )
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Package several periodic policies into one Lambda function for Cloud Custodian
+
+Builds one archive with all the named policies in config.json and a handler that
+runs them in one interpreter, see ops/bundle.py. The policies must share their
+mode apart from tags.
+
+Expects JSON input with:
+- policies
+- policy_names: JSON list of the policies to bundle, run in this order
+- execution_options
+- function_name
+- role
+- bundle_concurrency: (optional) number of policies run at once, default 1
+- package_pruning, tags_in_archive, hash_only, remote_cache, policy_snapshot,
+  archive_size_budget: (optional) as for ops/package_lambda_policy.py
+
+- regions: (optional) JSON list of the regions the function is deployed to
+
+Outputs the same information as ops/package_lambda_policy.py, with policy_regions
+the union of the regions of the bundled policies, and:
+- bundle_policies: JSON list of the bundled policy names
+
+A policy without conditions deploys to no region on its own, so a bundle where
+only some policies have conditions needs regions; without it, the conditions of
+one policy would decide where the others run.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from ops.bundle import parse_bundle_concurrency, select_policies, validate_bundle
+from ops.common import (
+    StageTimer,
+    ValidationError,
+    canonicalize_policies,
+    run_cli,
+    validate_format,
+    validate_with_custodian,
+)
+from ops.package_lambda_policy import (
+    add_tags_to_policy,
+    check_archive_size,
+    get_lambda_package_versions,
+    get_policy_regions,
+    get_regions,
+    get_tags,
+    package_archive,
+    package_result,
+    policy_contains_conditions,
+    process_exec_options,
+)
+from ops.prune import parse_prune_options
+
+
+def parse_policy_names(query):
+    """Parse the policy_names query parameter.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        list: Policy names
+
+    Raises:
+        ValidationError: If the value is not a JSON list of names
+    """
+    try:
+        names = json.loads(query["policy_names"])
+    except (json.JSONDecodeError, TypeError) as e:
+        raise ValidationError(f"Could not parse 'policy_names' as JSON: {e}")
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        raise ValidationError("policy_names must be a JSON list of policy names")
+    return names
+
+
+def process_policies(query):
+    """Process a query that should contain the policies of a bundle.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        tuple: (policy_list, packages, validated_policies)
+
+    Raises:
+        ValidationError: If a policy is invalid or the policies cannot share a function
+    """
+    policies_dict = select_policies(
+        canonicalize_policies(validate_format(query, "policies")), parse_policy_names(query)
+    )
+    policy_list = policies_dict["policies"]
+    validate_bundle(policy_list)
+
+    validated_policies = []
+    for policy in policy_list:
+        try:
+            validated_policies.append(validate_with_custodian({"policies": [policy]}))
+        except ValidationError as e:
+            raise ValidationError(f"Policy validation failed for '{policy['name']}': {e}") from e
+
+    validate_bundle_regions(validated_policies, query)
+
+    tags = get_tags(policy_list, query)
+    for policy in policy_list:
+        add_tags_to_policy([policy], tags)
+        policy["mode"]["role"] = query["role"]
+    packages = policy_list[0]["mode"].get("packages", [])
+    check_archive_size(query, packages, validated_policies)
+
+    return policy_list, packages, validated_policies
+
+
+def parse_regions(query):
+    """Parse the optional regions query parameter.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        list: Region names, empty when not given
+
+    Raises:
+        ValidationError: If the value is not a JSON list of names
+    """
+    try:
+        regions = json.loads(query.get("regions") or "[]")
+    except json.JSONDecodeError as e:
+        raise ValidationError(f"Could not parse 'regions' as JSON: {e}")
+    if not isinstance(regions, list) or not all(isinstance(r, str) for r in regions):
+        raise ValidationError("regions must be a JSON list of region names")
+    return regions
+
+
+def validate_bundle_regions(validated_policies, query):
+    """Check that the bundle's deployment regions do not depend on a single policy.
+
+    Args:
+        validated_policies: Validated Cloud Custodian Policy objects of the bundle
+        query: Dictionary with query parameters
+
+    Raises:
+        ValidationError: If only some policies have conditions and no regions are given
+    """
+    unconditioned = [p.name for p in validated_policies if not policy_contains_conditions(p)]
+    if 0 < len(unconditioned) < len(validated_policies) and not parse_regions(query):
+        raise ValidationError(
+            f"Policies {', '.join(unconditioned)} have no region conditions while other "
+            "bundled policies do; set regions or give every bundled policy conditions"
+        )
+
+
+def get_bundle_regions(validated_policies):
+    """Return the union of the regions of the bundled policies.
+
+    The enabled regions are looked up once for the whole bundle. c7n checks each
+    policy's conditions again when it runs, so a policy only acts in its own regions.
+
+    Args:
+        validated_policies: Validated Cloud Custodian Policy objects of the bundle
+
+    Returns:
+        set: Region names matching any bundled policy's region conditions
+    """
+    conditioned = [p for p in validated_policies if policy_contains_conditions(p)]
+    if not conditioned:
+        return set()
+    all_regions = get_regions()
+    regions = set()
+    for policy in conditioned:
+        regions.update(get_policy_regions(policy, all_regions))
+    return regions
+
+
+def run(query):
+    """Package the bundle in a query, as the external data source does.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        dict: Result dictionary with information about the zip file and stage_timings
+
+    Raises:
+        ValidationError: If required fields are missing or the input is invalid
+        RuntimeError: If packaging fails
+    """
+    required = ["policies", "policy_names", "execution_options", "function_name", "role"]
+    missing = [field for field in required if not query.get(field)]
+    if missing:
+        raise ValidationError(f"Missing required fields: {', '.join(missing)}")
+
+    timer = StageTimer()
+    policy_list, packages, validated_policies = timer.run("policies", process_policies, query)
+    bundle = {"concurrency": parse_bundle_concurrency(query)}
+
+    try:
+        exec_options = timer.run("exec_options", process_exec_options, query)
+    except ValidationError as e:
+        raise ValidationError(f"Failed to validate execution options: {e}") from e
+
+    try:
+        prune_options = parse_prune_options(query)
+    except ValidationError as e:
+        raise ValidationError(f"Failed to validate package pruning options: {e}") from e
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            regions = pool.submit(timer.run, "regions", get_bundle_regions, validated_policies)
+            versions = pool.submit(
+                timer.run, "package_versions", get_lambda_package_versions, packages
+            )
+            archive_result = timer.run(
+                "package",
+                package_archive,
+                query,
+                policy_list,
+                exec_options,
+                packages,
+                prune_options,
+                validated_policies,
+                bundle,
+            )
+            result = package_result(
+                archive_result, policy_list, regions.result(), versions.result()
+            )
+    except RuntimeError as e:
+        raise RuntimeError(f"Failed to package lambda: {e}") from e
+
+    result["bundle_policies"] = json.dumps([p["name"] for p in policy_list])
+    result["stage_timings"] = json.dumps(timer.report())
+    return result
+
+
+def main():
+    run_cli(run)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
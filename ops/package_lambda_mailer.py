@@ -8,28 +8,55 @@ Config.json is generated from inputs.
 
 Expects JSON input with:
 - mailer_config
+- tags_in_archive: (optional) "false" keeps lambda_tags out of the archived config.json
+- remote_cache: (optional) shared directory or HTTP URL, see ops/remote_cache.py
 
 Outputs information regarding the zip created in JSON format:
 - sha256_hex
 - sha256_base64
 - zip_path
 - package_versions
+- custodian_tags: JSON tags for the function, including lambda_tags kept out of the archive
+- dependency_report: JSON summary of the transport dependencies bundled and dropped
+- template_shadowing: JSON map of template names provided by more than one folder
+- remote_cache: local, disabled, hit, miss or error: <message>
 """
 
 import copy
 import hashlib
+import importlib
 import json
 import os
+import subprocess  # nosec B404
 import sys
+import tempfile
 
 from ops.common import (
     validate_format,
-    return_result,
-    return_error,
+    run_cli,
     hex_ascii_encoder,
     copy_archive,
     get_package_versions,
     get_force_deploy_tags,
+    load_cached_build,
+    save_cached_build,
+    tags_in_archive,
+    canonical_json,
+    link_module,
+    LAMBDA_RUNTIME_MODULES,
+    ValidationError,
+)
+from ops.remote_cache import cached_build
+from ops.mailer_templates import (
+    COMPILED_TEMPLATES_DIR,
+    COMPILED_TEMPLATES_ENTRY,
+    TEMPLATE_INDEX_PATH,
+    TemplateIndex,
+    compile_templates,
+    effective_templates,
+    find_shadowed,
+    iter_template_files,
+    template_digest,
 )
 
 try:
@@ -76,6 +103,172 @@ CORE_DEPS = [
     "ecdsa",
 ]
 
+# CORE_DEPS grouped by the mailer config keys that enable them. A group with no
+# keys is always bundled. requests is always bundled as slack webhooks can be
+# addressed directly in policies without any mailer config. datadog is always
+# bundled as datadog:// targets are also chosen per message in policies, and
+# the datadog library can read its keys from the environment instead of the
+# mailer config.
+DEPENDENCY_GROUPS = [
+    ("core", (), ["jinja2", "markupsafe", "yaml", "jmespath", "jwt", "pkg_resources"]),
+    ("requests", (), ["requests", "urllib3", "idna", "charset_normalizer", "certifi"]),
+    ("ldap", ("ldap_uri",), ["ldap3", "pyasn1"]),
+    ("redis", ("ldap_uri", "redis_host"), ["redis"]),
+    ("datadog", (), ["datadog", "decorator"]),
+    ("splunk", ("splunk_hec_url",), ["jsonpointer", "jsonpatch"]),
+    ("sendgrid", ("sendgrid_api_key",), ["sendgrid", "python_http_client", "ecdsa"]),
+]
+
+# Entry module that loads precompiled templates before the template sources
+mailer_entry_source = COMPILED_TEMPLATES_ENTRY + entry_source
+
+IMPORT_CHECK = """\
+import json
+import sys
+
+sys.path[:0] = {paths!r}
+try:
+    import periodic
+except ModuleNotFoundError as e:
+    print(json.dumps({{"missing": e.name}}))
+else:
+    print(json.dumps({{"missing": None}}))
+"""
+
+
+def select_dependency_groups(config):
+    """Select the dependency groups needed by the transports in the mailer config.
+
+    Args:
+        config: Validated mailer configuration dictionary
+
+    Returns:
+        list: Names of the dependency groups to bundle
+    """
+    return [
+        name
+        for name, keys, _ in DEPENDENCY_GROUPS
+        if not keys or any(config.get(key) for key in keys)
+    ]
+
+
+def group_modules(groups):
+    """Return the modules for the dependency groups in CORE_DEPS order."""
+    modules = {m for name, _, group in DEPENDENCY_GROUPS if name in groups for m in group}
+    return [m for m in CORE_DEPS if m in modules]
+
+
+def module_group(module_name):
+    """Return the dependency group providing a top level module, or None."""
+    for name, _, modules in DEPENDENCY_GROUPS:
+        if module_name in modules:
+            return name
+    return None
+
+
+def find_missing_module(deps):
+    """Import the mailer entry module in an isolated interpreter.
+
+    Only the bundled modules and the modules the Lambda runtime provides are
+    importable, so a missing dependency shows up as a ModuleNotFoundError.
+
+    Args:
+        deps: Modules that would be bundled alongside c7n_mailer
+
+    Returns:
+        str: Top level name of the first missing module, or None if the import succeeds
+
+    Raises:
+        RuntimeError: If the entry module fails to import for another reason
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive_dir = os.path.join(temp_dir, "archive")
+        runtime_dir = os.path.join(temp_dir, "runtime")
+        os.makedirs(archive_dir)
+        os.makedirs(runtime_dir)
+
+        for module_name in ["c7n_mailer"] + list(deps):
+            link_module(module_name, archive_dir)
+        for module_name in LAMBDA_RUNTIME_MODULES:
+            link_module(module_name, runtime_dir)
+        with open(os.path.join(archive_dir, "periodic.py"), "w") as fh:
+            fh.write(mailer_entry_source)
+
+        script = IMPORT_CHECK.format(paths=[archive_dir, runtime_dir])
+        result = subprocess.run(  # nosec B603
+            [sys.executable, "-I", "-S", "-c", script],
+            capture_output=True,
+            text=True,
+            cwd=archive_dir,
+            check=False,
+        )
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Mailer entry module failed to import: {result.stderr.strip()}")
+
+    missing = json.loads(result.stdout.strip().splitlines()[-1])["missing"]
+    return missing.split(".", 1)[0] if missing else None
+
+
+def module_size(module_name):
+    """Return the total size in bytes of the files an importable module would bundle."""
+    module = importlib.import_module(module_name)
+    if not getattr(module, "__path__", None):
+        return os.path.getsize(module.__file__) if getattr(module, "__file__", None) else 0
+
+    total = 0
+    for directory in module.__path__:
+        for root, dirs, files in os.walk(directory):
+            if "__pycache__" in dirs:
+                dirs.remove("__pycache__")
+            total += sum(
+                os.path.getsize(os.path.join(root, f))
+                for f in files
+                if not f.endswith((".pyc", ".c"))
+            )
+    return total
+
+
+def resolve_dependencies(config):
+    """Derive the mailer archive dependencies from the mailer config.
+
+    Starts from the transports enabled in the config and verifies the closure
+    by importing the entry module in an isolated interpreter, restoring any
+    group the installed c7n_mailer imports unconditionally.
+
+    Args:
+        config: Validated mailer configuration dictionary
+
+    Returns:
+        tuple: (list of modules to bundle, dependency report dict)
+
+    Raises:
+        RuntimeError: If the entry module needs a module outside CORE_DEPS
+    """
+    groups = select_dependency_groups(config)
+    restored = {}
+
+    while True:
+        deps = group_modules(groups)
+        missing = find_missing_module(deps)
+        if missing is None:
+            break
+
+        group = module_group(missing)
+        if group is None or group in groups:
+            raise RuntimeError(f"Mailer entry module requires '{missing}' which is not bundled")
+        groups.append(group)
+        restored[group] = missing
+
+    dropped = [m for m in CORE_DEPS if m not in deps]
+    report = {
+        "groups": [name for name, _, _ in DEPENDENCY_GROUPS if name in groups],
+        "restored": restored,
+        "dropped": dropped,
+        "bytes_saved": sum(module_size(m) for m in dropped),
+    }
+    return deps, report
+
 
 def get_tags(force_deploy=False):
     """Generate all tags for mailer.
@@ -110,29 +303,77 @@ def add_tags_to_mailer(mailer_config, tags):
     return mailer_config
 
 
+def get_function_config(config, include_tags=True):
+    """Return the config.json contents for the mailer archive.
+
+    Args:
+        config: Mailer configuration dictionary
+        include_tags: Keep lambda_tags, which the mailer only reads when deploying
+
+    Returns:
+        dict: Function configuration
+    """
+    function_config = copy.deepcopy(config)
+    function_config["templates_folders"] = ["msg-templates/"]
+    if not include_tags:
+        function_config.pop("lambda_tags", None)
+    return function_config
+
+
+def get_archive_cache_key(config, templates_digest, package_versions, include_tags=True):
+    """Digest of every input that affects the mailer archive.
+
+    Args:
+        config: Mailer configuration dictionary
+        templates_digest: Digest of the packaged templates
+        package_versions: Installed versions of c7n-mailer and its dependencies
+        include_tags: Whether lambda_tags are written to config.json
+
+    Returns:
+        str: sha256 hex digest
+    """
+    payload = {
+        "config": get_function_config(config, include_tags),
+        "templates": templates_digest,
+        "packages": package_versions,
+        "entry": mailer_entry_source,
+    }
+    return hashlib.sha256(canonical_json(payload).encode("utf-8")).hexdigest()
+
+
 # WORKAROUND: This is a modified version of c7n_mailer.deploy.get_archive() that ensures
 # consistent zip file hashes by sorting template folders and files. The upstream
 # code should be used instead once it is patched
-def get_archive(config):
-    """Gets a mailer archive with deterministic file ordering."""
-    deps = ["c7n_mailer"] + list(CORE_DEPS)
-    archive = PythonPackageArchive(modules=deps)
+def get_archive(config, deps=None, include_tags=True):
+    """Gets a mailer archive with deterministic file ordering.
 
-    for d in sorted(set(config.get("templates_folders", []))):
-        if not os.path.exists(d):
-            continue
+    Args:
+        config: Validated mailer configuration dictionary
+        deps: Modules to bundle alongside c7n_mailer, derived from config if not given
+        include_tags: Write lambda_tags to config.json
 
-        template_files = sorted([f for f in os.listdir(d) if os.path.splitext(f)[1] == ".j2"])
+    Returns:
+        PythonPackageArchive: Closed mailer archive
+    """
+    if deps is None:
+        deps, _ = resolve_dependencies(config)
+    deps = ["c7n_mailer"] + list(deps)
+    archive = PythonPackageArchive(modules=deps)
 
-        for t in template_files:
-            with open(os.path.join(d, t)) as fh:
-                archive.add_contents("msg-templates/%s" % t, fh.read())
+    templates = {}
+    # Shadowed names are packaged once, from the last folder providing them
+    folders = config.get("templates_folders", [])
+    for t, path in effective_templates(iter_template_files(folders)).items():
+        with open(path) as fh:
+            source = fh.read()
+        archive.add_contents("msg-templates/%s" % t, source)
+        templates[t] = (source, "msg-templates/%s" % t)
 
-    function_config = copy.deepcopy(config)
-    function_config["templates_folders"] = ["msg-templates/"]
+    for filename, code in compile_templates(templates).items():
+        archive.add_contents("%s/%s" % (COMPILED_TEMPLATES_DIR, filename), code)
 
-    archive.add_contents("config.json", json.dumps(function_config))
-    archive.add_contents("periodic.py", entry_source)
+    archive.add_contents("config.json", json.dumps(get_function_config(config, include_tags)))
+    archive.add_contents("periodic.py", mailer_entry_source)
 
     archive.close()
     return archive
@@ -152,8 +393,55 @@ def process_lambda_package(query):
     tags = get_tags(query.get("force_deploy", "false").lower() == "true")
     mailer_config = add_tags_to_mailer(mailer_config, tags)
 
+    index = TemplateIndex(TEMPLATE_INDEX_PATH)
+    scanned = index.scan(mailer_config.get("templates_folders", []))
+    shadowed = find_shadowed((name, path) for name, path, _ in scanned)
+
+    try:
+        package_versions = get_package_versions(["c7n-mailer"])
+    except Exception as e:  # pragma: no cover
+        package_versions = {"error": f"Failed to get package versions: {e}"}
+
+    include_tags = tags_in_archive(query)
+    cache_key = get_archive_cache_key(
+        mailer_config, template_digest(scanned), package_versions, include_tags
+    )
+    result = load_cached_build(query["lambda_name"], cache_key)
+    cache_status = "local"
+    if result is None:
+
+        def build():
+            built = build_lambda_package(query, mailer_config, include_tags)
+            built["package_versions"] = json.dumps(package_versions)
+            return built
+
+        result, cache_status = cached_build(query, query["lambda_name"], cache_key, build)
+        save_cached_build(query["lambda_name"], cache_key, result)
+    index.save()
+
+    result["remote_cache"] = cache_status
+    # Tags kept out of the archive are applied to the function by Terraform instead
+    result["custodian_tags"] = json.dumps(tags if include_tags else mailer_config["lambda_tags"])
+    result["template_shadowing"] = json.dumps(shadowed)
+    return result
+
+
+def build_lambda_package(query, mailer_config, include_tags=True):
+    """Build the mailer archive and copy it to the build directory.
+
+    Args:
+        query: Query dictionary
+        mailer_config: Mailer configuration with tags added
+        include_tags: Write lambda_tags to config.json
+
+    Returns:
+        dict: Result dictionary with hashes, zip path and dependency report
+    """
     try:
-        archive = get_archive(mailer_config)
+        deps, dependency_report = resolve_dependencies(mailer_config)
+        archive = get_archive(mailer_config, deps, include_tags)
+    except ValidationError as e:
+        raise RuntimeError(f"Failed to compile mailer templates: {e}")
     except OSError as e:
         raise RuntimeError(f"Failed to create mailer archive due to file system error: {e}")
     except Exception as e:  # pragma: no cover
@@ -168,38 +456,40 @@ def process_lambda_package(query):
     final_zip_path = copy_archive(archive, hex_hash, query["lambda_name"])
     archive.remove()
 
-    try:
-        package_versions = get_package_versions(["c7n-mailer"])
-    except Exception as e:  # pragma: no cover
-        package_versions = {"error": f"Failed to get package versions: {e}"}
-
     return {
         "sha256_hex": hex_hash,
         "sha256_base64": base64_hash,
         "zip_path": final_zip_path,
-        "package_versions": json.dumps(package_versions),
-        "custodian_tags": json.dumps(tags),
+        "dependency_report": json.dumps(dependency_report),
     }
 
 
-def main():
-    try:
-        query = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        return_error(f"Failed to parse input JSON: {e}")
-    except Exception as e:  # pragma: no cover
-        return_error(f"Unexpected error reading input: {type(e).__name__}: {e}")
+def run(query):
+    """Package the mailer for a query, as the external data source does.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        dict: Result dictionary with information about the zip file
 
+    Raises:
+        ValidationError: If required fields are missing
+        RuntimeError: If packaging fails
+    """
     required = ["mailer_config", "lambda_name"]
     missing = [field for field in required if not query.get(field)]
     if missing:
-        return_error(f"Missing required fields: {', '.join(missing)}")
+        raise ValidationError(f"Missing required fields: {', '.join(missing)}")
 
     try:
-        result = process_lambda_package(query)
-        return_result(result)
+        return process_lambda_package(query)
     except RuntimeError as e:
-        return_error(f"Failed to package lambda: {e}")
+        raise RuntimeError(f"Failed to package lambda: {e}") from e
+
+
+def main():
+    run_cli(run)
 
 
 if __name__ == "__main__":
@@ -11,23 +11,40 @@ Expects JSON input with:
 - execution_options
 - function_name
 - region
+- package_pruning: (optional) JSON pruning options, see ops/prune.py
+- tags_in_archive: (optional) "false" keeps mode.tags out of the archived config.json
+- hash_only: (optional) "true" returns the hashes recorded for unchanged inputs
+  without building the zip, for plans that are not applied
+- remote_cache: (optional) shared directory or HTTP URL, see ops/remote_cache.py
+- policy_snapshot: (optional) "true" adds a pre-resolved snapshot and a handler
+  that uses it, see ops/policy_snapshot.py
+- archive_size_budget: (optional) JSON size limits checked before packaging,
+  see ops/archive_size.py
 
 Outputs information regarding the zip created in JSON format:
 - sha256_hex
 - sha256_base64
 - zip_path
 - package_versions
+- custodian_tags: JSON tags for the function, including those kept out of the archive
 - policy_regions: JSON list of regions where policy would deploy based on conditions
+- pruning_report: JSON per-package summary of files pruned and bytes saved
+- archive_fingerprint: digest of the archive inputs, see ops/manifest.py
+- materialized: "false" if hash_only returned hashes without a zip on disk
+- remote_cache: local, disabled, hit, miss or error: <message>
+- stage_timings: JSON stage start offsets and durations with the critical path
 """
 
+import copy
 import hashlib
 import json
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from ops.common import (
     validate_policy_structure,
-    return_result,
-    return_error,
+    run_cli,
     validate_with_custodian,
     validate_policy_mode,
     ValidationError,
@@ -36,7 +53,31 @@ from ops.common import (
     get_package_versions,
     get_regions,
     parse_policies,
+    canonicalize_policies,
+    canonical_json,
     get_force_deploy_tags,
+    tags_in_archive,
+    load_cached_build,
+    save_cached_build,
+    StageTimer,
+)
+from ops.archive_size import check_size_budget, estimate_archive_size, parse_size_budget
+from ops.manifest import FILE_INDEX_PATH, FileIndex, archive_fingerprint, check_prediction
+from ops.bundle import BUNDLE_HANDLER_TEMPLATE
+from ops.policy_snapshot import (
+    SNAPSHOT_HANDLER_TEMPLATE,
+    SNAPSHOT_PATH,
+    get_snapshot,
+    policy_snapshot,
+)
+from ops.remote_cache import cached_build
+from ops.prune import (
+    PackagePruner,
+    PrunedPackageArchive,
+    bundles_service_models,
+    get_required_services,
+    parse_prune_options,
+    strip_tool_version,
 )
 
 try:
@@ -52,67 +93,189 @@ except ImportError:  # pragma: no cover
     sys.exit(1)
 
 
-def get_archive(archive, policy_list, exec_options):
+def get_archive_contents(policy_list, exec_options, snapshot=False, bundle=None):
+    """Generate the config and handler files added to the archive.
+
+    Args:
+        policy_list: List of one cloud custodian policy, or the policies of a bundle
+        exec_options: Dict of execution-options
+        snapshot: Add snapshot.json and the handler that uses it
+        bundle: Bundle options, such as {"concurrency": 1}, to add the bundle handler
+
+    Returns:
+        dict: Archive path to file contents
+    """
+    config_data = {
+        "execution-options": exec_options,
+        "policies": policy_list,
+    }
+    handler = PolicyHandlerTemplate
+    if snapshot:
+        handler = SNAPSHOT_HANDLER_TEMPLATE
+    if bundle is not None:
+        config_data["bundle"] = bundle
+        handler = BUNDLE_HANDLER_TEMPLATE
+
+    contents = {
+        "config.json": canonical_json(config_data, indent=2),
+        "custodian_policy.py": handler,
+    }
+    if snapshot:
+        contents[SNAPSHOT_PATH] = get_snapshot(policy_list)
+    return contents
+
+
+def get_archive(archive, policy_list, exec_options, snapshot=False, bundle=None):
     """Add handler template and config to archive.
 
     Args:
         archive: PythonPackageArchive instance
-        policy_list: List of one cloud custodian policy
+        policy_list: List of one cloud custodian policy, or the policies of a bundle
         exec_options: Dict of execution-options
+        snapshot: Add snapshot.json and the handler that uses it
+        bundle: Bundle options to add the bundle handler
 
     Returns:
         PythonPackageArchive: Archive with handler and config added
     """
+    contents = get_archive_contents(policy_list, exec_options, snapshot, bundle)
     try:
-        config_data = {
-            "execution-options": exec_options,
-            "policies": policy_list,
-        }
-        archive.add_contents("config.json", json.dumps(config_data, indent=2))
+        archive.add_contents("config.json", contents.pop("config.json"))
     except AssertionError as e:
         raise RuntimeError(f"Failed to add config.json: {e}")
 
     try:
-        archive.add_contents("custodian_policy.py", PolicyHandlerTemplate)
+        archive.add_contents("custodian_policy.py", contents.pop("custodian_policy.py"))
     except AssertionError as e:
         raise RuntimeError(f"Failed to add handler template: {e}")
 
+    for path, content in contents.items():
+        try:
+            archive.add_contents(path, content)
+        except AssertionError as e:
+            raise RuntimeError(f"Failed to add {path}: {e}")
+
     return archive
 
 
-def create_custodian_archive(packages=None):
+def archive_modules(packages=None):
+    """Return the sorted top-level modules bundled in a Cloud Custodian archive."""
+    return sorted({"c7n"}.union(p for p in (packages or []) if p))
+
+
+def create_custodian_archive(packages=None, pruner=None):
     """Create a Cloud Custodian lambda archive
 
     Args:
         packages: List of additional packages to include beyond c7n
+        pruner: Optional PackagePruner to drop non-runtime files from packages
 
     Returns:
         PythonPackageArchive: Archive object with c7n and specified packages
     """
     try:
-        return custodian_archive(packages=packages)
+        if pruner is None:
+            return custodian_archive(packages=packages)
+        return PrunedPackageArchive(archive_modules(packages), pruner=pruner)
     except Exception as e:  # pragma: no cover
         raise RuntimeError(f"Unexpected error creating custodian archive: {type(e).__name__}: {e}")
 
 
-def process_lambda_package(query, policy_list, regions, exec_options, packages):
-    """Process the lambda package creation.
+def get_pruner(prune_options, packages, validated_policy=None):
+    """Create a PackagePruner for the packaging options.
+
+    When botocore or boto3 are bundled and a validated policy is available the
+    pruner also drops the service models the policy does not use.
+
+    Args:
+        prune_options: Pruning options, or None if pruning is disabled
+        packages: List of packages to include
+        validated_policy: Already validated Cloud Custodian Policy object, or a
+            list of them for a bundle
+
+    Returns:
+        PackagePruner or None
+    """
+    if prune_options is None:
+        return None
+
+    pruner = PackagePruner(prune_options)
+    if (
+        validated_policy is not None
+        and prune_options.get("service_models", True)
+        and bundles_service_models(packages)
+    ):
+        policies = validated_policy if isinstance(validated_policy, list) else [validated_policy]
+        services = set()
+        for policy in policies:
+            services.update(
+                get_required_services(policy, prune_options.get("botocore_services", []))
+            )
+        pruner.set_services(services)
+    return pruner
+
+
+def check_archive_size(query, packages, validated_policy=None):
+    """Fail before packaging when the estimated archive exceeds its size budget.
 
     Args:
         query: Query dictionary
-        policy_list: List with one policy
-        exec_options: Dict of execution-options
         packages: List of packages to include
-        validated_policy: Already validated Cloud Custodian Policy object
+        validated_policy: Already validated Cloud Custodian Policy object, or a
+            list of them for a bundle
 
     Returns:
-        dict: Result dictionary with information about the zip file
+        dict: The estimate, or None if the check is disabled
 
     Raises:
-        Exception: If any step in the packaging process fails
+        ValidationError: If the budget is invalid or exceeded
     """
-    archive = create_custodian_archive(packages=packages)
-    archive = get_archive(archive, policy_list, exec_options)
+    budget = parse_size_budget(query)
+    if budget is None:
+        return None
+
+    try:
+        prune_options = parse_prune_options(query)
+    except ValidationError:
+        # Reported with its context when the archive is packaged
+        prune_options = None
+    estimate = estimate_archive_size(
+        archive_modules(packages), get_pruner(prune_options, packages, validated_policy)
+    )
+    check_size_budget(estimate, budget)
+    return estimate
+
+
+def get_fingerprint_options(pruner):
+    """Options that change which module files are added and how."""
+    if pruner is None:
+        return None
+    return {
+        "rules": pruner.rules,
+        "strip_debug": pruner.strip_debug,
+        "strip_command": strip_tool_version(pruner.strip_command),
+        "dry_run": pruner.dry_run,
+        "packages": pruner.overrides,
+        "services": sorted(pruner.services) if pruner.services is not None else None,
+    }
+
+
+def build_lambda_package(query, policy_list, exec_options, packages, pruner=None, bundle=None):
+    """Build the archive and copy it to the build directory.
+
+    Args:
+        query: Query dictionary
+        policy_list: List with one policy, as written to config.json
+        exec_options: Dict of execution-options
+        packages: List of packages to include
+        pruner: Optional PackagePruner for packaged dependencies
+        bundle: Bundle options when policy_list holds the policies of a bundle
+
+    Returns:
+        dict: Result dictionary with hashes, zip path and pruning report
+    """
+    archive = create_custodian_archive(packages=packages, pruner=pruner)
+    archive = get_archive(archive, policy_list, exec_options, policy_snapshot(query), bundle)
     archive.close()
 
     try:
@@ -124,23 +287,183 @@ def process_lambda_package(query, policy_list, regions, exec_options, packages):
     final_zip_path = copy_archive(archive, hex_hash, query["function_name"])
     archive.remove()
 
-    # Include c7n with any additional packages and get versions
-    try:
-        all_packages = ["c7n"] + (packages if packages else [])
-        package_versions = get_package_versions(all_packages)
-    except Exception as e:  # pragma: no cover
-        package_versions = {"error": f"Failed to get package versions: {e}"}
-
     return {
         "sha256_hex": hex_hash,
         "sha256_base64": base64_hash,
         "zip_path": final_zip_path,
-        "package_versions": json.dumps(package_versions),
-        "custodian_tags": json.dumps(policy_list[0].get("mode", {}).get("tags", {})),
-        "policy_regions": json.dumps(list(regions)),
+        "pruning_report": json.dumps(pruner.report() if pruner else {}),
     }
 
 
+def package_archive(
+    query,
+    policy_list,
+    exec_options,
+    packages,
+    prune_options=None,
+    validated_policy=None,
+    bundle=None,
+):
+    """Build the archive, or reuse the one built for the same inputs.
+
+    The archive is only built when no zip exists for its input fingerprint. With
+    hash_only set, the hashes recorded for the fingerprint are returned even if
+    the zip is gone, and a build only happens when nothing was recorded.
+
+    Args:
+        query: Query dictionary
+        policy_list: List with one policy
+        exec_options: Dict of execution-options
+        packages: List of packages to include
+        prune_options: Optional pruning options for packaged dependencies
+        validated_policy: Already validated Cloud Custodian Policy object
+        bundle: Bundle options when policy_list holds the policies of a bundle
+
+    Returns:
+        dict: Hashes, zip path, pruning report and fingerprint of the archive
+    """
+    archive_policies = policy_list if tags_in_archive(query) else remove_mode_tags(policy_list)
+    pruner = get_pruner(prune_options, packages, validated_policy)
+
+    index = FileIndex(FILE_INDEX_PATH)
+    fingerprint = archive_fingerprint(
+        get_archive_contents(archive_policies, exec_options, policy_snapshot(query), bundle),
+        archive_modules(packages),
+        index,
+        get_fingerprint_options(pruner),
+    )
+    index.save()
+
+    function_name = query["function_name"]
+    recorded = load_cached_build(function_name, fingerprint, require_zip=False)
+    result = load_cached_build(function_name, fingerprint)
+    cache_status = "local"
+    if result is None and query.get("hash_only", "false").lower() == "true":
+        result = recorded
+    if result is None:
+        result, cache_status = cached_build(
+            query,
+            function_name,
+            fingerprint,
+            lambda: build_lambda_package(
+                query, archive_policies, exec_options, packages, pruner, bundle
+            ),
+        )
+        check_prediction(recorded, result)
+        save_cached_build(function_name, fingerprint, result)
+
+    return dict(
+        result,
+        remote_cache=cache_status,
+        archive_fingerprint=fingerprint,
+        materialized=str(os.path.exists(result["zip_path"])).lower(),
+    )
+
+
+def get_lambda_package_versions(packages):
+    """Get versions of c7n and any additional packages.
+
+    Args:
+        packages: List of additional packages
+
+    Returns:
+        dict: Package name to version, or an error entry
+    """
+    try:
+        all_packages = ["c7n"] + (packages if packages else [])
+        return get_package_versions(all_packages)
+    except Exception as e:  # pragma: no cover
+        return {"error": f"Failed to get package versions: {e}"}
+
+
+def package_result(archive_result, policy_list, regions, package_versions):
+    """Combine the archive result with the policy outputs."""
+    return dict(
+        archive_result,
+        package_versions=json.dumps(package_versions),
+        custodian_tags=json.dumps(policy_list[0].get("mode", {}).get("tags", {})),
+        policy_regions=json.dumps(list(regions)),
+    )
+
+
+def process_lambda_package(
+    query,
+    policy_list,
+    regions,
+    exec_options,
+    packages,
+    prune_options=None,
+    validated_policy=None,
+):
+    """Process the lambda package creation.
+
+    Args:
+        query: Query dictionary
+        policy_list: List with one policy
+        exec_options: Dict of execution-options
+        packages: List of packages to include
+        prune_options: Optional pruning options for packaged dependencies
+        validated_policy: Already validated Cloud Custodian Policy object
+
+    Returns:
+        dict: Result dictionary with information about the zip file
+
+    Raises:
+        Exception: If any step in the packaging process fails
+    """
+    result = package_archive(
+        query, policy_list, exec_options, packages, prune_options, validated_policy
+    )
+    return package_result(result, policy_list, regions, get_lambda_package_versions(packages))
+
+
+def process_lambda_package_concurrently(
+    query,
+    policy_list,
+    exec_options,
+    packages,
+    prune_options=None,
+    validated_policy=None,
+    timer=None,
+):
+    """Process the lambda package creation, overlapping the independent stages.
+
+    Region discovery (an AWS API call) and package version discovery run in
+    worker threads while the archive is built. The result matches
+    process_lambda_package, plus stage timings.
+
+    Args:
+        query: Query dictionary
+        policy_list: List with one policy
+        exec_options: Dict of execution-options
+        packages: List of packages to include
+        prune_options: Optional pruning options for packaged dependencies
+        validated_policy: Already validated Cloud Custodian Policy object
+        timer: Optional StageTimer that already holds the earlier stages
+
+    Returns:
+        dict: Result dictionary with information about the zip file and stage_timings
+    """
+    timer = timer or StageTimer()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        regions = pool.submit(timer.run, "regions", get_policy_regions, validated_policy)
+        versions = pool.submit(timer.run, "package_versions", get_lambda_package_versions, packages)
+        archive_result = timer.run(
+            "package",
+            package_archive,
+            query,
+            policy_list,
+            exec_options,
+            packages,
+            prune_options,
+            validated_policy,
+        )
+        result = package_result(archive_result, policy_list, regions.result(), versions.result())
+
+    result["stage_timings"] = json.dumps(timer.report())
+    return result
+
+
 def process_exec_options(query):
     """Process a query that should contain execution_options
 
@@ -163,20 +486,22 @@ def process_exec_options(query):
     return get_exec_options(exec_options_dict)
 
 
-def get_policy_regions(policy_instance):
+def get_policy_regions(policy_instance, all_regions=None):
     """Return policy region based cloud-custodian conditions in the policy
 
     Args:
         policy_instance: The validated Cloud Custodian policy instance
+        all_regions: Optional list of enabled regions, looked up when not given
+            and the policy has conditions
 
     Returns:
-        tuple: (set of region values, set of condition types)
+        set: Region names matching the policy's region conditions
     """
     regions = set()
 
-    all_regions = get_regions()
-
     if policy_contains_conditions(policy_instance):
+        if all_regions is None:
+            all_regions = get_regions()
         for filter_obj in policy_instance.conditions.iter_filters():
             if isinstance(filter_obj, ValueFilter):
                 if hasattr(filter_obj, "data") and filter_obj.data.get("key") == "region":
@@ -255,56 +580,98 @@ def add_tags_to_policy(policy_list, tags):
     return policy_list
 
 
-def process_policies(query):
+def remove_mode_tags(policy_list):
+    """Return a copy of the policy list without mode tags.
+
+    Cloud Custodian only reads mode tags when provisioning the function, which
+    Terraform does from the custodian_tags output instead.
+
+    Args:
+        policy_list: List of cloud custodian policies
+
+    Returns:
+        list: Policy list without mode tags
+    """
+    policy_list = copy.deepcopy(policy_list)
+    for policy in policy_list:
+        policy["mode"].pop("tags", None)
+    return policy_list
+
+
+def process_policies(query, resolve_regions=True):
     """Process a query that should contain policies.
 
     Args:
         query: Dictionary with query parameters
+        resolve_regions: Look up the policy regions, which needs an AWS API call
 
     Returns:
-        tuple: (policy_list, packages, validated_policy)
+        tuple: (policy_list, regions, packages, validated_policy), regions is None
+        when not resolved
     """
-    policies_dict = parse_policies(query)
+    policies_dict = canonicalize_policies(parse_policies(query))
     policy_list = validate_policy_structure(policies_dict)
     validate_policy_mode(policy_list[0])
     policy_instance = validate_with_custodian(policies_dict)
     tags = get_tags(policy_list, query)
     policy_list = add_tags_to_policy(policy_list, tags)
     policy_list[0]["mode"]["role"] = query["role"]
-    regions = get_policy_regions(policy_instance)
+    regions = get_policy_regions(policy_instance) if resolve_regions else None
     packages = policy_list[0].get("mode", {}).get("packages", [])
+    check_archive_size(query, packages, policy_instance)
 
-    return policy_list, regions, packages
+    return policy_list, regions, packages, policy_instance
 
 
-def main():
-    try:
-        query = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        return_error(f"Failed to parse input JSON: {e}")
-    except Exception as e:  # pragma: no cover
-        return_error(f"Unexpected error reading input: {type(e).__name__}: {e}")
+def run(query):
+    """Package the policy in a query, as the external data source does.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        dict: Result dictionary with information about the zip file and stage_timings
 
+    Raises:
+        ValidationError: If required fields are missing or the input is invalid
+        RuntimeError: If packaging fails
+    """
     required = ["policies", "execution_options", "function_name", "role"]
     missing = [field for field in required if not query.get(field)]
     if missing:
-        return_error(f"Missing required fields: {', '.join(missing)}")
+        raise ValidationError(f"Missing required fields: {', '.join(missing)}")
+
+    timer = StageTimer()
+    policy_list, _, packages, validated_policy = timer.run(
+        "policies", process_policies, query, resolve_regions=False
+    )
 
     try:
-        policy_list, regions, packages = process_policies(query)
+        exec_options = timer.run("exec_options", process_exec_options, query)
     except ValidationError as e:
-        return_error(str(e))
+        raise ValidationError(f"Failed to validate execution options: {e}") from e
 
     try:
-        exec_options = process_exec_options(query)
+        prune_options = parse_prune_options(query)
     except ValidationError as e:
-        return_error(f"Failed to validate execution options: {e}")
+        raise ValidationError(f"Failed to validate package pruning options: {e}") from e
 
     try:
-        result = process_lambda_package(query, policy_list, regions, exec_options, packages)
-        return_result(result)
+        return process_lambda_package_concurrently(
+            query,
+            policy_list,
+            exec_options,
+            packages,
+            prune_options=prune_options,
+            validated_policy=validated_policy,
+            timer=timer,
+        )
     except RuntimeError as e:
-        return_error(f"Failed to package lambda: {e}")
+        raise RuntimeError(f"Failed to package lambda: {e}") from e
+
+
+def main():
+    run_cli(run)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Estimate the API calls a Cloud Custodian policy makes and lint it for performance.
+
+The estimate walks a validated policy: the resource manager's list, detail and
+augment calls, then the filters and actions. Calls are counted for an assumed
+number of resources, all of them matching the filters, which is the worst case.
+Per resource calls, N+1 patterns, are flagged, as are related resource lookups
+repeated without a cache. From the estimated run time a Lambda timeout and
+memory size are suggested.
+
+The findings are added to the info_messages of ops/validate_lambda_policy.py,
+or printed for every policy in a file:
+
+    python3 -m ops.policy_cost policies.yml --resources 500
+"""
+
+import argparse
+import json
+import math
+import sys
+
+from ops.common import ValidationError, validate_format, validate_with_custodian
+
+try:
+    from c7n.filters.metrics import MetricsFilter
+    from c7n.filters.related import RelatedResourceFilter
+    from c7n.resources.s3 import S3_AUGMENT_TABLE
+except ImportError:  # pragma: no cover
+    print("Cloud Custodian (c7n) package is not installed. Please install it", file=sys.stderr)
+    sys.exit(1)
+
+
+DEFAULT_RESOURCE_COUNT = 100
+PAGE_SIZE = 100
+CALL_SECONDS = 0.05
+INIT_SECONDS = 5
+THROTTLE_CALLS = 1000
+MIN_TIMEOUT = 60
+MAX_TIMEOUT = 900
+DEFAULT_MEMORY = 512
+LARGE_MEMORY = 1024
+
+
+def pages(count):
+    """Return the number of list calls for a number of resources."""
+    return max(1, math.ceil(count / PAGE_SIZE))
+
+
+def source_calls(manager, count):
+    """Estimate the calls that list and describe the resources.
+
+    Args:
+        manager: Resource manager of a validated policy
+        count: Assumed number of resources
+
+    Returns:
+        list: (description, calls, per_resource) tuples
+    """
+    resource_type = manager.resource_type
+    service = getattr(resource_type, "service", "") or ""
+    calls = []
+
+    enum_spec = getattr(resource_type, "enum_spec", None)
+    if enum_spec:
+        calls.append((f"{service}.{enum_spec[0]}", pages(count), False))
+
+    detail_spec = getattr(resource_type, "detail_spec", None)
+    if manager.type == "s3":
+        calls.append(("s3 bucket augment", count * len(S3_AUGMENT_TABLE), True))
+    elif detail_spec:
+        calls.append((f"{service}.{detail_spec[0]}", count, True))
+
+    batch_detail_spec = getattr(resource_type, "batch_detail_spec", None)
+    if batch_detail_spec:
+        calls.append((f"{service}.{batch_detail_spec[0]}", pages(count), False))
+
+    if getattr(resource_type, "universal_taggable", False):
+        calls.append(("tagging.get_resources", pages(count), False))
+    return calls
+
+
+def filter_calls(manager, count):
+    """Estimate the calls made by the filters of a resource manager.
+
+    Args:
+        manager: Resource manager of a validated policy
+        count: Assumed number of resources
+
+    Returns:
+        tuple: (list of (description, calls, per_resource), related resource
+        class path to the number of filters looking it up)
+    """
+    calls = []
+    related = {}
+    for f in manager.iter_filters():
+        name = f.data.get("type", type(f).__name__) if isinstance(f.data, dict) else str(f.data)
+        if isinstance(f, MetricsFilter):
+            calls.append((f"filter {name}", count, True))
+        elif isinstance(f, RelatedResourceFilter):
+            related[f.RelatedResource] = related.get(f.RelatedResource, 0) + 1
+            calls.append((f"filter {name}", pages(count), False))
+        elif f.get_permissions():
+            # Filters with their own permissions usually call an API per resource
+            calls.append((f"filter {name}", count, True))
+    return calls, related
+
+
+def action_calls(manager, count):
+    """Estimate the calls made by the actions, taking every resource to match."""
+    return [
+        (
+            f"action {a.data.get('type', a.type) if isinstance(a.data, dict) else a.data}",
+            count,
+            True,
+        )
+        for a in manager.actions
+        if a.get_permissions()
+    ]
+
+
+def cache_enabled(policy_dict):
+    """Return True if the policy enables the c7n cache in Lambda.
+
+    c7n drops the cache option given on the command line, so only the mode
+    execution-options enable it in Lambda.
+    """
+    options = policy_dict.get("mode", {}).get("execution-options", {})
+    return bool(options.get("cache")) and bool(options.get("cache_period"))
+
+
+def suggest_settings(calls, mode):
+    """Suggest a Lambda timeout and memory size for an estimated number of calls.
+
+    Args:
+        calls: Estimated API calls of one run
+        mode: Policy mode
+
+    Returns:
+        dict: timeout and memory, with the current values
+    """
+    seconds = INIT_SECONDS + calls * CALL_SECONDS
+    timeout = min(MAX_TIMEOUT, max(MIN_TIMEOUT, math.ceil(seconds * 2 / 30) * 30))
+    # c7n runs filters on thread pools, Lambda gives more CPU with more memory
+    memory = LARGE_MEMORY if calls > THROTTLE_CALLS else DEFAULT_MEMORY
+    return {
+        "timeout": timeout,
+        "memory": memory,
+        "current_timeout": mode.get("timeout", 900),
+        "current_memory": mode.get("memory", 512),
+    }
+
+
+def estimate_policy(policy_instance, count=DEFAULT_RESOURCE_COUNT):
+    """Estimate the API calls of a validated policy and lint it for performance.
+
+    Args:
+        policy_instance: Cloud Custodian Policy from validate_with_custodian
+        count: Assumed number of resources
+
+    Returns:
+        dict: resources, calls (total), breakdown, warnings and suggested settings
+    """
+    manager = policy_instance.resource_manager
+    filters, related = filter_calls(manager, count)
+    breakdown = source_calls(manager, count) + filters + action_calls(manager, count)
+    total = sum(calls for _, calls, _ in breakdown)
+
+    warnings = []
+    for description, calls, per_resource in breakdown:
+        # Actions only run on the resources that matched, so they are not N+1
+        if per_resource and calls >= count > 1 and not description.startswith("action "):
+            warnings.append(
+                f"{description} makes {calls // count} call(s) per resource ({calls} for {count})"
+            )
+        if calls > THROTTLE_CALLS:
+            warnings.append(f"{description} makes {calls} calls and may be throttled")
+    if not cache_enabled(policy_instance.data):
+        for resource, filters_count in sorted(related.items()):
+            if filters_count > 1:
+                warnings.append(
+                    f"{filters_count} filters look up {resource.rsplit('.', 1)[-1]} resources "
+                    "separately, set mode.execution-options cache: memory and cache_period "
+                    "to share them"
+                )
+
+    return {
+        "resources": count,
+        "calls": total,
+        "breakdown": [
+            {"call": description, "calls": calls, "per_resource": per_resource}
+            for description, calls, per_resource in breakdown
+        ],
+        "warnings": warnings,
+        "suggested": suggest_settings(total, policy_instance.data.get("mode", {})),
+    }
+
+
+def info_messages(estimate):
+    """Format an estimate as validation info messages."""
+    suggested = estimate["suggested"]
+    messages = [
+        f"Performance: about {estimate['calls']} API calls for {estimate['resources']} "
+        f"resources, suggested timeout {suggested['timeout']} "
+        f"(mode.timeout {suggested['current_timeout']}) and memory {suggested['memory']} "
+        f"(mode.memory {suggested['current_memory']})"
+    ]
+    messages.extend(f"Performance warning: {warning}" for warning in estimate["warnings"])
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the API calls of policies")
+    parser.add_argument("path", help="Policies file in JSON or YAML")
+    parser.add_argument(
+        "--resources",
+        type=int,
+        default=DEFAULT_RESOURCE_COUNT,
+        help="Assumed number of resources per policy",
+    )
+    args = parser.parse_args()
+
+    try:
+        with open(args.path) as fh:
+            policies_dict = validate_format({"policies": fh.read()}, "policies")
+        report = {}
+        for policy in policies_dict.get("policies", []):
+            document = {k: v for k, v in policies_dict.items() if k == "vars"}
+            document["policies"] = [policy]
+            report[policy.get("name")] = estimate_policy(
+                validate_with_custodian(document), args.resources
+            )
+    except (OSError, ValidationError) as e:
+        print(f"Failed to estimate policies: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
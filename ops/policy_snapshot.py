@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Pre-resolved policy snapshot for Cloud Custodian Lambda archives.
+
+On a cold start the stock c7n handler reads config.json, parses the policy
+structure to find its resource types, loads them and looks up the account id
+with an STS call before the first policy runs. With policy_snapshot enabled the
+archive carries snapshot.json with the resource types resolved from the
+validated policy, whose vars config.json already holds expanded, and a handler
+that reads both and loads only those resource modules while the function
+initializes. On the first event it takes the account id from the invoked
+function ARN and then dispatches events through c7n.handler as the stock
+handler does. Policies are still validated per event by c7n, since filters
+and actions initialize there; c7n does not run schema validation in Lambda.
+"""
+
+import sys
+
+from ops.common import canonical_json
+
+try:
+    from c7n.structure import StructureParser
+    from c7n.version import version
+except ImportError:  # pragma: no cover
+    print("Cloud Custodian (c7n) package is not installed. Please install it", file=sys.stderr)
+    sys.exit(1)
+
+
+SNAPSHOT_PATH = "snapshot.json"
+SNAPSHOT_FORMAT = 1
+
+SNAPSHOT_HANDLER_TEMPLATE = f"""\
+import json
+
+from c7n import handler
+
+with open("config.json") as f:
+    policy_data = json.load(f)
+with open("{SNAPSHOT_PATH}") as f:
+    snapshot = json.load(f)
+
+# Import the resource modules during the init phase, before the first event
+handler.load_resources(snapshot["resource_types"])
+
+
+def init(context):
+    # The function ARN carries the account id, which saves the STS lookup
+    exec_options = policy_data.setdefault("execution-options", {{}})
+    if not exec_options.get("account_id"):
+        exec_options["account_id"] = context.invoked_function_arn.split(":")[4]
+    handler.policy_config = handler.init_config(policy_data)
+    handler.policy_data = policy_data
+
+
+def run(event, context):
+    if handler.policy_config is None:
+        init(context)
+    return handler.dispatch_event(event, context)
+"""
+
+
+def policy_snapshot(query):
+    """Return True if the archive should carry a pre-resolved policy snapshot.
+
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        bool: Value of the policy_snapshot query parameter, default False
+    """
+    return query.get("policy_snapshot", "false").lower() == "true"
+
+
+def get_resource_types(policy_list):
+    """Return the sorted resource types used by a policy list.
+
+    Args:
+        policy_list: List of cloud custodian policies
+
+    Returns:
+        list: Resource types, such as ["aws.ec2"]
+    """
+    return sorted(StructureParser().get_resource_types({"policies": policy_list}))
+
+
+def get_snapshot(policy_list):
+    """Generate the snapshot.json contents for an archive.
+
+    Args:
+        policy_list: List of one validated cloud custodian policy
+
+    Returns:
+        str: Canonical JSON of the snapshot
+    """
+    return canonical_json(
+        {
+            "format": SNAPSHOT_FORMAT,
+            "c7n_version": version,
+            "resource_types": get_resource_types(policy_list),
+        }
+    )
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Prune non-runtime files from packages bundled into a Cloud Custodian lambda archive.
+
+Packages listed in mode.packages are copied into the archive as whole directories,
+including their tests, type stubs, documentation and unstripped native objects. The
+pruner plugs into the archive builder and drops files matching a ruleset, optionally
+stripping debug symbols from ELF objects, and records the bytes saved per package.
+
+Pruning options (all optional):
+- rules: glob patterns to drop, replaces DEFAULT_PRUNE_RULES
+- strip_debug: strip debug symbols from ELF objects (default: true)
+- dry_run: record what would be pruned without changing the archive (default: false)
+- packages: per-package overrides keyed by top-level package name, each with
+  enabled, keep, drop and strip_debug
+- service_models: prune botocore/boto3 service models the policy does not use when
+  either is bundled (default: true)
+- botocore_services: service models to keep in addition to those the policy needs
+
+Can also be run directly to list what would be pruned for a set of packages:
+
+    python3 -m ops.prune boto3 requests
+"""
+
+import argparse
+import fnmatch
+import functools
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import posixpath
+import shutil
+import subprocess  # nosec B404
+import sys
+import tempfile
+
+from ops.common import ValidationError
+
+try:
+    from c7n.mu import PythonPackageArchive
+except ImportError:  # pragma: no cover
+    print("Cloud Custodian (c7n) package is not installed. Please install it", file=sys.stderr)
+    sys.exit(1)
+
+
+# Files that are never imported at runtime. Patterns match archive paths such as
+# "package/sub/tests/test_x.py". A pattern that matches a directory, as "*/docs/*"
+# matches "botocore/docs/", never prunes it when it is a package with an
+# __init__.py, as botocore.docs is imported by botocore.waiter.
+DEFAULT_PRUNE_RULES = [
+    "*/tests/*",
+    "*/conftest.py",
+    "*.pyi",
+    "*/docs/*",
+    "*.dist-info/*",
+    "*.egg-info/*",
+    "*.md",
+    "*.rst",
+    "*.h",
+    "*.hpp",
+    "*.cpp",
+    "*.pyx",
+    "*.pxd",
+]
+
+ELF_MAGIC = b"\x7fELF"
+
+# Packages that carry per-service model data under <package>/data/<service>/
+SERVICE_MODEL_PACKAGES = ("botocore", "boto3")
+
+# Services the lambda handler calls for every policy: account lookup, log group
+# output, metrics, s3 output and tracing. c7n also looks up the account alias
+# through iam without declaring it, e.g. for notify.
+BASE_SERVICES = {"sts", "iam", "logs", "cloudwatch", "s3", "xray"}
+
+# Modes that report evaluations with config put_evaluations
+CONFIG_MODES = {"config-rule", "config-poll-rule"}
+
+# IAM permission prefixes that are neither the name, signing name nor endpoint
+# prefix of a botocore service. Every other prefix is mapped with
+# service_prefixes.
+IAM_PREFIX_SERVICES = {
+    "tag": ["resourcegroupstaggingapi"],
+    "s3express": ["s3"],
+}
+
+# Bytes read from the start of a service model to find its metadata
+MODEL_HEAD_BYTES = 16384
+
+
+def parse_prune_options(query, key="package_pruning"):
+    """Parse pruning options from the query.
+
+    Args:
+        query: Dictionary with query parameters
+        key: Key in query containing the JSON pruning options
+
+    Returns:
+        dict: Pruning options, or None if pruning is disabled
+
+    Raises:
+        ValidationError: If the options are not a JSON object
+    """
+    content = query.get(key)
+    if not content:
+        return None
+
+    try:
+        options = json.loads(content) if isinstance(content, str) else content
+    except (json.JSONDecodeError, TypeError) as e:
+        raise ValidationError(f"Could not parse '{key}' as JSON: {e}")
+
+    if options is None:
+        return None
+    if not isinstance(options, dict):
+        raise ValidationError(f"'{key}' must be a JSON object/dictionary")
+    if not options.get("enabled", True):
+        return None
+
+    packages = options.get("packages", {})
+    if not isinstance(packages, dict):
+        raise ValidationError(f"'{key}.packages' must be a JSON object/dictionary")
+
+    return options
+
+
+class PackagePruner:
+    """Decide which archive paths to drop and strip native objects.
+
+    Args:
+        options: Pruning options as returned by parse_prune_options
+    """
+
+    def __init__(self, options=None):
+        options = options or {}
+        self.rules = list(options.get("rules", DEFAULT_PRUNE_RULES))
+        self.strip_debug = options.get("strip_debug", True)
+        self.dry_run = options.get("dry_run", False)
+        self.overrides = options.get("packages", {})
+        self.strip_command = shutil.which("strip")
+        self.services = None
+        self.package_dirs = set()
+        self._latest_versions = {}
+        self.stats = {}
+
+    def set_services(self, services):
+        """Restrict bundled botocore/boto3 service models to ``services``."""
+        self.services = set(services)
+
+    def add_package_dirs(self, paths):
+        """Record the archive paths of the files given that are in a package.
+
+        Args:
+            paths: Archive paths of the files of a module; directories holding
+                an __init__.py are packages and are never pruned by a rule
+        """
+        for path in paths:
+            directory, name = posixpath.split(path.replace("\\", "/"))
+            if name == "__init__.py" and directory:
+                self.package_dirs.add(directory)
+
+    def _matches(self, dest_path, pattern):
+        """Return True if the pattern matches the path, but not through a package."""
+        if not fnmatch.fnmatch(dest_path, pattern):
+            return False
+        parts = dest_path.replace("\\", "/").split("/")
+        for index in range(1, len(parts)):
+            directory = "/".join(parts[:index])
+            if directory in self.package_dirs and fnmatch.fnmatch(directory + "/", pattern):
+                return False
+        return True
+
+    def _package_stats(self, package):
+        return self.stats.setdefault(
+            package, {"files_pruned": 0, "bytes_saved": 0, "objects_stripped": 0, "pruned": []}
+        )
+
+    def _rules_for(self, package):
+        override = self.overrides.get(package, {})
+        if not override.get("enabled", True):
+            return [], []
+        return self.rules + list(override.get("drop", [])), list(override.get("keep", []))
+
+    def should_prune(self, dest_path):
+        """Return True if the archive path matches a drop rule and no keep rule."""
+        package = package_name(dest_path)
+        drop, keep = self._rules_for(package)
+        if any(fnmatch.fnmatch(dest_path, pattern) for pattern in keep):
+            return False
+        if any(self._matches(dest_path, pattern) for pattern in drop):
+            return True
+        return self._prune_service_model(package, dest_path)
+
+    def _prune_service_model(self, package, dest_path):
+        if self.services is None or package not in SERVICE_MODEL_PACKAGES:
+            return False
+        if not self.overrides.get(package, {}).get("enabled", True):
+            return False
+
+        parts = dest_path.replace("\\", "/").split("/")
+        # Only <package>/data/<service>/... entries, top level data files are kept
+        if len(parts) < 4 or parts[1] != "data":
+            return False
+
+        service = parts[2]
+        if service not in self.services:
+            return True
+
+        # botocore only loads the newest API version of a service by default
+        if package == "botocore" and len(parts) > 4:
+            return parts[3] != self._latest_version(package, service)
+        return False
+
+    def _latest_version(self, package, service):
+        key = (package, service)
+        if key not in self._latest_versions:
+            self._latest_versions[key] = latest_api_version(package, service)
+        return self._latest_versions[key]
+
+    def ignore(self, dest_path, size=0):
+        """Ignore callback for PythonPackageArchive.add_directory.
+
+        Records the pruned file and returns False on a dry run so the file is
+        still added to the archive.
+        """
+        if not self.should_prune(dest_path):
+            return False
+
+        stats = self._package_stats(package_name(dest_path))
+        stats["files_pruned"] += 1
+        stats["bytes_saved"] += size
+        stats["pruned"].append(dest_path)
+        return not self.dry_run
+
+    def _strip_enabled(self, package):
+        override = self.overrides.get(package, {})
+        if not override.get("enabled", True):
+            return False
+        return override.get("strip_debug", self.strip_debug)
+
+    def process_contents(self, dest_path, contents):
+        """Strip debug symbols from ELF objects, returning the new contents."""
+        package = package_name(dest_path)
+        if not contents.startswith(ELF_MAGIC) or not self._strip_enabled(package):
+            return contents
+        if self.strip_command is None:
+            return contents
+
+        stripped = strip_debug_symbols(contents, self.strip_command)
+        saved = len(contents) - len(stripped)
+        if saved <= 0:
+            return contents
+
+        stats = self._package_stats(package)
+        stats["objects_stripped"] += 1
+        stats["bytes_saved"] += saved
+        if self.dry_run:
+            stats["pruned"].append(f"{dest_path} (strip debug)")
+            return contents
+        return stripped
+
+    def report(self, include_files=None):
+        """Summarise bytes saved per package.
+
+        Args:
+            include_files: Include pruned paths, defaults to True on a dry run
+
+        Returns:
+            dict: Package name to pruning statistics
+        """
+        if include_files is None:
+            include_files = self.dry_run
+
+        report = {}
+        for package in sorted(self.stats):
+            stats = dict(self.stats[package])
+            if include_files:
+                stats["pruned"] = sorted(stats["pruned"])
+            else:
+                stats.pop("pruned")
+            if self.services is not None and package in SERVICE_MODEL_PACKAGES:
+                stats["services_kept"] = sorted(self.services)
+            report[package] = stats
+        return report
+
+
+class PrunedPackageArchive(PythonPackageArchive):
+    """PythonPackageArchive that runs every module file through a PackagePruner."""
+
+    def __init__(self, modules=(), pruner=None):
+        self.pruner = pruner or PackagePruner()
+        super().__init__(modules)
+
+    def add_directory(self, path, ignore=None):
+        """Add files under the directory ``path`` that the pruner keeps."""
+        for root, dirs, files in os.walk(path):
+            arc_prefix = os.path.relpath(root, os.path.dirname(path))
+            if "__pycache__" in dirs:
+                dirs.remove("__pycache__")
+            self.pruner.add_package_dirs(os.path.join(arc_prefix, f) for f in files)
+            for f in files:
+                if f.endswith(".pyc") or f.endswith(".c"):
+                    continue
+                dest_path = os.path.join(arc_prefix, f)
+                if ignore and ignore(dest_path):
+                    continue
+                f_path = os.path.join(root, f)
+                if self.pruner.ignore(dest_path, size=os.path.getsize(f_path)):
+                    continue
+                self.add_file(f_path, dest_path)
+
+    def add_file(self, src, dest=None):
+        dest = dest or os.path.basename(src)
+        with open(src, "rb") as fp:
+            contents = fp.read()
+        self.add_contents(dest, self.pruner.process_contents(dest, contents))
+
+
+def package_name(dest_path):
+    """Return the top-level package of an archive path."""
+    return dest_path.replace("\\", "/").split("/", 1)[0]
+
+
+def latest_api_version(package, service):
+    """Return the newest API version directory for a service model, or None."""
+    spec = importlib.util.find_spec(package)
+    if spec is None or not spec.submodule_search_locations:
+        return None
+
+    for location in spec.submodule_search_locations:
+        service_dir = os.path.join(location, "data", service)
+        if os.path.isdir(service_dir):
+            versions = [
+                d for d in os.listdir(service_dir) if os.path.isdir(os.path.join(service_dir, d))
+            ]
+            return max(versions) if versions else None
+    return None
+
+
+def service_metadata(path):
+    """Return the metadata of a botocore service model file.
+
+    The metadata comes first in the model, so only the start of the file is
+    decompressed, falling back to the whole file.
+
+    Args:
+        path: Path of service-2.json or service-2.json.gz
+
+    Returns:
+        dict: Service metadata
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as fh:
+        head = fh.read(MODEL_HEAD_BYTES)
+        start = head.find("{", head.find('"metadata"'))
+        if '"metadata"' in head and start >= 0:
+            try:
+                return json.JSONDecoder().raw_decode(head, start)[0]
+            except json.JSONDecodeError:
+                pass
+        return json.loads(head + fh.read()).get("metadata", {})
+
+
+@functools.lru_cache(maxsize=None)
+def service_prefixes():
+    """Map IAM permission prefixes onto the botocore services they cover.
+
+    Built from the installed botocore models: a service is found by its name,
+    its signingName and its endpointPrefix, which is how IAM prefixes are named,
+    plus IAM_PREFIX_SERVICES.
+
+    Returns:
+        dict: Prefix to sorted list of botocore service names
+    """
+    prefixes = {}
+    spec = importlib.util.find_spec("botocore")
+    for location in spec.submodule_search_locations if spec else ():
+        data_dir = os.path.join(location, "data")
+        if not os.path.isdir(data_dir):
+            continue
+        for service in sorted(os.listdir(data_dir)):
+            version = latest_api_version("botocore", service)
+            if version is None:
+                continue
+            for name in ("service-2.json.gz", "service-2.json"):
+                path = os.path.join(data_dir, service, version, name)
+                if os.path.exists(path):
+                    break
+            else:
+                continue
+            metadata = service_metadata(path)
+            for prefix in {service, metadata.get("signingName"), metadata.get("endpointPrefix")}:
+                if prefix:
+                    prefixes.setdefault(prefix, set()).add(service)
+    for prefix, services in IAM_PREFIX_SERVICES.items():
+        prefixes.setdefault(prefix, set()).update(services)
+    return {prefix: sorted(services) for prefix, services in prefixes.items()}
+
+
+def get_required_services(policy_instance, allowlist=()):
+    """Work out the botocore service models a policy needs at runtime.
+
+    Uses the resource type's service plus the IAM permissions of the resource
+    manager, filters and actions, mapping permission prefixes onto botocore
+    service names. Config rule modes and the config source add config, which
+    c7n calls without declaring it.
+
+    Args:
+        policy_instance: The validated Cloud Custodian policy instance
+        allowlist: Additional service names to always keep
+
+    Returns:
+        set: botocore service names
+    """
+    services = set(BASE_SERVICES)
+    services.update(allowlist or ())
+
+    manager = policy_instance.resource_manager
+    resource_type = getattr(manager, "resource_type", None)
+    service = getattr(resource_type, "service", None)
+    if service:
+        services.add(service)
+
+    mode = policy_instance.data.get("mode", {}).get("type")
+    if mode in CONFIG_MODES or getattr(manager, "source_type", None) == "config":
+        services.add("config")
+
+    prefixes = service_prefixes()
+    for permission in policy_instance.get_permissions():
+        prefix = permission.split(":", 1)[0].lower()
+        services.update(prefixes.get(prefix, ()))
+
+    return services
+
+
+def bundles_service_models(packages):
+    """Return True if the package list bundles botocore or boto3 service models."""
+    return bool(set(packages or []).intersection(SERVICE_MODEL_PACKAGES))
+
+
+@functools.lru_cache(maxsize=None)
+def strip_tool_version(strip_command):
+    """Identify the strip tool, as different binutils versions strip differently.
+
+    Args:
+        strip_command: Path of the strip executable, or None
+
+    Returns:
+        str: First line of ``strip --version``, the sha256 of the executable if
+        that fails, or None without a strip command
+    """
+    if strip_command is None:
+        return None
+    result = subprocess.run(  # nosec B603
+        [strip_command, "--version"], capture_output=True, text=True, check=False
+    )
+    lines = result.stdout.strip().splitlines()
+    if result.returncode == 0 and lines:
+        return lines[0]
+    with open(strip_command, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+
+def strip_debug_symbols(contents, strip_command):
+    """Return ELF contents with debug symbols removed, or unchanged on failure."""
+    fd, path = tempfile.mkstemp(suffix=".so")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(contents)
+        result = subprocess.run(  # nosec B603
+            [strip_command, "--strip-debug", path], capture_output=True, check=False
+        )
+        if result.returncode != 0:
+            return contents
+        with open(path, "rb") as fh:
+            return fh.read()
+    finally:
+        os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List files pruned from packaged modules")
+    parser.add_argument("packages", nargs="+", help="Top-level packages to inspect")
+    parser.add_argument("--options", default="", help="Pruning options as JSON")
+    parser.add_argument(
+        "--services",
+        default="",
+        help="Comma separated botocore services to keep when botocore or boto3 are listed",
+    )
+    args = parser.parse_args()
+
+    try:
+        options = parse_prune_options({"package_pruning": args.options or "{}"})
+    except ValidationError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    options = dict(options or {}, dry_run=True)
+    pruner = PackagePruner(options)
+    if args.services and bundles_service_models(args.packages):
+        pruner.set_services(BASE_SERVICES.union(s.strip() for s in args.services.split(",")))
+    archive = PrunedPackageArchive(sorted(set(args.packages)), pruner=pruner)
+    archive.close()
+    archive.remove()
+
+    print(json.dumps(pruner.report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
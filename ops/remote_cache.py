@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Remote cache for lambda archives shared between CI runners.
+
+The layout follows Bazel's remote cache: build results are stored under
+ac/<cache key> as JSON and archives under cas/<sha256>. Two backends are
+supported, selected by the remote_cache URL:
+
+- a shared directory: /mnt/cache or file:///mnt/cache
+- an HTTP server accepting GET and PUT: https://cache.example.com/custodian
+
+Downloaded archives are verified against the hashes recorded in the result
+before they are published to the local build store. A cache that cannot be
+reached never fails the build, the outcome is reported instead.
+"""
+
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from ops.build_store import BuildStore
+from ops.common import ValidationError
+
+
+class RemoteCacheError(Exception):
+    """Raised when the remote cache fails or returns corrupt content."""
+
+    pass
+
+
+class FilesystemCache:
+    """Remote cache backed by a shared directory.
+
+    Args:
+        root: Cache directory
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, path):
+        """Return the content stored at path, or None if it is missing."""
+        try:
+            with open(os.path.join(self.root, path), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            raise RemoteCacheError(f"Failed to read {path}: {e}")
+
+    def put(self, path, data):
+        """Store content at path, readers never see a partial file."""
+        target = os.path.join(self.root, path)
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(temp_path, target)
+        except OSError as e:
+            raise RemoteCacheError(f"Failed to write {path}: {e}")
+
+
+class HttpCache:
+    """Remote cache backed by an HTTP server that supports GET and PUT.
+
+    Credentials in the URL are sent as basic authentication.
+
+    Args:
+        url: Base URL of the cache
+        timeout: Request timeout in seconds
+    """
+
+    def __init__(self, url, timeout=30):
+        parsed = urllib.parse.urlsplit(url)
+        self.headers = {}
+        if parsed.username:
+            credentials = f"{parsed.username}:{parsed.password or ''}".encode("utf-8")
+            self.headers["Authorization"] = "Basic " + base64.b64encode(credentials).decode()
+            parsed = parsed._replace(
+                netloc=parsed.hostname + (f":{parsed.port}" if parsed.port else "")
+            )
+        self.url = urllib.parse.urlunsplit(parsed).rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None):
+        request = urllib.request.Request(
+            f"{self.url}/{path}", data=data, method=method, headers=dict(self.headers)
+        )
+        if data is not None:
+            request.add_header("Content-Type", "application/octet-stream")
+        return urllib.request.urlopen(request, timeout=self.timeout)  # nosec B310
+
+    def get(self, path):
+        """Return the content stored at path, or None if it is missing."""
+        try:
+            with self._request("GET", path) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise RemoteCacheError(f"GET {path} failed: HTTP {e.code}")
+        except (urllib.error.URLError, OSError) as e:
+            raise RemoteCacheError(f"GET {path} failed: {e}")
+
+    def put(self, path, data):
+        """Store content at path."""
+        try:
+            with self._request("PUT", path, data):
+                pass
+        except urllib.error.HTTPError as e:
+            raise RemoteCacheError(f"PUT {path} failed: HTTP {e.code}")
+        except (urllib.error.URLError, OSError) as e:
+            raise RemoteCacheError(f"PUT {path} failed: {e}")
+
+
+def get_remote_cache(url):
+    """Create the backend for a remote_cache URL.
+
+    Args:
+        url: Directory path, file:// URL or http(s):// URL, empty to disable
+
+    Returns:
+        FilesystemCache, HttpCache or None
+
+    Raises:
+        ValidationError: If the URL scheme is not supported
+    """
+    if not url:
+        return None
+    scheme = urllib.parse.urlsplit(url).scheme
+    if scheme in ("http", "https"):
+        return HttpCache(url)
+    if scheme == "file":
+        return FilesystemCache(urllib.parse.unquote(urllib.parse.urlsplit(url).path))
+    if scheme == "":
+        return FilesystemCache(url)
+    raise ValidationError(f"Unsupported remote_cache URL scheme '{scheme}'")
+
+
+def verify_archive(data, result):
+    """Check archive bytes against the hashes recorded in a build result.
+
+    Raises:
+        RemoteCacheError: If either hash does not match
+    """
+    digest = hashlib.sha256(data).digest()
+    if digest.hex() != result.get("sha256_hex"):
+        raise RemoteCacheError(f"Archive {result.get('sha256_hex')} failed integrity check")
+    if base64.b64encode(digest).decode() != result.get("sha256_base64"):
+        raise RemoteCacheError(f"Archive {result.get('sha256_hex')} has a mismatched base64 hash")
+
+
+def fetch_build(cache, function_name, cache_key, build_root="build"):
+    """Fetch a build result and its archive, publishing the archive locally.
+
+    Args:
+        cache: Remote cache backend
+        function_name: Lambda function name for the build directory
+        cache_key: Digest of every input that affects the archive
+        build_root: Root build directory (default: "build")
+
+    Returns:
+        dict: Build result with a local zip_path, or None on a miss
+
+    Raises:
+        RemoteCacheError: If the cache fails or returns corrupt content
+    """
+    entry = cache.get(f"ac/{cache_key}")
+    if entry is None:
+        return None
+    try:
+        result = json.loads(entry)
+    except ValueError as e:
+        raise RemoteCacheError(f"Corrupt cache entry {cache_key}: {e}")
+
+    data = cache.get(f"cas/{result.get('sha256_hex')}")
+    if data is None:
+        return None
+    verify_archive(data, result)
+
+    fd, temp_path = tempfile.mkstemp(suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        result["zip_path"] = BuildStore(build_root).publish(
+            temp_path, function_name, f"{result['sha256_hex']}.zip"
+        )
+    finally:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+    return result
+
+
+def store_build(cache, cache_key, result):
+    """Upload an archive and its build result.
+
+    The archive is uploaded first so a result never points at a missing archive.
+
+    Raises:
+        RemoteCacheError: If the cache fails
+    """
+    with open(result["zip_path"], "rb") as fh:
+        cache.put(f"cas/{result['sha256_hex']}", fh.read())
+    entry = {k: v for k, v in result.items() if k != "zip_path"}
+    cache.put(f"ac/{cache_key}", json.dumps(entry, sort_keys=True).encode("utf-8"))
+
+
+def cached_build(query, function_name, cache_key, build, build_root="build"):
+    """Return a remote build result, or build and upload one.
+
+    Args:
+        query: Query dictionary, remote_cache holds the cache URL
+        function_name: Lambda function name for the build directory
+        cache_key: Digest of every input that affects the archive
+        build: Callable returning a new build result
+        build_root: Root build directory (default: "build")
+
+    Returns:
+        tuple: (result, status) where status is disabled, hit, miss or error: <message>
+
+    Raises:
+        RuntimeError: If the remote_cache URL is not supported
+    """
+    try:
+        cache = get_remote_cache(query.get("remote_cache", ""))
+    except ValidationError as e:
+        raise RuntimeError(str(e))
+    if cache is None:
+        return build(), "disabled"
+
+    errors = []
+    try:
+        result = fetch_build(cache, function_name, cache_key, build_root)
+        if result is not None:
+            return result, "hit"
+    except RemoteCacheError as e:
+        errors.append(str(e))
+
+    result = build()
+    try:
+        store_build(cache, cache_key, result)
+    except RemoteCacheError as e:
+        errors.append(str(e))
+    return result, f"error: {'; '.join(errors)}" if errors else "miss"
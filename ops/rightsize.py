@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Recommend Lambda memory and timeout settings from execution logs.
+
+Functions get 512 MB and 900 seconds unless mode.memory and mode.timeout are
+set. This reads exported logs and computes duration and memory percentiles per
+function, then recommends settings from them. It reads:
+
+- Lambda REPORT lines, in text files or JSON exports from
+  `aws logs filter-log-events` or CloudWatch Logs Insights
+- c7n run metadata.json files, which give the run duration of a policy
+
+Text and filter-log-events exports do not name the function, so it is taken
+from the file name, such as custodian-my-policy.log. Insights exports name it
+through the @log field.
+
+The report is keyed by policy name, mapped through the policies file when given,
+and each entry has the mode patch to apply:
+
+    python3 -m ops.rightsize logs/*.log --policies policies.yml
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+
+from ops.common import ValidationError, canonicalize_policies, validate_format
+
+DEFAULT_FUNCTION_PREFIX = "custodian-"
+DEFAULT_MEMORY = 512
+DEFAULT_TIMEOUT = 900
+MEMORY_HEADROOM = 1.3
+TIMEOUT_HEADROOM = 2.0
+# Lambda CPU scales with memory, below this c7n's import dominates cold starts
+MIN_MEMORY = 256
+MAX_MEMORY = 10240
+MEMORY_STEP = 64
+MIN_TIMEOUT = 60
+MAX_TIMEOUT = 900
+TIMEOUT_STEP = 30
+MIN_SAMPLES = 5
+
+REPORT_PATTERN = re.compile(
+    r"REPORT RequestId: (?P<request_id>\S+)\s+Duration: (?P<duration>[\d.]+) ms"
+    r".*?Memory Size: (?P<memory_size>\d+) MB\s+Max Memory Used: (?P<max_memory>\d+) MB"
+    r"(?:\s+Init Duration: (?P<init>[\d.]+) ms)?"
+    r"(?:.*?Status: (?P<status>\w+))?"
+)
+LOG_GROUP_PREFIX = "/aws/lambda/"
+
+
+def parse_report(message):
+    """Parse a Lambda REPORT log line.
+
+    Args:
+        message: Log message
+
+    Returns:
+        dict: duration_ms, memory_size_mb, max_memory_mb, init_ms and timed_out,
+        or None if the message is not a REPORT line
+    """
+    match = REPORT_PATTERN.search(message)
+    if not match:
+        return None
+    return {
+        "duration_ms": float(match.group("duration")),
+        "memory_size_mb": int(match.group("memory_size")),
+        "max_memory_mb": int(match.group("max_memory")),
+        "init_ms": float(match.group("init")) if match.group("init") else None,
+        "timed_out": match.group("status") == "timeout",
+    }
+
+
+def function_from_log_group(log_group):
+    """Return the function name of a Lambda log group, with an optional account prefix."""
+    log_group = log_group.split(":", 1)[-1]
+    if log_group.startswith(LOG_GROUP_PREFIX):
+        return log_group[len(LOG_GROUP_PREFIX) :]
+    return None
+
+
+def file_function_name(path):
+    """Return the function name taken from a log file name."""
+    name = os.path.basename(path)
+    return name.split(".", 1)[0]
+
+
+def read_records(path):
+    """Read the invocation records in an exported log or c7n metadata file.
+
+    Args:
+        path: Text log, JSON log export or c7n metadata.json
+
+    Returns:
+        list: (function name, record) tuples, or (policy name, record) for
+        metadata files, marked with "policy" in the record
+
+    Raises:
+        ValidationError: If the file cannot be read
+    """
+    try:
+        with open(path) as fh:
+            content = fh.read()
+    except OSError as e:
+        raise ValidationError(f"Could not read {path}: {e}")
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        data = None
+
+    default_function = file_function_name(path)
+    if isinstance(data, dict) and "execution" in data and "policy" in data:
+        record = {"duration_ms": float(data["execution"].get("duration", 0)) * 1000}
+        return [(data["policy"]["name"], dict(record, policy=True))]
+
+    if isinstance(data, dict):
+        events = data.get("events", [])
+    elif isinstance(data, list):
+        events = data
+    else:
+        events = [{"message": line} for line in content.splitlines()]
+
+    records = []
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        message = event.get("message") or event.get("@message") or ""
+        record = parse_report(message)
+        if record is None:
+            continue
+        log_group = event.get("@log") or event.get("logGroupName") or ""
+        records.append((function_from_log_group(log_group) or default_function, record))
+    return records
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(values):
+    """Return p50, p90, p99 and max of a list of numbers."""
+    return {
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+
+def round_up(value, step):
+    """Round a value up to a multiple of step."""
+    return int(math.ceil(value / step) * step)
+
+
+def recommend(records, current_memory, current_timeout):
+    """Recommend memory and timeout settings from the records of one function.
+
+    Memory covers the p99 of the memory used with headroom, timeout covers the
+    p99 duration with headroom. A function that timed out keeps at least twice
+    its current timeout, as its durations are cut short.
+
+    Args:
+        records: Invocation records of the function
+        current_memory: Current memory size in MB
+        current_timeout: Current timeout in seconds
+
+    Returns:
+        dict: Summary, current and recommended settings and the change in
+        GB-seconds per invocation at the p50 duration
+    """
+    durations = [r["duration_ms"] for r in records]
+    memory_used = [r["max_memory_mb"] for r in records if r.get("max_memory_mb")]
+    timeouts = sum(1 for r in records if r.get("timed_out"))
+    result = {
+        "invocations": len(records),
+        "timeouts": timeouts,
+        "duration_ms": summarize(durations),
+        "max_memory_mb": summarize(memory_used) if memory_used else None,
+        "current": {"memory": current_memory, "timeout": current_timeout},
+        "recommended": None,
+    }
+    if len(records) < MIN_SAMPLES:
+        return result
+
+    memory = current_memory
+    if memory_used:
+        memory = round_up(result["max_memory_mb"]["p99"] * MEMORY_HEADROOM, MEMORY_STEP)
+        memory = min(MAX_MEMORY, max(MIN_MEMORY, memory))
+
+    timeout = round_up(result["duration_ms"]["p99"] / 1000 * TIMEOUT_HEADROOM, TIMEOUT_STEP)
+    if timeouts:
+        timeout = max(timeout, current_timeout * 2)
+    timeout = min(MAX_TIMEOUT, max(MIN_TIMEOUT, timeout))
+
+    p50_seconds = result["duration_ms"]["p50"] / 1000
+    result["recommended"] = {"memory": memory, "timeout": timeout}
+    result["gb_seconds_per_invocation"] = {
+        "current": round(current_memory / 1024 * p50_seconds, 4),
+        "recommended": round(memory / 1024 * p50_seconds, 4),
+    }
+    return result
+
+
+def policy_functions(policies_dict):
+    """Return function name to (policy name, mode) for the policies in a file."""
+    functions = {}
+    for policy in canonicalize_policies(policies_dict).get("policies", []):
+        mode = policy.get("mode", {})
+        prefix = mode.get("function-prefix", DEFAULT_FUNCTION_PREFIX)
+        functions[f"{prefix}{policy['name']}"] = (policy["name"], mode)
+    return functions
+
+
+def rightsize(paths, policies_dict=None):
+    """Recommend settings for every function or policy found in the files.
+
+    Args:
+        paths: Log exports and c7n metadata files
+        policies_dict: Optional parsed policies, to key the report by policy
+            name and read the current timeout
+
+    Returns:
+        dict: Policy name, or function name when no policy matches, to the
+        recommendation with a mode patch
+
+    Raises:
+        ValidationError: If a file cannot be read
+    """
+    functions = policy_functions(policies_dict) if policies_dict else {}
+    by_policy = {name: function for function, (name, _) in functions.items()}
+
+    grouped = {}
+    for path in paths:
+        for name, record in read_records(path):
+            if record.pop("policy", False):
+                name = by_policy.get(name, f"{DEFAULT_FUNCTION_PREFIX}{name}")
+            grouped.setdefault(name, []).append(record)
+
+    report = {}
+    for function, records in sorted(grouped.items()):
+        policy_name, mode = functions.get(function, (None, {}))
+        if policy_name is None and function.startswith(DEFAULT_FUNCTION_PREFIX):
+            policy_name = function[len(DEFAULT_FUNCTION_PREFIX) :]
+        sizes = [r["memory_size_mb"] for r in records if r.get("memory_size_mb")]
+        current_memory = sizes[-1] if sizes else mode.get("memory", DEFAULT_MEMORY)
+        result = recommend(records, current_memory, mode.get("timeout", DEFAULT_TIMEOUT))
+        result["function_name"] = function
+        if result["recommended"]:
+            result["patch"] = {"mode": dict(result["recommended"])}
+        report[policy_name or function] = result
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recommend Lambda memory and timeout settings from execution logs"
+    )
+    parser.add_argument("paths", nargs="+", help="Exported logs or c7n metadata.json files")
+    parser.add_argument("--policies", help="Policies file, to map functions to policies")
+    args = parser.parse_args()
+
+    try:
+        policies_dict = None
+        if args.policies:
+            with open(args.policies) as fh:
+                policies_dict = validate_format({"policies": fh.read()}, "policies")
+        report = rightsize(args.paths, policies_dict)
+    except (OSError, ValidationError) as e:
+        print(f"Failed to recommend settings: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
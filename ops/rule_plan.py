@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Plan the consolidation of the EventBridge rules of event mode policies.
+
+Every cloudtrail, guard-duty, hub-finding and other event mode policy gets its
+own rule per region, and a bus allows 300 rules by default. A rule can have up to
+five targets, so policies whose patterns are equivalent can share one rule, each
+policy's function being a target. Patterns are equivalent when they are equal
+after sorting keys and value lists and dropping duplicates, as EventBridge
+ignores order within them.
+
+Patterns that differ are never merged, as each target would receive the other's
+events. Patterns that overlap are reported instead, with an event built from
+values both patterns accept. The merged rules are verified with
+ops/event_match.py: the rule pattern must match the same events as the pattern
+of each of its policies, on events built from the values of every pattern and
+on any event corpora given.
+
+    python3 -m ops.rule_plan policies.yml --regions us-east-1,eu-west-1
+"""
+
+import argparse
+import hashlib
+import ipaddress
+import itertools
+import json
+import sys
+
+from ops.common import ValidationError, canonical_json, canonical_value, validate_format
+from ops.event_match import (
+    compile_field,
+    compile_pattern,
+    event_name,
+    is_number,
+    policy_patterns,
+    read_events,
+)
+
+DEFAULT_REGIONS = ["us-east-1"]
+MAX_TARGETS_PER_RULE = 5
+RULES_PER_BUS = 300
+RULE_PREFIX = "custodian-events-"
+MAX_WITNESSES = 50
+MAX_ALTERNATIVES = 64
+
+
+def canonical_pattern(pattern):
+    """Return a pattern with sorted keys and sorted, unique value lists.
+
+    Args:
+        pattern: Event pattern dictionary
+
+    Returns:
+        dict: Equivalent pattern, equal for patterns EventBridge treats alike
+    """
+    canonical = {}
+    for key, value in pattern.items():
+        if key == "$or":
+            alternatives = {canonical_json(canonical_pattern(a)): a for a in value}
+            canonical[key] = [canonical_pattern(alternatives[k]) for k in sorted(alternatives)]
+        elif isinstance(value, dict):
+            nested = canonical_pattern(value)
+            if nested:
+                canonical[key] = nested
+        elif isinstance(value, list):
+            unique = {canonical_json(v): canonical_value(v) for v in value}
+            canonical[key] = [unique[k] for k in sorted(unique)]
+        else:
+            canonical[key] = value
+    return canonical_value(canonical)
+
+
+def alternatives(pattern, path=()):
+    """Expand a pattern into plain alternatives, one per combination of $or choices.
+
+    Args:
+        pattern: Event pattern dictionary
+        path: Path of the pattern in the event
+
+    Returns:
+        list: Dictionaries of field path to value list
+    """
+    expanded = [{}]
+    for key, value in pattern.items():
+        if key == "$or":
+            options = [option for a in value for option in alternatives(a, path)]
+        elif isinstance(value, dict):
+            options = alternatives(value, path + (key,))
+        else:
+            options = [{path + (key,): value}]
+        expanded = [{**e, **o} for e in expanded for o in options][:MAX_ALTERNATIVES]
+    return expanded
+
+
+def example_values(matchers):
+    """Return candidate values for a value list, to be checked against it."""
+    examples = []
+    for matcher in matchers:
+        if not isinstance(matcher, dict):
+            examples.append(matcher)
+            continue
+        name, operand = next(iter(matcher.items()))
+        if name in ("prefix", "suffix") and isinstance(operand, dict):
+            operand = operand.get("equals-ignore-case")
+        if name in ("prefix", "suffix", "equals-ignore-case") and isinstance(operand, str):
+            examples.append(operand)
+        elif name == "wildcard" and isinstance(operand, str):
+            examples.append(operand.replace("\\*", "\0").replace("*", "").replace("\0", "*"))
+        elif name == "numeric" and isinstance(operand, list):
+            for limit in operand[1::2]:
+                if is_number(limit):
+                    examples.extend([limit - 1, limit, limit + 1])
+        elif name == "cidr":
+            try:
+                examples.append(str(ipaddress.ip_network(operand, strict=False).network_address))
+            except (TypeError, ValueError):
+                pass
+        else:
+            examples.append("example")
+    return examples
+
+
+def build_event(items):
+    """Build an event from (path, value) pairs."""
+    event = {}
+    for path, value in items:
+        target = event
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return event
+
+
+def accepted_values(fields, path):
+    """Return the example values of a path that every alternative in fields accepts.
+
+    Args:
+        fields: Plain alternatives, field path to value list, that constrain the path
+        path: Field path
+
+    Returns:
+        list: Accepted values
+    """
+    checks = [compile_field(path, alt[path]) for alt in fields if path in alt]
+    candidates = [v for alt in fields if path in alt for v in example_values(alt[path])]
+    accepted = []
+    for value in candidates:
+        if value not in accepted and all(check(build_event([(path, value)])) for check in checks):
+            accepted.append(value)
+    return accepted
+
+
+def witness_events(pattern, limit=MAX_WITNESSES):
+    """Build events from the values of a pattern that the pattern matches.
+
+    Every accepted value of every field is used at least once, then combinations
+    are added up to the limit.
+
+    Args:
+        pattern: Event pattern dictionary
+        limit: Largest number of events per alternative
+
+    Returns:
+        list: Event dictionaries
+    """
+    match = compile_pattern(pattern)
+    events = []
+    for fields in alternatives(pattern):
+        values = {path: accepted_values([fields], path) for path in fields}
+        values = {path: v for path, v in values.items() if v}
+        paths = sorted(values)
+        rows = [
+            [values[path][i % len(values[path])] for path in paths]
+            for i in range(max((len(v) for v in values.values()), default=1))
+        ]
+        rows.extend(itertools.islice(itertools.product(*(values[p] for p in paths)), limit))
+        for row in rows[:limit]:
+            event = build_event(zip(paths, row))
+            if match(event) and event not in events:
+                events.append(event)
+    return events
+
+
+def overlap_event(first, second):
+    """Return an event both patterns match, or None if none was found.
+
+    Each field gets a value accepted by both patterns. Fields are independent
+    within an alternative, so such an event exists when every field has one,
+    and it is confirmed with the full patterns.
+    """
+    first_match, second_match = compile_pattern(first), compile_pattern(second)
+    for a, b in itertools.product(alternatives(first), alternatives(second)):
+        items = []
+        for path in sorted(set(a) | set(b)):
+            accepted = accepted_values([a, b], path)
+            if accepted:
+                items.append((path, accepted[0]))
+        event = build_event(items)
+        if first_match(event) and second_match(event):
+            return event
+    return None
+
+
+def rule_name(pattern_key, index):
+    """Return the name of a shared rule from its canonical pattern."""
+    digest = hashlib.sha256(pattern_key.encode("utf-8")).hexdigest()[:8]
+    return f"{RULE_PREFIX}{digest}" + (f"-{index + 1}" if index else "")
+
+
+def verify_rule(pattern, member_patterns, events):
+    """Count the events a rule pattern and its policies' patterns disagree on."""
+    rule = compile_pattern(pattern)
+    members = [compile_pattern(p) for p in member_patterns]
+    return sum(1 for event in events for member in members if rule(event) != member(event))
+
+
+def plan_rules(policies_dict, regions=None, corpus=()):
+    """Plan shared rules for the event mode policies.
+
+    Args:
+        policies_dict: Parsed policies
+        regions: Regions the policies are deployed to
+        corpus: Optional events to verify the merged rules with
+
+    Returns:
+        dict: rules with their pattern and target policies, overlaps, rule
+        counts before and after per region and across regions, and
+        verification results
+
+    Raises:
+        ValidationError: If a pattern cannot be generated or is invalid
+    """
+    regions = regions or DEFAULT_REGIONS
+    patterns = policy_patterns(policies_dict)
+
+    groups = {}
+    for name, pattern in sorted(patterns.items()):
+        canonical = canonical_pattern(pattern)
+        groups.setdefault(canonical_json(canonical), (canonical, []))[1].append(name)
+
+    witnesses = {key: witness_events(canonical) for key, (canonical, _) in groups.items()}
+    events = [e for key in sorted(witnesses) for e in witnesses[key]] + list(corpus)
+
+    rules = []
+    mismatches = 0
+    for key, (canonical, names) in sorted(groups.items()):
+        if len(names) > 1:
+            mismatches += verify_rule(canonical, [patterns[n] for n in names], events)
+        for index in range(0, len(names), MAX_TARGETS_PER_RULE):
+            rules.append(
+                {
+                    "name": rule_name(key, index // MAX_TARGETS_PER_RULE),
+                    "pattern": canonical,
+                    "targets": names[index : index + MAX_TARGETS_PER_RULE],
+                }
+            )
+
+    overlaps = []
+    for a, b in itertools.combinations(sorted(groups), 2):
+        event = overlap_event(groups[a][0], groups[b][0])
+        if event is not None:
+            overlaps.append(
+                {"policies": [groups[a][1], groups[b][1]], "example": event_name(event)}
+            )
+
+    before = len(patterns)
+    return {
+        "regions": regions,
+        "policies": before,
+        "rules_per_region": {"before": before, "after": len(rules), "quota": RULES_PER_BUS},
+        "rules_total": {"before": before * len(regions), "after": len(rules) * len(regions)},
+        "reduction": (before - len(rules)) * len(regions),
+        "rules": rules,
+        "overlaps": overlaps,
+        "verification": {"events": len(events), "mismatches": mismatches},
+    }
+
+
+def format_report(plan):
+    """Return report lines with the shared rules, overlaps and rule counts."""
+    lines = []
+    for rule in plan["rules"]:
+        if len(rule["targets"]) > 1:
+            lines.append(f"{rule['name']}: {', '.join(rule['targets'])}")
+    for overlap in plan["overlaps"]:
+        first, second = (", ".join(names) for names in overlap["policies"])
+        lines.append(f"overlap: {first} and {second} both match {overlap['example']}")
+    per_region = plan["rules_per_region"]
+    lines.append(
+        f"rules per region: {per_region['before']} -> {per_region['after']} "
+        f"(quota {per_region['quota']}), {plan['reduction']} fewer across "
+        f"{len(plan['regions'])} region(s)"
+    )
+    verification = plan["verification"]
+    lines.append(
+        f"verified on {verification['events']} events: {verification['mismatches']} mismatches"
+    )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan shared rules for event mode policies")
+    parser.add_argument("path", help="Policies file in JSON or YAML")
+    parser.add_argument(
+        "--regions", default=",".join(DEFAULT_REGIONS), help="Comma separated regions"
+    )
+    parser.add_argument(
+        "--events", action="append", default=[], help="JSONL events to verify with, repeatable"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the full plan as JSON")
+    args = parser.parse_args()
+
+    try:
+        with open(args.path) as fh:
+            policies_dict = validate_format({"policies": fh.read()}, "policies")
+        plan = plan_rules(
+            policies_dict,
+            regions=[r.strip() for r in args.regions.split(",") if r.strip()],
+            corpus=read_events(args.events),
+        )
+    except (OSError, ValidationError) as e:
+        print(f"Failed to plan rules: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        for line in format_report(plan):
+            print(line)
+    if plan["verification"]["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Spread the schedules of periodic and schedule mode policies.
+
+Policies written with the same rate or cron expression fire in the same minute
+in every region, so their API calls arrive together and are throttled. The
+planner gives each policy a deterministic offset from a hash of its name and
+rewrites its schedule with it:
+
+- rate(N minutes) where N divides 60, rate(N hours) where N divides 24 and
+  rate(1 day) become cron expressions starting at the offset
+- cron expressions with a fixed minute, or a minute step, have the offset added
+  to the minute, without moving the run into the next hour
+- other schedule mode expressions keep their schedule and get a flexible time
+  window, periodic mode expressions are left as they are
+
+It also predicts the peak number of invocations running at once per service and
+region over one day, before and after the plan:
+
+    python3 -m ops.schedule_plan policies.yml --regions us-east-1,eu-west-1
+
+The schedule_plan output is the value of the schedule_plan variable of the
+policies module.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+
+from ops.common import ValidationError, canonicalize_policies, validate_format
+
+try:
+    from c7n.provider import get_resource_class
+    from c7n.resources import load_resources
+    from c7n.structure import StructureParser
+except ImportError:  # pragma: no cover
+    print("Cloud Custodian (c7n) package is not installed. Please install it", file=sys.stderr)
+    sys.exit(1)
+
+
+SCHEDULED_TYPES = {"periodic", "schedule"}
+DEFAULT_REGIONS = ["us-east-1"]
+DEFAULT_MAX_OFFSET = 60
+DEFAULT_WINDOW = 15
+DEFAULT_DURATION = 1
+MINUTES_PER_DAY = 24 * 60
+
+RATE_PATTERN = re.compile(r"^rate\(\s*(\d+)\s+(minute|minutes|hour|hours|day|days)\s*\)$")
+CRON_PATTERN = re.compile(r"^cron\((.+)\)$")
+RATE_MINUTES = {"minute": 1, "hour": 60, "day": MINUTES_PER_DAY}
+
+
+def name_hash(name):
+    """Return a stable integer hash of a policy name."""
+    return int(hashlib.sha256(name.encode("utf-8")).hexdigest()[:12], 16)
+
+
+def parse_rate(schedule):
+    """Return the period in minutes of a rate expression, or None."""
+    match = RATE_PATTERN.match(schedule.strip())
+    if not match:
+        return None
+    return int(match.group(1)) * RATE_MINUTES[match.group(2).rstrip("s")]
+
+
+def parse_cron(schedule):
+    """Return the six fields of a cron expression, or None."""
+    match = CRON_PATTERN.match(schedule.strip())
+    if not match:
+        return None
+    fields = match.group(1).split()
+    return fields if len(fields) == 6 else None
+
+
+def expand_field(field, low, high):
+    """Expand a cron minute or hour field to the values it matches.
+
+    Args:
+        field: Field such as "*", "5", "1-10", "0/15", "*/2" or a comma list of them
+        low: Smallest value of the field
+        high: Largest value of the field
+
+    Returns:
+        list: Sorted values, or None if the field is not understood
+    """
+    values = set()
+    for part in field.split(","):
+        base, _, step = part.partition("/")
+        try:
+            step = int(step) if step else 1
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start, end = (int(v) for v in base.split("-", 1))
+            else:
+                start = int(base)
+                end = high if "/" in part else start
+        except ValueError:
+            return None
+        if step < 1 or not low <= start <= end <= high:
+            return None
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+def firing_minutes(schedule):
+    """Return the minutes of a day at which a schedule fires.
+
+    Day, month and weekday fields are taken to match, and rates are taken to
+    start at midnight, as when every rule is created at once, which predicts
+    the worst case.
+
+    Args:
+        schedule: rate or cron expression
+
+    Returns:
+        list: Minutes since midnight, or None if the schedule is not understood
+    """
+    period = parse_rate(schedule)
+    if period:
+        return list(range(0, MINUTES_PER_DAY, period))
+
+    fields = parse_cron(schedule)
+    if fields is None:
+        return None
+    minutes = expand_field(fields[0], 0, 59)
+    hours = expand_field(fields[1], 0, 23)
+    if minutes is None or hours is None:
+        return None
+    return [h * 60 + m for h in hours for m in minutes]
+
+
+def spread_rate(period, offset):
+    """Return a cron expression for a rate period starting at an offset, or None.
+
+    Args:
+        period: Rate period in minutes
+        offset: Minutes after midnight, smaller than the period
+
+    Returns:
+        str: cron expression, or None if the period cannot be written as cron
+    """
+    if period < 60 and 60 % period == 0:
+        return f"cron({offset}/{period} * * * ? *)" if period > 1 else None
+    if period % 60 == 0 and 24 % (period // 60) == 0:
+        hours = period // 60
+        hour = f"{offset // 60}/{hours}" if hours > 1 else "*"
+        if hours == 24:
+            hour = str(offset // 60)
+        return f"cron({offset % 60} {hour} * * ? *)"
+    return None
+
+
+def spread_cron(fields, seed, max_offset):
+    """Return a cron expression with its minute moved by a seeded offset, or None.
+
+    Args:
+        fields: Six cron fields
+        seed: Integer seed for the offset
+        max_offset: Largest offset in minutes
+
+    Returns:
+        tuple: (cron expression, offset in minutes), or None if the minute
+        field is not a fixed minute or a step from a fixed minute
+    """
+    minute = fields[0]
+    if minute.isdigit():
+        room = min(max_offset, 60 - int(minute))
+        offset = seed % room if room > 0 else 0
+        new_minute = str(int(minute) + offset)
+    else:
+        base, _, step = minute.partition("/")
+        if not step.isdigit() or not (base == "*" or base.isdigit()):
+            return None
+        start, step = (0 if base == "*" else int(base)), int(step)
+        if 60 % step:
+            return None
+        room = min(max_offset, step - start)
+        offset = seed % room if room > 0 else 0
+        new_minute = f"{start + offset}/{step}"
+    return f"cron({' '.join([new_minute] + fields[1:])})", offset
+
+
+def plan_schedule(name, mode, max_offset=DEFAULT_MAX_OFFSET, window=DEFAULT_WINDOW):
+    """Plan the spread schedule of one policy.
+
+    Args:
+        name: Policy name, seeding the offset
+        mode: Policy mode with type and schedule
+        max_offset: Largest offset in minutes
+        window: Flexible time window in minutes for schedule mode expressions
+            that cannot be rewritten
+
+    Returns:
+        dict: schedule (original), planned (schedule to deploy), offset in
+        minutes and flexible_time_window (minutes, or None)
+    """
+    schedule = mode["schedule"]
+    seed = name_hash(name)
+    plan = {"schedule": schedule, "planned": schedule, "offset": 0, "flexible_time_window": None}
+
+    period = parse_rate(schedule)
+    fields = parse_cron(schedule)
+    if period:
+        offset = seed % max(1, min(period, max_offset))
+        planned = spread_rate(period, offset)
+        if planned:
+            return dict(plan, planned=planned, offset=offset)
+    elif fields:
+        spread = spread_cron(fields, seed, max_offset)
+        if spread:
+            return dict(plan, planned=spread[0], offset=spread[1])
+
+    if mode["type"] == "schedule" and window > 0:
+        # The scheduler picks a time in the window, estimate it with the seed
+        plan.update(flexible_time_window=window, offset=seed % window)
+    return plan
+
+
+def resource_services(policies):
+    """Return the AWS service of each policy resource type.
+
+    Args:
+        policies: List of policies
+
+    Returns:
+        dict: Resource type, such as "aws.ec2", to service name
+    """
+    resource_types = StructureParser().get_resource_types({"policies": policies})
+    load_resources(resource_types)
+    services = {}
+    for resource_type in resource_types:
+        resource_class = get_resource_class(resource_type)
+        service = getattr(getattr(resource_class, "resource_type", None), "service", None)
+        services[resource_type] = service or resource_type.split(".", 1)[-1]
+    return services
+
+
+def resource_type_name(resource):
+    """Return the resource type with its provider prefix."""
+    return resource if "." in resource else f"aws.{resource}"
+
+
+def peak_concurrency(runs, duration=DEFAULT_DURATION):
+    """Return the peak number of invocations running at once per service.
+
+    Args:
+        runs: List of (service, regions, minutes) for each policy
+        duration: Minutes an invocation runs for
+
+    Returns:
+        dict: Service to {"peak", "region", "at"} with "at" the HH:MM of the peak
+    """
+    active = {}
+    for service, regions, minutes in runs:
+        for region in regions:
+            counts = active.setdefault((service, region), [0] * MINUTES_PER_DAY)
+            for minute in minutes:
+                for t in range(minute, minute + max(1, duration)):
+                    counts[t % MINUTES_PER_DAY] += 1
+
+    peaks = {}
+    for (service, region), counts in sorted(active.items()):
+        peak = max(counts)
+        if peak > peaks.get(service, {}).get("peak", -1):
+            at = counts.index(peak)
+            peaks[service] = {"peak": peak, "region": region, "at": f"{at // 60:02d}:{at % 60:02d}"}
+    return peaks
+
+
+def plan_schedules(
+    policies_dict,
+    regions=None,
+    max_offset=DEFAULT_MAX_OFFSET,
+    window=DEFAULT_WINDOW,
+    duration=DEFAULT_DURATION,
+):
+    """Plan spread schedules for the scheduled policies in a policies dictionary.
+
+    Args:
+        policies_dict: Parsed policies dictionary
+        regions: Regions every policy is deployed to
+        max_offset: Largest offset in minutes
+        window: Flexible time window in minutes for schedule mode fallbacks
+        duration: Minutes an invocation is taken to run for
+
+    Returns:
+        dict: policies (per policy plan with service and regions), peaks
+        (before and after per service), schedule_plan (for Terraform) and
+        not_modelled (policies whose schedule is left out of the peaks)
+
+    Raises:
+        ValidationError: If the policies have no names or the options are invalid
+    """
+    if max_offset < 1 or duration < 1 or window < 0:
+        raise ValidationError("max_offset and duration must be positive, window not negative")
+    regions = regions or DEFAULT_REGIONS
+    policies = [
+        p
+        for p in canonicalize_policies(policies_dict).get("policies", [])
+        if p.get("mode", {}).get("type") in SCHEDULED_TYPES and p["mode"].get("schedule")
+    ]
+    if any("name" not in p for p in policies):
+        raise ValidationError("Every policy must have a name")
+    services = resource_services(policies)
+
+    plans, before, after, not_modelled = {}, [], [], []
+    for policy in policies:
+        plan = plan_schedule(policy["name"], policy["mode"], max_offset, window)
+        service = services[resource_type_name(policy["resource"])]
+        plans[policy["name"]] = dict(plan, service=service, regions=regions)
+
+        minutes_before = firing_minutes(plan["schedule"])
+        minutes_after = firing_minutes(plan["planned"])
+        if minutes_before is None or minutes_after is None:
+            not_modelled.append(policy["name"])
+            continue
+        if plan["flexible_time_window"]:
+            minutes_after = [(m + plan["offset"]) % MINUTES_PER_DAY for m in minutes_after]
+        before.append((service, regions, minutes_before))
+        after.append((service, regions, minutes_after))
+
+    peaks_before = peak_concurrency(before, duration)
+    peaks_after = peak_concurrency(after, duration)
+    return {
+        "policies": plans,
+        "peaks": {
+            service: {"before": peaks_before[service], "after": peaks_after[service]}
+            for service in sorted(peaks_before)
+        },
+        "schedule_plan": {
+            name: {
+                "schedule": plan["planned"],
+                "flexible_time_window_minutes": plan["flexible_time_window"],
+            }
+            for name, plan in plans.items()
+            if plan["planned"] != plan["schedule"] or plan["flexible_time_window"]
+        },
+        "not_modelled": not_modelled,
+    }
+
+
+def format_report(plan):
+    """Return report lines with the schedule changes and predicted peaks."""
+    lines = []
+    for name, policy in sorted(plan["policies"].items()):
+        change = policy["planned"]
+        if policy["flexible_time_window"]:
+            change += f" (flexible window {policy['flexible_time_window']}m)"
+        lines.append(f"{name}: {policy['schedule']} -> {change}")
+    for service, peaks in plan["peaks"].items():
+        lines.append(
+            f"{service}: peak {peaks['before']['peak']} at {peaks['before']['at']} -> "
+            f"{peaks['after']['peak']} at {peaks['after']['at']} ({peaks['after']['region']})"
+        )
+    for name in plan["not_modelled"]:
+        lines.append(f"{name}: schedule not understood, left out of the peaks")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spread the schedules of scheduled policies")
+    parser.add_argument("path", help="Policies file in JSON or YAML")
+    parser.add_argument(
+        "--regions", default=",".join(DEFAULT_REGIONS), help="Comma separated regions"
+    )
+    parser.add_argument(
+        "--max-offset", type=int, default=DEFAULT_MAX_OFFSET, help="Largest offset in minutes"
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=DEFAULT_WINDOW,
+        help="Flexible time window in minutes for schedule mode expressions that are not rewritten",
+    )
+    parser.add_argument(
+        "--duration", type=int, default=DEFAULT_DURATION, help="Minutes an invocation runs for"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the full plan as JSON")
+    args = parser.parse_args()
+
+    try:
+        with open(args.path) as fh:
+            policies_dict = validate_format({"policies": fh.read()}, "policies")
+        plan = plan_schedules(
+            policies_dict,
+            regions=[r.strip() for r in args.regions.split(",") if r.strip()],
+            max_offset=args.max_offset,
+            window=args.window,
+            duration=args.duration,
+        )
+    except (OSError, ValidationError) as e:
+        print(f"Failed to plan schedules: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        for line in format_report(plan):
+            print(line)
+        print(json.dumps({"schedule_plan": plan["schedule_plan"]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
@@ -27,11 +27,11 @@ except ImportError:  # pragma: no cover
 
 from ops.common import (
     validate_format,
-    return_result,
-    return_error,
+    run_cli,
     ValidationError,
     format_validation_errors,
 )
+from ops.mailer_templates import TEMPLATE_INDEX_PATH, TemplateIndex, validate_templates
 
 
 def process_templates(mailer_config, templates):
@@ -43,6 +43,9 @@ def process_templates(mailer_config, templates):
 
     Returns:
         mailer_config: Config with templates_folders added
+
+    Raises:
+        ValidationError: If any template in the folders has a syntax error
     """
     module_dir = path.dirname(path.abspath(c7n_mailer.__file__))
 
@@ -57,6 +60,10 @@ def process_templates(mailer_config, templates):
 
     mailer_config["templates_folders"] = default_templates
 
+    index = TemplateIndex(TEMPLATE_INDEX_PATH)
+    validate_templates(default_templates, index)
+    index.save()
+
     return mailer_config
 
 
@@ -105,18 +112,7 @@ def process_mailer(query):
 
 
 def main():
-    try:
-        query = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        return_error(f"Failed to parse input JSON: {e}")
-    except Exception as e:  # pragma: no cover
-        return_error(f"Unexpected error reading input: {type(e).__name__}: {e}")
-
-    try:
-        result = process_mailer(query)
-        return_result(result)
-    except ValidationError as e:
-        return_error(str(e))
+    run_cli(process_mailer)
 
 
 if __name__ == "__main__":
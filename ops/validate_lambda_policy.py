@@ -11,18 +11,17 @@ Outputs a JSON object:
 """
 
 import json
-import sys
 
 from ops.common import (
     validate_policy_structure,
     validate_policy_mode,
-    return_result,
-    return_error,
+    run_cli,
     validate_with_custodian,
     ValidationError,
     parse_policies,
     format_validation_errors,
 )
+from ops.policy_cost import estimate_policy, info_messages as performance_messages
 
 
 def create_result(valid, info_messages, error_messages, policy_name):
@@ -75,12 +74,18 @@ def validate_policy(policies_dict):
         error_messages.append(str(e))
 
     try:
-        validate_with_custodian(policies_dict)
+        policy_instance = validate_with_custodian(policies_dict)
         info_messages.append(
             f"Cloud Custodian internal validation passed for policy '{policy_name}'"
         )
     except ValidationError as e:
         error_messages.append(str(e))
+    else:
+        try:
+            info_messages.extend(performance_messages(estimate_policy(policy_instance)))
+        except Exception as e:  # pragma: no cover
+            # The estimate is advisory and must not fail validation
+            info_messages.append(f"Performance: no estimate, {type(e).__name__}: {e}")
 
     valid = len(error_messages) == 0
     return create_result(valid, info_messages, error_messages, policy_name)
@@ -102,23 +107,29 @@ def process_policies(query):
     return validate_policy(policies_dict)
 
 
-def main():
-    try:
-        query = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        return_error(f"Failed to parse input JSON: {e}")
-    except Exception as e:  # pragma: no cover
-        return_error(f"Unexpected error reading input: {type(e).__name__}: {e}")
+def run(query):
+    """Validate the policies in a query, as the external data source does.
 
-    try:
-        result = process_policies(query)
-        if result["valid"] == "false":
-            # Return a more readable error message for Terraform
-            error_msg = f"Policy validation failed for '{result['policy_name']}':\n{result['error_messages']}"
-            return_error(error_msg)
-        return_result(result)
-    except ValidationError as e:
-        return_error(str(e))
+    Args:
+        query: Dictionary with query parameters
+
+    Returns:
+        Dictionary with validation results
+
+    Raises:
+        ValidationError: If the input or the policy is invalid
+    """
+    result = process_policies(query)
+    if result["valid"] == "false":
+        # Return a more readable error message for Terraform
+        raise ValidationError(
+            f"Policy validation failed for '{result['policy_name']}':\n{result['error_messages']}"
+        )
+    return result
+
+
+def main():
+    run_cli(run)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Watch policy files and mailer template folders during policy development.
+
+Instead of running terraform plan after every edit, the watcher keeps c7n loaded
+in one process and re-runs the validate, package, event pattern and config rule
+stages only for the policies an edit changed. Each stage has an input digest, so
+an edit to a policy's filters re-validates and re-packages it but does not
+re-render its event pattern. Every run prints the stage timings and the
+old and new digests of each stage output:
+
+    python3 -m ops.watch policies/*.yml --role arn:aws:iam::123456789012:role/custodian
+
+Stages are called with the same query Terraform builds, so archive hashes match
+those of a plan when the role is given as an ARN. Regions are not resolved, the
+watcher makes no AWS calls.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from ops.common import (
+    ValidationError,
+    canonical_json,
+    canonicalize_policies,
+    validate_format,
+)
+from ops import (
+    get_cloudwatch_event_pattern,
+    get_config_rule_params,
+    package_lambda_policy,
+    validate_lambda_policy,
+)
+from ops.prune import parse_prune_options
+
+POLICY_EXTENSIONS = (".yml", ".yaml", ".json")
+DEFAULT_FUNCTION_PREFIX = "custodian-"
+
+
+def file_state(path):
+    """Return (mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def short_digest(value):
+    """Return a short sha256 hex digest of a JSON-serializable value."""
+    return hashlib.sha256(canonical_json(value).encode("utf-8")).hexdigest()[:12]
+
+
+def expand_policy_paths(paths):
+    """Expand directories to the policy files they contain.
+
+    Args:
+        paths: Policy files or directories
+
+    Returns:
+        list: Sorted policy file paths
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(
+                os.path.join(path, f) for f in os.listdir(path) if f.endswith(POLICY_EXTENSIONS)
+            )
+        else:
+            files.add(path)
+    return sorted(files)
+
+
+def load_policy_file(path):
+    """Parse a policy file into single-policy documents keyed on policy name.
+
+    Args:
+        path: Policy file in JSON or YAML
+
+    Returns:
+        dict: Policy name to a canonical {"policies": [policy]} document
+
+    Raises:
+        ValidationError: If the file cannot be parsed or has duplicate names
+    """
+    with open(path) as fh:
+        policies_dict = canonicalize_policies(validate_format({"policies": fh.read()}, "policies"))
+
+    documents = {}
+    for policy in policies_dict.get("policies", []):
+        if not isinstance(policy, dict) or "name" not in policy:
+            raise ValidationError(f"{path}: every policy must have a name")
+        if policy["name"] in documents:
+            raise ValidationError(f"{path}: multiple policies with name '{policy['name']}'")
+        documents[policy["name"]] = {"policies": [policy]}
+    return documents
+
+
+def output_document(document):
+    """Return the part of a policy the event pattern and config rule depend on.
+
+    Args:
+        document: Single-policy document
+
+    Returns:
+        dict: Single-policy document with only the name, resource, mode and description
+    """
+    policy = document["policies"][0]
+    keys = ("name", "resource", "mode", "description")
+    return {"policies": [{k: policy[k] for k in keys if k in policy}]}
+
+
+def stage_inputs(document):
+    """Return the input digest of each stage that applies to a policy.
+
+    Validation and packaging depend on the whole policy, the event pattern and
+    config rule parameters only on output_document.
+    """
+    mode = document["policies"][0].get("mode", {})
+    mode_type = mode.get("type") if isinstance(mode, dict) else None
+    narrow = short_digest(output_document(document))
+
+    inputs = {"validate": short_digest(document), "package": short_digest(document)}
+    if mode_type in get_cloudwatch_event_pattern.ALLOWED_TYPES:
+        inputs["event_pattern"] = narrow
+    if mode_type in get_config_rule_params.ALLOWED_TYPES:
+        inputs["config_rule"] = narrow
+    return inputs
+
+
+def function_name(document):
+    """Return the function name Terraform derives for a single-policy document."""
+    policy = document["policies"][0]
+    prefix = policy.get("mode", {}).get("function-prefix", DEFAULT_FUNCTION_PREFIX)
+    return f"{prefix}{policy['name']}"
+
+
+def policy_query(document, base_query):
+    """Build the query Terraform passes to the stage scripts for a policy.
+
+    Args:
+        document: Single-policy document
+        base_query: Query parameters shared by every policy, such as role
+
+    Returns:
+        dict: Query for the stage scripts
+    """
+    return dict(base_query, policies=json.dumps(document), function_name=function_name(document))
+
+
+def run_validate(query, exec_options=None, prune_options=None):
+    """Validate a policy, raising ValidationError with the messages if it is invalid."""
+    return validate_lambda_policy.run(query)["valid"]
+
+
+def run_package(query, exec_options=None, prune_options=None):
+    """Package a policy, returning the package_archive result."""
+    policy_list, _, packages, validated_policy = package_lambda_policy.process_policies(
+        query, resolve_regions=False
+    )
+    return package_lambda_policy.package_archive(
+        query, policy_list, exec_options, packages, prune_options, validated_policy
+    )
+
+
+def run_event_pattern(query, exec_options=None, prune_options=None):
+    """Render the event pattern of a policy."""
+    return get_cloudwatch_event_pattern.process_policies(query)["event_pattern"]
+
+
+def run_config_rule(query, exec_options=None, prune_options=None):
+    """Render the config rule parameters of a policy."""
+    return get_config_rule_params.process_policies(query)
+
+
+STAGE_RUNNERS = {
+    "validate": run_validate,
+    "package": run_package,
+    "event_pattern": run_event_pattern,
+    "config_rule": run_config_rule,
+}
+
+
+class PolicyWatcher:
+    """Re-run the stages affected by changes to policy files and template folders.
+
+    Args:
+        paths: Policy files or directories of policy files
+        template_folders: Mailer template folders to validate
+        role: Lambda execution role ARN written to the packaged config
+        execution_options: Dict of execution-options
+        package_pruning: Optional pruning options, see ops/prune.py
+        stages: Stages to run, default all of validate, package, event_pattern, config_rule
+
+    Raises:
+        ValidationError: If a stage is not one of STAGE_RUNNERS
+    """
+
+    STAGES = tuple(STAGE_RUNNERS)
+
+    def __init__(
+        self,
+        paths,
+        template_folders=None,
+        role="",
+        execution_options=None,
+        package_pruning=None,
+        stages=None,
+    ):
+        self.paths = paths
+        self.template_folders = sorted(template_folders or [])
+        unknown = sorted(set(stages or ()) - set(self.STAGES))
+        if unknown:
+            raise ValidationError(
+                f"Unknown stages: {', '.join(unknown)}. "
+                f"Valid stages are: {', '.join(self.STAGES)}"
+            )
+        self.stages = tuple(stages or self.STAGES)
+        self.base_query = {
+            "role": role,
+            "execution_options": json.dumps(execution_options or {}),
+            "package_pruning": json.dumps(package_pruning),
+        }
+        self.exec_options = package_lambda_policy.process_exec_options(self.base_query)
+        self.prune_options = parse_prune_options(self.base_query)
+        self.file_states = {}
+        # Policy name to {"file", "inputs", "outputs"}, outputs are stage output digests
+        self.policies = {}
+        self.template_state = None
+        self.template_index = None
+        self.template_digest = None
+
+    def query(self, document):
+        """Build the query Terraform passes to the stage scripts for a policy."""
+        return policy_query(document, self.base_query)
+
+    def run_stages(self, name, document, previous):
+        """Run the stages whose inputs changed since the previous run of a policy.
+
+        Args:
+            name: Policy name
+            document: Single-policy document
+            previous: State of the previous run, or None
+
+        Returns:
+            tuple: (new state, per-stage report)
+        """
+        query = self.query(document)
+        inputs = {k: v for k, v in stage_inputs(document).items() if k in self.stages}
+        old_inputs = previous["inputs"] if previous else {}
+        old_outputs = previous["outputs"] if previous else {}
+        outputs = {}
+        report = {}
+
+        for stage in self.STAGES:
+            if stage not in inputs:
+                continue
+            if inputs[stage] == old_inputs.get(stage) and stage in old_outputs:
+                outputs[stage] = old_outputs[stage]
+                continue
+            # Later stages would fail the same way on an invalid policy
+            if report.get("validate", {}).get("error"):
+                break
+
+            start = time.perf_counter()
+            entry = {}
+            try:
+                output = STAGE_RUNNERS[stage](query, self.exec_options, self.prune_options)
+                if stage == "package":
+                    outputs[stage] = output["sha256_hex"][:12]
+                else:
+                    outputs[stage] = short_digest(output)
+            except (ValidationError, RuntimeError) as e:
+                entry["error"] = str(e)
+                inputs.pop(stage)
+            entry["seconds"] = round(time.perf_counter() - start, 4)
+            entry["old"] = old_outputs.get(stage)
+            entry["new"] = outputs.get(stage)
+            report[stage] = entry
+
+        return {"inputs": inputs, "outputs": outputs}, report
+
+    def check_policies(self):
+        """Re-run stages for policies in changed files.
+
+        Returns:
+            dict: Policy name (or file path for file errors) to stage report
+        """
+        reports = {}
+        files = expand_policy_paths(self.paths)
+        changed = [f for f in files if file_state(f) != self.file_states.get(f)]
+        removed = [f for f in self.file_states if f not in files]
+        for path in removed:
+            del self.file_states[path]
+
+        for path in changed + removed:
+            self.file_states[path] = file_state(path)
+            try:
+                documents = load_policy_file(path) if path in files else {}
+            except (OSError, ValidationError) as e:
+                reports[path] = {"load": {"error": str(e)}}
+                continue
+
+            for name in [n for n, s in self.policies.items() if s["file"] == path]:
+                if name not in documents:
+                    del self.policies[name]
+                    reports[name] = {"removed": {}}
+
+            for name, document in documents.items():
+                previous = self.policies.get(name)
+                if previous and previous["file"] != path:
+                    reports[name] = {
+                        "load": {"error": f"{path}: '{name}' is also defined in {previous['file']}"}
+                    }
+                    continue
+                state, report = self.run_stages(name, document, previous)
+                self.policies[name] = dict(state, file=path)
+                if report:
+                    reports[name] = report
+        return reports
+
+    def check_templates(self):
+        """Validate the template folders if any template changed.
+
+        Returns:
+            dict: Stage report under "templates", empty if nothing changed
+        """
+        if not self.template_folders:
+            return {}
+        from ops.mailer_templates import TemplateIndex, template_digest, validate_templates
+
+        if self.template_index is None:
+            self.template_index = TemplateIndex()
+        state = {
+            os.path.join(d, f): file_state(os.path.join(d, f))
+            for d in self.template_folders
+            if os.path.isdir(d)
+            for f in os.listdir(d)
+        }
+        if state == self.template_state:
+            return {}
+        self.template_state = state
+
+        start = time.perf_counter()
+        old = self.template_digest
+        entry = {}
+        try:
+            validate_templates(self.template_folders, self.template_index)
+            scanned = self.template_index.scan(self.template_folders)
+            self.template_digest = template_digest(scanned)[:12]
+        except ValidationError as e:
+            entry["error"] = str(e)
+            self.template_digest = None
+        entry.update(
+            seconds=round(time.perf_counter() - start, 4), old=old, new=self.template_digest
+        )
+        return {"templates": {"validate": entry}}
+
+    def check(self):
+        """Run one pass over every watched path.
+
+        Returns:
+            dict: Reports for the policies and templates that changed
+        """
+        reports = self.check_policies()
+        reports.update(self.check_templates())
+        return reports
+
+
+def format_report(reports):
+    """Format the reports of one pass as lines of per-stage timings and digests."""
+    lines = []
+    for name in sorted(reports):
+        parts = []
+        for stage, entry in reports[name].items():
+            if stage == "removed":
+                parts.append("removed")
+            elif "error" in entry:
+                parts.append(f"{stage} FAILED: {entry['error']}")
+            elif entry["old"] == entry["new"]:
+                parts.append(f"{stage} {entry['seconds']:.3f}s unchanged {entry['new']}")
+            else:
+                parts.append(
+                    f"{stage} {entry['seconds']:.3f}s {entry['old'] or '-'} -> {entry['new']}"
+                )
+        lines.append(f"{name}: " + " | ".join(parts))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-run policy stages when policy files or mailer templates change"
+    )
+    parser.add_argument("paths", nargs="+", help="Policy files or directories")
+    parser.add_argument(
+        "--templates", action="append", default=[], help="Mailer template folder to validate"
+    )
+    parser.add_argument("--role", default="", help="Lambda execution role ARN")
+    parser.add_argument("--execution-options", default="{}", help="Execution options as JSON")
+    parser.add_argument("--package-pruning", default="null", help="Package pruning options as JSON")
+    parser.add_argument(
+        "--stages",
+        default=",".join(PolicyWatcher.STAGES),
+        help="Comma separated stages to run",
+    )
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between checks")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    args = parser.parse_args()
+
+    try:
+        watcher = PolicyWatcher(
+            args.paths,
+            template_folders=args.templates,
+            role=args.role,
+            execution_options=json.loads(args.execution_options),
+            package_pruning=json.loads(args.package_pruning),
+            stages=[s.strip() for s in args.stages.split(",") if s.strip()],
+        )
+    except (ValueError, ValidationError) as e:
+        print(f"Invalid options: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        while True:
+            start = time.perf_counter()
+            reports = watcher.check()
+            if reports:
+                for line in format_report(reports):
+                    print(line, flush=True)
+                print(f"-- {time.perf_counter() - start:.3f}s", flush=True)
+            if args.once:
+                failed = any("error" in e for r in reports.values() for e in r.values())
+                sys.exit(1 if failed else 0)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
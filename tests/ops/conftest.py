@@ -0,0 +1,13 @@
+"""
+Shared pytest fixtures for ops tests.
+"""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def build_root(tmp_path, monkeypatch):
+    """Run each test from its own directory, so archives, caches and indexes
+    written under ./build never touch the repository's build directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "build"
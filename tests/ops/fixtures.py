@@ -5,6 +5,8 @@ This module provides common test data for policies, mailer configs, and queries
 to reduce repetition across test files.
 """
 
+import os
+
 try:
     import yaml
     from yaml import CSafeLoader as SafeLoader
@@ -225,6 +227,40 @@ EXEC_OPTIONS = {
     "log_group": "/cloud-custodian/policies",
 }
 
+ROLE = "arn:aws:iam::123456789012:role/custodian"
+
+EDITABLE_POLICIES_YAML = """
+vars:
+  state: &state {state}
+policies:
+  - name: periodic-policy
+    resource: ec2
+    mode:
+      type: periodic
+      schedule: rate(1 day)
+    filters:
+      - instance-state-name: *state
+  - name: event-policy
+    resource: ec2
+    mode:
+      type: cloudtrail
+      events:
+        - source: ec2.amazonaws.com
+          event: {event}
+          ids: responseElements.instancesSet.items[].instanceId
+    filters:
+      - instance-state-name: {event_state}
+"""
+
+
+def write_editable_policies(path, state="running", event="RunInstances", event_state="running"):
+    """Write EDITABLE_POLICIES_YAML to a file, filling in the editable values."""
+    with open(path, "w") as fh:
+        fh.write(EDITABLE_POLICIES_YAML.format(state=state, event=event, event_state=event_state))
+    # Make the change visible even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
 
 def valid_mailer_config():
     """Return a fresh valid mailer config dict (to avoid mutation issues)."""
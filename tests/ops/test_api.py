@@ -0,0 +1,102 @@
+"""
+Unit tests for api.py.
+"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from ops import api
+from ops.common import ValidationError
+from tests.ops.fixtures import (
+    CLOUDWATCH_EVENT_PATTERN,
+    CLOUDWATCH_EVENT_POLICIES_DICT,
+    CONFIG_RULE_EXPECTED_KEYS,
+    CONFIG_RULE_POLICIES_YAML,
+    EXEC_OPTIONS,
+    INVALID_MODE_POLICIES_YAML,
+    SIMPLE_PERIODIC_POLICIES_YAML,
+    valid_mailer_config,
+)
+
+
+def test_normalize_query():
+    """Test query values are encoded as Terraform passes them."""
+    query = api.normalize_query(
+        {"policies": {"policies": []}, "force_deploy": True, "count": 2, "role": None, "s": "x"}
+    )
+
+    assert query == {
+        "policies": '{"policies": []}',
+        "force_deploy": "true",
+        "count": "2",
+        "role": "",
+        "s": "x",
+    }
+
+
+def test_validate_policy():
+    """Test validation returns the result and raises on invalid policies."""
+    result = api.validate_policy({"policies": SIMPLE_PERIODIC_POLICIES_YAML})
+    assert result["valid"] == "true"
+
+    with pytest.raises(ValidationError, match="Policy validation failed"):
+        api.validate_policy({"policies": INVALID_MODE_POLICIES_YAML})
+
+    assert api.check_policy({"policies": INVALID_MODE_POLICIES_YAML})["valid"] == "false"
+
+
+def test_event_pattern_and_config_rule_params():
+    """Test outputs are rendered from dict input."""
+    result = api.event_pattern({"policies": CLOUDWATCH_EVENT_POLICIES_DICT})
+    assert json.loads(result["event_pattern"]) == CLOUDWATCH_EVENT_PATTERN
+
+    params = api.config_rule_params({"policies": CONFIG_RULE_POLICIES_YAML})
+    assert CONFIG_RULE_EXPECTED_KEYS.issubset(params)
+
+
+def test_package_policy_errors_do_not_exit():
+    """Test packaging errors are raised with the messages the scripts print."""
+    with pytest.raises(ValidationError, match="Missing required fields: execution_options"):
+        api.package_policy(
+            {"policies": SIMPLE_PERIODIC_POLICIES_YAML, "function_name": "f", "role": "r"}
+        )
+
+    query = {
+        "policies": SIMPLE_PERIODIC_POLICIES_YAML,
+        "execution_options": EXEC_OPTIONS,
+        "function_name": "test-function",
+        "role": "arn:aws:iam::123456789012:role/test-role",
+    }
+    with patch("ops.package_lambda_policy.get_policy_regions", return_value=set()):
+        with patch(
+            "ops.package_lambda_policy.package_archive", side_effect=RuntimeError("disk full")
+        ):
+            with pytest.raises(RuntimeError, match="Failed to package lambda: disk full"):
+                api.package_policy(query)
+
+
+def test_validate_mailer():
+    """Test mailer validation from a dict config."""
+    result = api.validate_mailer({"mailer": valid_mailer_config()})
+    assert json.loads(result["mailer_config"])["queue_url"] == valid_mailer_config()["queue_url"]
+
+    with pytest.raises(ValidationError, match="Missing required fields"):
+        api.package_mailer({"mailer_config": valid_mailer_config()})
+
+
+def test_run_many():
+    """Test many queries are processed in order with errors captured."""
+    queries = [
+        {"policies": SIMPLE_PERIODIC_POLICIES_YAML},
+        {"policies": INVALID_MODE_POLICIES_YAML},
+    ] * 5
+
+    results = api.run_many(api.validate_policy, queries, workers=4)
+
+    assert len(results) == 10
+    assert results[0]["result"]["valid"] == "true"
+    assert results[1]["error_type"] == "ValidationError"
+    assert "Policy validation failed" in results[1]["error"]
+    assert all("result" in r for r in results[::2])
@@ -0,0 +1,124 @@
+"""
+Unit tests for archive_size.py.
+"""
+
+import json
+import os
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+from ops.archive_size import (
+    MB,
+    check_size_budget,
+    estimate_archive_size,
+    parse_size_budget,
+    scanned_files,
+)
+from ops.common import ValidationError
+from ops.package_lambda_policy import create_custodian_archive, process_policies
+from ops.prune import PackagePruner
+from tests.ops.fixtures import DETAILED_POLICIES_YAML
+
+
+def test_parse_size_budget():
+    """Test Lambda's limits are the default budget."""
+    assert parse_size_budget({}) == {"compressed_mb": 50, "uncompressed_mb": 250}
+    assert parse_size_budget({"archive_size_budget": "null"})["compressed_mb"] == 50
+    assert parse_size_budget({"archive_size_budget": json.dumps({"compressed_mb": 10})}) == {
+        "compressed_mb": 10,
+        "uncompressed_mb": 250,
+    }
+    assert parse_size_budget({"archive_size_budget": json.dumps({"enabled": False})}) is None
+
+    with pytest.raises(ValidationError, match="Could not parse"):
+        parse_size_budget({"archive_size_budget": "{"})
+    with pytest.raises(ValidationError, match="must be a positive number"):
+        parse_size_budget({"archive_size_budget": json.dumps({"uncompressed_mb": 0})})
+
+
+def test_estimate_matches_build():
+    """Test the estimate is close to the archive built for the same packages."""
+    estimate = estimate_archive_size(["c7n", "requests"])
+
+    archive = create_custodian_archive(packages=["requests"])
+    archive.close()
+    try:
+        with zipfile.ZipFile(archive.path) as zf:
+            uncompressed = sum(i.file_size for i in zf.infolist())
+        compressed = os.path.getsize(archive.path)
+    finally:
+        archive.remove()
+
+    assert set(estimate["packages"]) == {"c7n", "requests"}
+    assert estimate["uncompressed"] == uncompressed
+    assert compressed * 0.9 < estimate["compressed"] < compressed * 1.2
+
+
+def test_estimate_applies_pruner():
+    """Test files the pruner drops are not counted, unless on a dry run."""
+    full = estimate_archive_size(["c7n"])
+    pruner = PackagePruner({"rules": ["c7n/resources/*.py"]})
+    pruned = estimate_archive_size(["c7n"], pruner)
+    assert pruned["files"] < full["files"]
+    assert estimate_archive_size(["c7n"], PackagePruner({"rules": ["*"], "dry_run": True})) == full
+
+
+def test_estimate_keeps_package_dirs_like_the_build():
+    """Test the estimate applies the pruner's package rule, as the build does."""
+    packages = ["botocore", "boto3"]
+    pruner = PackagePruner({"strip_debug": False})
+    estimate = estimate_archive_size(packages, pruner)
+
+    archive = create_custodian_archive(packages, pruner=PackagePruner({"strip_debug": False}))
+    archive.close()
+    try:
+        filenames = [f for f in archive.get_filenames() if f.split("/")[0] in packages]
+    finally:
+        archive.remove()
+
+    assert "botocore/docs/docstring.py" in filenames
+    assert estimate["files"] == len(filenames)
+
+
+def test_scanned_files_fallback():
+    """Test packages without a RECORD are scanned, missing ones are reported."""
+    with patch("importlib.metadata.packages_distributions", return_value={}):
+        estimate = estimate_archive_size(["c7n"])
+    assert estimate["files"] == estimate_archive_size(["c7n"])["files"]
+
+    with pytest.raises(ValidationError, match="'not_a_package' is not installed"):
+        scanned_files("not_a_package")
+
+
+def test_budget_exceeded():
+    """Test an exceeded budget fails with the size of each package."""
+    estimate = {
+        "compressed": 60 * MB,
+        "uncompressed": 100 * MB,
+        "packages": {
+            "c7n": {"files": 10, "uncompressed": 3 * MB, "compressed": 1 * MB},
+            "big": {"files": 5, "uncompressed": 97 * MB, "compressed": 59 * MB},
+        },
+    }
+    with pytest.raises(ValidationError) as e:
+        check_size_budget(estimate, {"compressed_mb": 50, "uncompressed_mb": 250})
+    assert str(e.value) == (
+        "Estimated archive size 60.0 MB compressed exceeds the budget of 50 MB: "
+        "big: 59.0 MB compressed, 97.0 MB uncompressed (5 files); "
+        "c7n: 1.0 MB compressed, 3.0 MB uncompressed (10 files)"
+    )
+    check_size_budget(estimate, {"compressed_mb": 60, "uncompressed_mb": 250})
+
+
+def test_process_policies_checks_budget():
+    """Test process_policies fails before packaging when over budget."""
+    query = {
+        "policies": DETAILED_POLICIES_YAML,
+        "role": "test-role",
+        "archive_size_budget": json.dumps({"compressed_mb": 0.5}),
+    }
+    with patch("ops.package_lambda_policy.get_regions", return_value=["us-east-1"]):
+        with pytest.raises(ValidationError, match="exceeds the budget of 0.5 MB: .*requests:"):
+            process_policies(query)
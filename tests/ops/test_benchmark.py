@@ -0,0 +1,116 @@
+"""
+Unit tests for benchmark.py.
+"""
+
+import copy
+import json
+import zipfile
+
+import pytest
+
+from ops.benchmark import (
+    INVOKE_MARKER,
+    benchmark_archive,
+    parse_import_times,
+    synthetic_event,
+)
+from ops.common import ValidationError
+from ops.watch import policy_query, run_package
+from tests.ops.fixtures import (
+    CLOUDWATCH_EVENT_POLICY_DICT,
+    CONFIG_RULE_POLICY_DICT,
+    EXEC_OPTIONS,
+    SIMPLE_PERIODIC_POLICIES_DICT,
+    SIMPLE_PERIODIC_POLICY_DICT,
+)
+
+
+def test_synthetic_event_by_mode():
+    """Test events match the kind that triggers each mode."""
+    scheduled = synthetic_event(SIMPLE_PERIODIC_POLICY_DICT)
+    assert scheduled["detail-type"] == "Scheduled Event"
+
+    trail = synthetic_event(CLOUDWATCH_EVENT_POLICY_DICT, region="eu-west-1")
+    assert trail["source"] == "aws.ec2"
+    assert trail["detail"]["eventName"] == "RunInstances"
+    assert trail["detail"]["awsRegion"] == "eu-west-1"
+
+    shortcut = synthetic_event({"mode": {"type": "cloudtrail", "events": ["RunInstances"]}})
+    assert shortcut["detail"]["eventSource"] == "ec2.amazonaws.com"
+
+    config = synthetic_event(CONFIG_RULE_POLICY_DICT)
+    assert json.loads(config["invokingEvent"])["messageType"] == "ScheduledNotification"
+
+
+def test_parse_import_times():
+    """Test import self times are summed per package and split by phase."""
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:      1500 |       2000 | c7n",
+            "import time:       500 |        500 |   c7n.utils",
+            "import time:       300 |        300 | botocore",
+            "some log line",
+            INVOKE_MARKER,
+            "import time:       700 |        700 | c7n.resources.ec2",
+        ]
+    )
+
+    assert parse_import_times(stderr) == {
+        "init": {"c7n": 2.0, "botocore": 0.3},
+        "invoke": {"c7n": 0.7},
+    }
+
+
+def test_benchmark_archive_not_a_policy_archive(tmp_path):
+    """Test archives without config.json raise ValidationError."""
+    path = tmp_path / "empty.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("other.txt", "x")
+
+    with pytest.raises(ValidationError, match="Not a policy archive"):
+        benchmark_archive(str(path))
+
+
+def test_benchmark_archive(tmp_path, monkeypatch):
+    """Test a built archive starts and invokes against stubbed AWS."""
+    monkeypatch.chdir(tmp_path)
+    query = policy_query(
+        SIMPLE_PERIODIC_POLICIES_DICT,
+        {"role": "arn:aws:iam::123456789012:role/custodian", "execution_options": "{}"},
+    )
+    result = run_package(query, EXEC_OPTIONS)
+
+    report = benchmark_archive(result["zip_path"], runs=1)
+
+    assert report["errors"] == []
+    assert report["sha256_hex"] == result["sha256_hex"]
+    assert report["mode"] == "periodic"
+    assert report["init_seconds"] > 0
+    assert report["first_invoke_seconds"] > 0
+    assert 0 < report["peak_rss_mb"] < report["memory_mb"]
+    assert "ec2.DescribeInstances" in report["api_calls"]
+    assert "c7n" in report["imports_ms"]["init"]
+
+
+def test_benchmark_service_pruned_archive(tmp_path, monkeypatch):
+    """Test an archive bundling botocore pruned to the policy's services still runs."""
+    monkeypatch.chdir(tmp_path)
+    document = copy.deepcopy(SIMPLE_PERIODIC_POLICIES_DICT)
+    document["policies"][0]["mode"]["packages"] = ["botocore", "boto3"]
+    query = policy_query(
+        document,
+        {"role": "arn:aws:iam::123456789012:role/custodian", "execution_options": "{}"},
+    )
+    result = run_package(query, EXEC_OPTIONS, {})
+
+    with zipfile.ZipFile(result["zip_path"]) as archive:
+        filenames = archive.namelist()
+    assert [f for f in filenames if f.startswith("botocore/data/ec2/")]
+    assert not [f for f in filenames if f.startswith("botocore/data/dynamodb/")]
+
+    report = benchmark_archive(result["zip_path"], runs=1)
+
+    assert report["errors"] == []
+    assert "ec2.DescribeInstances" in report["api_calls"]
+    assert "botocore" in report["imports_ms"]["init"]
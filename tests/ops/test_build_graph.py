@@ -0,0 +1,156 @@
+"""
+Unit tests for build_graph.py.
+"""
+
+import os
+
+import pytest
+
+from ops.build_graph import BuildGraph, PolicyBuildGraph
+from ops.common import ValidationError
+from tests.ops.fixtures import EXEC_OPTIONS, ROLE, write_editable_policies
+
+
+def counting_graph(calls, state_path=None, source_value=1):
+    """Create a graph a -> b -> c that counts calls per node."""
+
+    def node(name, func):
+        def wrapped(*args):
+            calls[name] = calls.get(name, 0) + 1
+            return func(*args)
+
+        return wrapped
+
+    graph = BuildGraph(state_path)
+    graph.add("a", node("a", lambda: source_value), source=True)
+    graph.add("b", node("b", lambda a: a % 2), deps=["a"])
+    graph.add("c", node("c", lambda b: b + 10), deps=["b"])
+    return graph
+
+
+def test_order_and_cycles():
+    """Test nodes are ordered by dependency and cycles are rejected."""
+    graph = counting_graph({})
+    assert graph.order() == ["a", "b", "c"]
+
+    graph.add("d", lambda e: e, deps=["e"])
+    graph.add("e", lambda d: d, deps=["d"])
+    with pytest.raises(ValidationError, match="cycle"):
+        graph.order()
+
+    graph = BuildGraph()
+    graph.add("x", lambda y: y, deps=["y"])
+    with pytest.raises(ValidationError, match="unknown"):
+        graph.order()
+
+
+def test_up_to_date_and_early_cutoff(tmp_path):
+    """Test recorded nodes are reused and unchanged values stop a rebuild."""
+    state_path = str(tmp_path / "graph.json")
+    calls = {}
+
+    results = counting_graph(calls, state_path).run(workers=2)
+    assert results["c"] == dict(results["c"], status="built", value=11)
+
+    results = counting_graph(calls, state_path).run(workers=2)
+    assert results["c"]["status"] == "up_to_date"
+    assert calls == {"a": 2, "b": 1, "c": 1}
+
+    # 3 % 2 == 1 % 2, so b is rebuilt with the same value and c is not
+    results = counting_graph(calls, state_path, source_value=3).run()
+    assert results["b"]["status"] == "built"
+    assert results["c"]["status"] == "up_to_date"
+
+    results = counting_graph(calls, state_path, source_value=2).run(dry_run=True)
+    assert results["b"]["status"] == "stale"
+    assert results["c"]["status"] == "stale"
+    assert calls["c"] == 1
+
+
+def test_failures_skip_dependents():
+    """Test a failed node skips its dependents and is not recorded."""
+    graph = BuildGraph()
+
+    def fail():
+        raise ValidationError("bad input")
+
+    graph.add("a", fail)
+    graph.add("b", lambda a: a, deps=["a"])
+    results = graph.run()
+
+    assert results["a"] == {"status": "failed", "digest": None, "error": "bad input"}
+    assert results["b"]["status"] == "skipped"
+    assert graph.state == {}
+
+
+def test_check_rebuilds_missing_outputs():
+    """Test a recorded value rejected by check is rebuilt."""
+    calls = []
+    graph = BuildGraph()
+    graph.add("a", lambda: calls.append(1) or "value", check=lambda value: len(calls) > 1)
+
+    graph.run()
+    assert graph.run()["a"]["status"] == "built"
+    assert graph.run()["a"]["status"] == "up_to_date"
+
+
+@pytest.fixture
+def policy_dir():
+    os.makedirs("policies")
+    write_editable_policies(os.path.join("policies", "ec2.yml"))
+    return "policies"
+
+
+def test_policy_graph_rebuilds_affected_policies(policy_dir):
+    """Test a vars edit rebuilds only the policies whose document changed."""
+    planner = PolicyBuildGraph([policy_dir], role=ROLE, execution_options=EXEC_OPTIONS)
+
+    first = planner.run(workers=2)
+    assert first["failed"] == {}
+    assert set(first["rebuilt"]) == {
+        "validate:periodic-policy",
+        "validate:event-policy",
+        "archive:periodic-policy",
+        "archive:event-policy",
+        "event_pattern:event-policy",
+        "packages:",
+    }
+    assert planner.run()["rebuilt"] == {}
+
+    write_editable_policies(os.path.join(policy_dir, "ec2.yml"), state="stopped")
+    assert planner.run(dry_run=True)["stale"] == [
+        "archive:periodic-policy",
+        "validate:periodic-policy",
+    ]
+    assert set(planner.run()["rebuilt"]) == {"validate:periodic-policy", "archive:periodic-policy"}
+
+
+def test_policy_graph_filter_edit_keeps_event_pattern(policy_dir):
+    """Test a filter edit rebuilds the archive but not the event pattern."""
+    planner = PolicyBuildGraph([policy_dir], role=ROLE, execution_options=EXEC_OPTIONS)
+    planner.run()
+
+    write_editable_policies(os.path.join(policy_dir, "ec2.yml"), event_state="stopped")
+    summary = planner.run()
+
+    assert set(summary["rebuilt"]) == {"validate:event-policy", "archive:event-policy"}
+
+
+def test_policy_graph_changed_files(policy_dir):
+    """Test only policies from the changed files are planned."""
+    with open(os.path.join(policy_dir, "other.yml"), "w") as fh:
+        fh.write("policies:\n  - name: other\n    resource: s3\n    mode:\n      type: periodic\n")
+        fh.write("      schedule: rate(1 day)\n")
+    planner = PolicyBuildGraph([policy_dir], role=ROLE)
+
+    summary = planner.run(changed=[os.path.join(policy_dir, "other.yml")], dry_run=True)
+
+    assert summary["stale"] == ["archive:other", "packages:", "validate:other"]
+
+
+def test_policy_graph_duplicate_names(policy_dir):
+    """Test a policy name defined in two files raises ValidationError."""
+    write_editable_policies(os.path.join(policy_dir, "copy.yml"))
+
+    with pytest.raises(ValidationError, match="defined in both"):
+        PolicyBuildGraph([policy_dir], role=ROLE).run(dry_run=True)
@@ -0,0 +1,195 @@
+"""
+Unit tests for build_store.py.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from ops.build_store import LEASE_FILE, BuildStore
+
+
+def write_file(path, content):
+    with open(path, "w") as fh:
+        fh.write(content)
+    return path
+
+
+def set_lease(store, key, name, when):
+    leases = store.leases(key)
+    leases[name] = when
+    write_file(os.path.join(store.directory(key), LEASE_FILE), json.dumps(leases))
+
+
+def test_publish_keeps_leased_archives():
+    """Test publishing keeps other archives until their lease expires."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(os.path.join(temp_dir, "build"))
+        src = write_file(os.path.join(temp_dir, "src.zip"), "one")
+
+        first = store.publish(src, "func", "one.zip")
+        second = store.publish(write_file(src, "two"), "func", "two.zip")
+
+        assert os.path.exists(first)
+        with open(second) as fh:
+            assert fh.read() == "two"
+
+        set_lease(store, "func", "one.zip", time.time() - store.lease_seconds - 1)
+        assert store.retain("func", "two.zip")
+        store.publish(src, "func", "two.zip")
+
+        assert not os.path.exists(first)
+        assert not store.retain("func", "one.zip")
+        assert sorted(os.listdir(store.directory("func"))) == [LEASE_FILE, "two.zip"]
+        assert list(store.leases("func")) == ["two.zip"]
+
+
+def test_leases_are_per_key():
+    """Test renewing one key's link to a shared blob does not renew another key's."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(os.path.join(temp_dir, "build"))
+        src = write_file(os.path.join(temp_dir, "src.zip"), "shared")
+        for key in ("func-a", "func-b"):
+            store.publish(src, key, "shared.zip")
+            store.publish(write_file(src, key), key, f"{key}.zip")
+
+        expired = time.time() - store.lease_seconds - 1
+        for key in ("func-a", "func-b"):
+            set_lease(store, key, "shared.zip", expired)
+        assert store.retain("func-a", "shared.zip")
+        store.publish(src, "func-a", "func-a.zip")
+        store.publish(src, "func-b", "func-b.zip")
+
+        assert os.path.exists(os.path.join(store.directory("func-a"), "shared.zip"))
+        assert not os.path.exists(os.path.join(store.directory("func-b"), "shared.zip"))
+        assert store.leases("func-b")["func-b.zip"] > expired
+        assert store.references()["shared.zip"] == ["func-a"]
+
+
+def test_publish_concurrent():
+    """Test concurrent publishes of different archives never remove each other."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(os.path.join(temp_dir, "build"))
+        sources = [write_file(os.path.join(temp_dir, f"{i}.src"), str(i) * 1000) for i in range(8)]
+        published = []
+
+        def publish(i):
+            published.append(store.publish(sources[i], "func", f"{i}.zip"))
+
+        threads = [threading.Thread(target=publish, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(published) == 8
+        for path in published:
+            name = os.path.basename(path)
+            with open(path) as fh:
+                assert fh.read() == name[0] * 1000
+        assert not [f for f in os.listdir(store.directory("func")) if f.endswith(".tmp")]
+
+
+def test_write_json():
+    """Test JSON documents are written atomically under the key."""
+    import json
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(temp_dir)
+        store.write_json("func", "manifest.json", {"b": 1, "a": 2})
+
+        with open(os.path.join(temp_dir, "func", "manifest.json")) as fh:
+            assert json.load(fh) == {"a": 2, "b": 1}
+
+
+def test_publish_deduplicates():
+    """Test identical archives under different keys share one blob."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(os.path.join(temp_dir, "build"))
+        src = write_file(os.path.join(temp_dir, "src.zip"), "same")
+
+        first = store.publish(src, "func-a", "abc.zip")
+        second = store.publish(src, "func-b", "abc.zip")
+
+        assert os.path.samefile(first, second)
+        assert os.path.samefile(first, store.blob_path("abc.zip"))
+        assert store.references() == {"abc.zip": ["func-a", "func-b"]}
+        assert len(store.blobs()) == 1
+
+
+def test_gc_adopts_and_evicts():
+    """Test gc deduplicates old copies, drops orphans and fits the budget."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(os.path.join(temp_dir, "build"))
+        for key in ("func-a", "func-b"):
+            os.makedirs(store.directory(key))
+            write_file(os.path.join(store.directory(key), "old.zip"), "x" * 100)
+        src = write_file(os.path.join(temp_dir, "src.zip"), "y" * 50)
+        store.publish(src, "func-c", "new.zip")
+        store.publish(src, "func-c", "orphan.zip")
+        os.unlink(os.path.join(store.directory("func-c"), "orphan.zip"))
+
+        report = store.gc()
+        assert report["reclaimed_bytes"] == 150
+        assert report["blobs"] == 2
+        assert os.path.samefile(
+            os.path.join(store.directory("func-a"), "old.zip"),
+            os.path.join(store.directory("func-b"), "old.zip"),
+        )
+
+        expired = time.time() - store.lease_seconds - 1
+        for key in ("func-a", "func-b"):
+            set_lease(store, key, "old.zip", expired)
+        report = store.gc(max_bytes=60)
+
+        # old.zip is the newest artifact of func-a and func-b
+        assert report["evicted_blobs"] == 0
+        assert report["over_budget"]
+        assert store.retain("func-a", "old.zip")
+
+
+def test_gc_evicts_older_artifacts_over_budget():
+    """Test the budget evicts expired artifacts but never a key's newest one."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(os.path.join(temp_dir, "build"))
+        store.publish(write_file(os.path.join(temp_dir, "a.zip"), "a" * 100), "func", "old.zip")
+        store.publish(write_file(os.path.join(temp_dir, "b.zip"), "b" * 50), "func", "new.zip")
+        # Another key's recent use of a blob keeps it within its lease
+        store.publish(os.path.join(temp_dir, "b.zip"), "other", "new.zip")
+        old_path = os.path.join(store.directory("func"), "old.zip")
+        expired = time.time() - store.lease_seconds - 10
+        set_lease(store, "func", "old.zip", expired)
+        set_lease(store, "func", "new.zip", expired + 1)
+
+        report = store.gc(max_bytes=10)
+
+        assert report["evicted_blobs"] == 1
+        assert report["blob_bytes"] == 50
+        assert report["over_budget"]
+        assert not os.path.lexists(old_path)
+        assert os.path.exists(os.path.join(store.directory("func"), "new.zip"))
+
+
+def test_gc_keeps_leased_blobs_over_budget():
+    """Test blobs used within their lease are never evicted."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = BuildStore(os.path.join(temp_dir, "build"))
+        src = write_file(os.path.join(temp_dir, "src.zip"), "z" * 100)
+        store.publish(src, "func", "live.zip")
+
+        report = store.gc(max_bytes=10)
+
+        assert report["evicted_blobs"] == 0
+        assert report["over_budget"]
+
+
+def test_parse_size():
+    """Test byte counts with unit suffixes."""
+    from ops.build_store import parse_size
+
+    assert parse_size("1024") == 1024
+    assert parse_size("2K") == 2048
+    assert parse_size("1.5mb") == 1572864
+    assert parse_size("2G") == 2 * 1024**3
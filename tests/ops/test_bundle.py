@@ -0,0 +1,125 @@
+"""
+Unit tests for bundle.py.
+"""
+
+import importlib.util
+import json
+from unittest.mock import patch
+
+import pytest
+
+from ops.bundle import (
+    BUNDLE_HANDLER_TEMPLATE,
+    parse_bundle_concurrency,
+    plan_bundles,
+    select_policies,
+    validate_bundle,
+)
+from ops.common import ValidationError, canonical_json
+
+
+def periodic(name, resource="ec2", schedule="rate(1 day)", **mode):
+    return {
+        "name": name,
+        "resource": resource,
+        "mode": dict({"type": "periodic", "schedule": schedule}, **mode),
+    }
+
+
+def test_plan_bundles():
+    """Test policies are grouped by their mode without tags."""
+    policies = {
+        "policies": [
+            periodic("a", tags={"team": "x"}),
+            periodic("b", resource="s3"),
+            periodic("c", schedule="rate(1 hour)"),
+            periodic("d", schedule="rate(1 hour)", memory=1024),
+            periodic("e", schedule="rate(1 hour)"),
+            {"name": "f", "resource": "ec2", "mode": {"type": "cloudtrail", "events": []}},
+        ]
+    }
+
+    bundles = plan_bundles(policies)
+
+    assert sorted(bundles.values()) == [["a", "b"], ["c", "e"]]
+    assert all(name.startswith("periodic-") for name in bundles)
+    assert len(plan_bundles(policies, min_size=1)) == 3
+
+
+def test_select_policies():
+    """Test named policies are extracted in order with vars."""
+    policies = {"vars": {"x": 1}, "policies": [periodic("a"), periodic("b"), periodic("c")]}
+
+    selected = select_policies(policies, ["c", "a"])
+    assert [p["name"] for p in selected["policies"]] == ["c", "a"]
+    assert selected["vars"] == {"x": 1}
+
+    with pytest.raises(ValidationError, match="not found"):
+        select_policies(policies, ["a", "z"])
+    with pytest.raises(ValidationError, match="unique"):
+        select_policies(policies, ["a", "a"])
+    with pytest.raises(ValidationError, match="at least one"):
+        select_policies(policies, [])
+
+
+def test_validate_bundle():
+    """Test policies with different modes cannot share a function."""
+    validate_bundle([periodic("a", tags={"x": "1"}), periodic("b", tags={"x": "2"})])
+
+    with pytest.raises(ValidationError, match="'b' cannot share a function with 'a', mode memory"):
+        validate_bundle([periodic("a"), periodic("b", memory=1024)])
+
+    with pytest.raises(ValidationError, match="bundles support"):
+        validate_bundle([{"name": "a", "resource": "ec2", "mode": {"type": "cloudtrail"}}])
+
+
+def test_parse_bundle_concurrency():
+    """Test bundle concurrency defaults to 1 and is bounded."""
+    assert parse_bundle_concurrency({}) == 1
+    assert parse_bundle_concurrency({"bundle_concurrency": "4"}) == 4
+
+    for value in ("0", "33", "two"):
+        with pytest.raises(ValidationError, match="bundle_concurrency"):
+            parse_bundle_concurrency({"bundle_concurrency": value})
+
+
+class Context:
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:bundle"
+    function_name = "bundle"
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_bundle_handler_isolates_failures(tmp_path, monkeypatch, concurrency):
+    """Test every policy runs and is timed when one of them fails."""
+    config = {
+        "execution-options": {"account_id": "123456789012", "region": "us-east-1"},
+        "policies": [periodic("a"), periodic("b"), periodic("c", resource="s3")],
+        "bundle": {"concurrency": concurrency},
+    }
+    (tmp_path / "config.json").write_text(canonical_json(config))
+    (tmp_path / "custodian_policy.py").write_text(BUNDLE_HANDLER_TEMPLATE)
+    monkeypatch.chdir(tmp_path)
+    # As make test-python sets it, the region must not come from a boto profile
+    monkeypatch.setenv("AWS_PROFILE", "")
+    monkeypatch.delenv("AWS_DEFAULT_REGION", raising=False)
+    spec = importlib.util.spec_from_file_location("bundle_handler", "custodian_policy.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    def push(policy, event, context):
+        if policy.name == "b":
+            raise ValueError("boom")
+
+    with patch("c7n.policy.Policy.push", push):
+        with pytest.raises(RuntimeError, match="Bundled policies failed: b"):
+            module.run({}, Context())
+
+        monkeypatch.setattr("c7n.handler.C7N_CATCH_ERR", True)
+        result = module.run({}, Context())
+
+    assert module.policy_config.regions == ["us-east-1"]
+    assert [r["policy"] for r in result["policies"]] == ["a", "b", "c"]
+    assert [r["status"] for r in result["policies"]] == ["ok", "failed", "ok"]
+    assert result["policies"][1]["error"] == "ValueError: boom"
+    assert all(r["seconds"] >= 0 for r in result["policies"])
+    assert json.loads(json.dumps(result)) == result
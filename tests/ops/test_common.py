@@ -347,3 +347,30 @@ def test_get_force_deploy_tags_false():
 
     # Should return an empty dict
     assert result == {}
+
+
+def test_canonicalize_policies_json_and_yaml():
+    """Test JSON and YAML input with different key order canonicalize identically."""
+    import json
+    from ops.common import canonical_json, canonicalize_policies, parse_policies
+
+    policy_name = MULTIPLE_POLICIES_DICT["policies"][0]["name"]
+    from_yaml = parse_policies({"policies": MULTIPLE_POLICIES_YAML, "policy_name": policy_name})
+
+    policy = dict(reversed(list(from_yaml["policies"][0].items())))
+    from_json = parse_policies({"policies": json.dumps({"policies": [policy]})})
+
+    canonical = canonicalize_policies(from_yaml)
+    assert "vars" not in canonical
+    assert list(canonical["policies"][0]) == sorted(canonical["policies"][0])
+    assert canonical_json(canonical) == canonical_json(canonicalize_policies(from_json))
+
+
+def test_canonical_value_scalars():
+    """Test dates, tuples and non-string keys are normalized."""
+    import datetime
+    from ops.common import canonical_value
+
+    value = {"b": (1, 2), "a": datetime.date(2024, 1, 2), True: "x", 2: "y"}
+
+    assert canonical_value(value) == {"2": "y", "a": "2024-01-02", "b": [1, 2], "true": "x"}
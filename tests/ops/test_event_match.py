@@ -0,0 +1,154 @@
+"""
+Unit tests for event_match.py.
+"""
+
+import json
+
+import pytest
+
+from ops.common import ValidationError
+from ops.event_match import (
+    compile_pattern,
+    match_events,
+    policy_patterns,
+    read_events,
+    to_eventbridge_event,
+)
+
+EVENT = {
+    "source": "aws.ec2",
+    "detail-type": "AWS API Call via CloudTrail",
+    "detail": {
+        "eventSource": "ec2.amazonaws.com",
+        "eventName": "RunInstances",
+        "sourceIPAddress": "10.0.1.20",
+        "errorCode": None,
+        "count": 3,
+        "userIdentity": {"type": "AssumedRole", "arn": "arn:aws:sts::1:assumed-role/Admin/x"},
+        "items": [{"imageId": "ami-1", "state": "pending"}, {"imageId": "ami-2"}],
+        "tags": ["prod", "web"],
+    },
+}
+
+
+@pytest.mark.parametrize(
+    "detail, expected",
+    [
+        ({"eventName": ["RunInstances", "StartInstances"]}, True),
+        ({"eventName": ["StopInstances"]}, False),
+        ({"tags": ["web"]}, True),
+        ({"errorCode": [None]}, True),
+        ({"count": [3.0]}, True),
+        ({"eventName": [{"prefix": "Run"}]}, True),
+        ({"eventName": [{"prefix": {"equals-ignore-case": "run"}}]}, True),
+        ({"eventName": [{"suffix": "Instances"}]}, True),
+        ({"eventName": [{"equals-ignore-case": "runinstances"}]}, True),
+        ({"eventName": [{"anything-but": ["RunInstances"]}]}, False),
+        ({"eventName": [{"anything-but": {"prefix": "Describe"}}]}, True),
+        ({"missing": [{"anything-but": "x"}]}, False),
+        ({"count": [{"numeric": [">", 0, "<=", 3]}]}, True),
+        ({"count": [{"numeric": ["<", 3]}]}, False),
+        ({"eventName": [{"numeric": [">", 0]}]}, False),
+        ({"errorCode": [{"exists": True}]}, True),
+        ({"missing": [{"exists": False}]}, True),
+        ({"eventName": [{"exists": False}]}, False),
+        ({"userIdentity": [{"exists": True}]}, False),
+        ({"sourceIPAddress": [{"cidr": "10.0.0.0/16"}]}, True),
+        ({"sourceIPAddress": [{"cidr": "192.168.0.0/16"}]}, False),
+        ({"userIdentity": {"arn": [{"wildcard": "arn:aws:sts::*:assumed-role/Admin/*"}]}}, True),
+        ({"userIdentity": {"arn": [{"wildcard": "*:role/*"}]}}, False),
+        ({"items": {"imageId": ["ami-2"], "state": ["pending"]}}, True),
+        ({"items": {"state": ["running"]}}, False),
+    ],
+)
+def test_matchers(detail, expected):
+    """Test each matcher against the same event."""
+    match = compile_pattern({"source": ["aws.ec2"], "detail": detail})
+    assert match(EVENT) is expected
+
+
+def test_or_and_json_patterns():
+    """Test $or alternatives and patterns given as JSON strings."""
+    pattern = {
+        "$or": [
+            {"detail": {"eventName": ["StopInstances"]}},
+            {"detail": {"count": [{"numeric": ["=", 3]}]}},
+        ]
+    }
+    assert compile_pattern(json.dumps(pattern))(EVENT)
+    assert not compile_pattern({"source": ["aws.s3"], **pattern})(EVENT)
+
+
+@pytest.mark.parametrize(
+    "pattern, message",
+    [
+        ({}, "must not be empty"),
+        ({"source": "aws.ec2"}, "must be a non-empty list"),
+        ({"source": [{"regex": "x"}]}, "Unknown matcher 'regex'"),
+        ({"count": [{"numeric": [">"]}]}, "Invalid numeric matcher"),
+        ({"ip": [{"cidr": "nope"}]}, "Invalid cidr matcher"),
+        ({"$or": [{"source": ["a"]}]}, "at least two patterns"),
+        ("{", "Could not parse"),
+    ],
+)
+def test_invalid_patterns(pattern, message):
+    """Test invalid patterns are rejected when compiled."""
+    with pytest.raises(ValidationError, match=message):
+        compile_pattern(pattern)
+
+
+def test_read_events_wraps_cloudtrail(tmp_path):
+    """Test raw CloudTrail records are wrapped as EventBridge events."""
+    record = {
+        "eventSource": "s3.amazonaws.com",
+        "eventName": "CreateBucket",
+        "awsRegion": "eu-west-1",
+    }
+    corpus = tmp_path / "events.jsonl"
+    corpus.write_text("\n".join([json.dumps(EVENT), json.dumps({"Records": [record, record]}), ""]))
+
+    events = list(read_events([str(corpus)]))
+    assert len(events) == 3
+    assert events[0] == EVENT
+    assert events[1]["source"] == "aws.s3"
+    assert events[1]["detail"] == record
+    assert to_eventbridge_event({"eventSource": "signin.amazonaws.com"})["detail-type"] == (
+        "AWS Console Sign In via CloudTrail"
+    )
+
+    corpus.write_text("not json\n")
+    with pytest.raises(ValidationError, match="events.jsonl:1 is not JSON"):
+        list(read_events([str(corpus)]))
+
+
+def test_match_policy_patterns():
+    """Test the generated pattern of each event policy is matched and reported."""
+    policies = {
+        "policies": [
+            {
+                "name": "run",
+                "resource": "ec2",
+                "mode": {"type": "cloudtrail", "events": ["RunInstances"]},
+            },
+            {
+                "name": "stop",
+                "resource": "ec2",
+                "mode": {"type": "ec2-instance-state", "events": ["stopped"]},
+            },
+            {"name": "daily", "resource": "ec2", "mode": {"type": "periodic"}},
+        ]
+    }
+    patterns = policy_patterns(policies)
+    assert sorted(patterns) == ["run", "stop"]
+
+    stopped = {"source": "aws.ec2", "detail-type": "EC2 Instance State-change Notification"}
+    stopped["detail"] = {"state": "stopped"}
+    report = match_events(patterns, [EVENT, stopped, EVENT, {"source": "aws.s3"}])
+
+    assert report["events"] == 4
+    assert report["patterns"]["run"] == {
+        "matched": 2,
+        "match_rate": 0.5,
+        "top_events": {"ec2.amazonaws.com:RunInstances": 2},
+    }
+    assert report["patterns"]["stop"]["top_events"] == {"EC2 Instance State-change Notification": 1}
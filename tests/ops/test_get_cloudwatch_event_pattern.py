@@ -65,6 +65,16 @@ def test_validate_event_pattern_failure():
         validate_event_pattern(policy_dict)
 
 
+def test_policy_event_pattern():
+    """Test the pattern is generated from a validated policy."""
+    from ops.common import validate_with_custodian
+    from ops.get_cloudwatch_event_pattern import policy_event_pattern
+
+    policy_instance = validate_with_custodian({"policies": [CLOUDWATCH_EVENT_POLICY_DICT]})
+
+    assert json.loads(policy_event_pattern(policy_instance)) == CLOUDWATCH_EVENT_PATTERN
+
+
 def test_process_policies_success():
     """Test successful end-to-end process."""
     from ops.get_cloudwatch_event_pattern import process_policies
@@ -7,11 +7,13 @@ import pytest
 import io
 from unittest.mock import patch
 
+from ops.common import validate_with_custodian
 from ops.get_config_rule_params import (
+    ConfigRuleLambda,
     create_policy_objects,
     extract_config_rule_params,
     main,
-    ValidationError,
+    process_policies,
 )
 
 from tests.ops.fixtures import (
@@ -21,32 +23,54 @@ from tests.ops.fixtures import (
 )
 
 
+def validated_policy(policy_data=CONFIG_RULE_POLICY_DICT):
+    return validate_with_custodian({"policies": [policy_data]})
+
+
 def test_create_policy_objects_success():
-    """Test successful policy object creation with Cloud Custodian."""
-    policy_data = CONFIG_RULE_POLICY_DICT
+    """Test policy objects are created from the validated policy without an archive."""
+    policy_instance = validated_policy()
 
-    policy_lambda, config_rule = create_policy_objects(policy_data)
+    with patch("c7n.mu.custodian_archive") as custodian_archive:
+        policy_lambda, config_rule = create_policy_objects(policy_instance)
 
-    assert policy_lambda is not None
-    assert config_rule is not None
+    assert isinstance(policy_lambda, ConfigRuleLambda)
+    assert policy_lambda.policy is policy_instance
+    assert config_rule.data == CONFIG_RULE_POLICY_DICT["mode"]
+    custodian_archive.assert_not_called()
 
 
 def test_create_policy_objects_failure():
-    """Test policy object creation failure with invalid policy data."""
-    # Missing required fields (resource and mode) should cause failure
-    invalid_policy_data = {
-        "name": "test-policy",
-    }
+    """Test a policy without a mode fails to create the config rule."""
+    policy_instance = validated_policy({"name": "pull-policy", "resource": "ec2"})
+
+    with pytest.raises(RuntimeError, match="Unexpected error creating policy objects: KeyError"):
+        create_policy_objects(policy_instance)
+
+
+def test_process_policies_builds_policy_once():
+    """Test the policy validated by Cloud Custodian is the one the parameters use."""
+    validated = []
 
-    with pytest.raises(ValidationError):
-        create_policy_objects(invalid_policy_data)
+    def validate(policies_dict):
+        validated.append(validate_with_custodian(policies_dict))
+        return validated[-1]
+
+    with (
+        patch("ops.get_config_rule_params.validate_with_custodian", side_effect=validate),
+        patch(
+            "ops.get_config_rule_params.create_policy_objects", wraps=create_policy_objects
+        ) as create,
+    ):
+        process_policies({"policies": CONFIG_RULE_POLICIES_YAML})
+
+    assert len(validated) == 1
+    assert create.call_args.args[0] is validated[0]
 
 
 def test_extract_config_rule_params_success():
     """Test successful config rule parameter extraction."""
-    policy_data = CONFIG_RULE_POLICY_DICT
-
-    policy_lambda, config_rule = create_policy_objects(policy_data)
+    policy_lambda, config_rule = create_policy_objects(validated_policy())
 
     result = extract_config_rule_params(policy_lambda, config_rule)
     assert isinstance(result, dict)
@@ -80,9 +104,7 @@ def test_extract_config_rule_params_success():
 def test_extract_config_rule_params_failure():
     """Test config rule parameter extraction failure."""
     # Create valid objects first
-    valid_policy_data = CONFIG_RULE_POLICY_DICT
-
-    policy_lambda, config_rule = create_policy_objects(valid_policy_data)
+    policy_lambda, config_rule = create_policy_objects(validated_policy())
 
     # Empty the config_rule object to cause get_rule_params to fail
     config_rule.data = None
@@ -0,0 +1,121 @@
+"""
+Unit tests for mailer_templates.py.
+"""
+
+import os
+import tempfile
+import pytest
+
+from unittest.mock import patch
+
+from ops.mailer_templates import (
+    TemplateIndex,
+    ValidationError,
+    compile_templates,
+    find_shadowed,
+    iter_template_files,
+    template_digest,
+    validate_templates,
+)
+
+
+def write_templates(folder, templates):
+    for name, content in templates.items():
+        with open(os.path.join(folder, name), "w") as fh:
+            fh.write(content)
+
+
+def test_iter_template_files_sorted():
+    """Test templates are yielded sorted by folder then name, skipping other files."""
+    with tempfile.TemporaryDirectory() as dir_a, tempfile.TemporaryDirectory() as dir_b:
+        write_templates(dir_a, {"b.j2": "b", "a.j2": "a", "readme.txt": "x"})
+        write_templates(dir_b, {"c.j2": "c"})
+
+        result = list(iter_template_files([dir_b, dir_a, dir_a, "/does/not/exist"]))
+
+    names = [name for name, _ in result]
+    assert sorted(names) == ["a.j2", "b.j2", "c.j2"]
+    assert names.index("a.j2") < names.index("b.j2")
+
+
+def test_compile_templates_success():
+    """Test templates compile to module source keyed by module filename."""
+    import jinja2
+
+    compiled = compile_templates({"default.j2": ("Hello {{ recipient }}", "default.j2")})
+
+    filename = jinja2.ModuleLoader.get_module_filename("default.j2")
+    assert list(compiled) == [filename]
+    assert "def root(" in compiled[filename]
+
+
+def test_compile_templates_syntax_error():
+    """Test syntax errors are reported with file and line."""
+    with pytest.raises(ValidationError) as exc_info:
+        compile_templates({"bad.j2": ("line one\n{% if %}", "/tmp/bad.j2")})
+
+    assert "/tmp/bad.j2:2" in str(exc_info.value)
+
+
+def test_validate_templates():
+    """Test validate_templates compiles every template in the folders."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        write_templates(temp_dir, {"good.j2": "{{ resources | length }}"})
+        assert validate_templates([temp_dir]) == ["good.j2"]
+
+        write_templates(temp_dir, {"bad.j2": "{% for %}"})
+        with pytest.raises(ValidationError):
+            validate_templates([temp_dir])
+
+
+def test_template_index_skips_unchanged_files():
+    """Test unchanged templates are not re-read or re-validated."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = os.path.join(temp_dir, "templates")
+        os.makedirs(folder)
+        write_templates(folder, {"a.j2": "{{ a }}", "b.j2": "{{ b }}"})
+        index_path = os.path.join(temp_dir, "index.json")
+
+        index = TemplateIndex(index_path)
+        validate_templates([folder], index)
+        index.save()
+        assert index.reads == 2
+
+        index = TemplateIndex(index_path)
+        with patch("ops.mailer_templates.compile_templates") as mock_compile:
+            validate_templates([folder], index)
+        assert index.reads == 0
+        mock_compile.assert_called_once_with({})
+
+        write_templates(folder, {"b.j2": "{{ b }} changed"})
+        index = TemplateIndex(index_path)
+        index.scan([folder])
+        assert index.reads == 1
+
+
+def test_template_digest_deterministic():
+    """Test the digest depends on template contents only."""
+    with tempfile.TemporaryDirectory() as dir_a, tempfile.TemporaryDirectory() as dir_b:
+        write_templates(dir_a, {"a.j2": "{{ a }}"})
+        write_templates(dir_b, {"a.j2": "{{ a }}"})
+
+        assert template_digest(TemplateIndex().scan([dir_a])) == template_digest(
+            TemplateIndex().scan([dir_b])
+        )
+
+        write_templates(dir_b, {"a.j2": "{{ b }}"})
+        assert template_digest(TemplateIndex().scan([dir_a])) != template_digest(
+            TemplateIndex().scan([dir_b])
+        )
+
+
+def test_find_shadowed():
+    """Test templates provided by several folders are reported, last one wins."""
+    with tempfile.TemporaryDirectory() as dir_a, tempfile.TemporaryDirectory() as dir_b:
+        write_templates(dir_a, {"default.j2": "a", "only_a.j2": "a"})
+        write_templates(dir_b, {"default.j2": "b"})
+
+        shadowed = find_shadowed(iter_template_files([dir_a, dir_b]))
+
+    assert list(shadowed) == ["default.j2"]
+    assert len(shadowed["default.j2"]) == 2
@@ -0,0 +1,65 @@
+"""
+Unit tests for manifest.py.
+"""
+
+import os
+import tempfile
+import pytest
+
+from ops.manifest import FileIndex, archive_fingerprint, check_prediction, module_files
+
+
+def test_file_index_reuses_unchanged_entries():
+    """Test files are only re-read when size or mtime change."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "module.py")
+        index_path = os.path.join(temp_dir, "index.json")
+        with open(path, "w") as fh:
+            fh.write("VALUE = 1\n")
+
+        index = FileIndex(index_path)
+        digest = index.digest(path)
+        index.update(path, valid=True)
+        index.save()
+
+        index = FileIndex(index_path)
+        assert index.digest(path) == digest
+        assert index.reads == 0
+
+        with open(path, "w") as fh:
+            fh.write("VALUE = 22\n")
+        assert index.digest(path) != digest
+        assert "valid" not in index.entry(path)
+        assert index.reads == 1
+
+
+def test_module_files_match_archive():
+    """Test module_files lists the same paths the archive builder adds."""
+    from c7n.mu import PythonPackageArchive
+
+    archive = PythonPackageArchive(["c7n", "six", "decorator"])
+    archive.close()
+    filenames = sorted(archive.get_filenames())
+    archive.remove()
+
+    assert [arc_path for arc_path, _ in module_files(["c7n", "six", "decorator"])] == filenames
+
+
+def test_archive_fingerprint():
+    """Test the fingerprint changes with contents and options only."""
+    contents = {"config.json": "{}", "handler.py": "pass"}
+
+    fingerprint = archive_fingerprint(contents, ["six"])
+    assert archive_fingerprint(dict(reversed(list(contents.items()))), ["six"]) == fingerprint
+    assert archive_fingerprint(dict(contents, **{"config.json": "[]"}), ["six"]) != fingerprint
+    assert archive_fingerprint(contents, ["six"], options={"strip_debug": False}) != fingerprint
+    assert archive_fingerprint(contents, ["six", "jmespath"]) != fingerprint
+
+
+def test_check_prediction():
+    """Test a built hash that differs from the recorded one is an error."""
+    check_prediction(None, {"sha256_hex": "a"})
+    check_prediction({"sha256_hex": "a"}, {"sha256_hex": "a"})
+
+    with pytest.raises(RuntimeError, match="does not match"):
+        check_prediction({"sha256_hex": "a"}, {"sha256_hex": "b"})
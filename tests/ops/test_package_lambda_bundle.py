@@ -0,0 +1,135 @@
+"""
+Unit tests for package_lambda_bundle.py.
+"""
+
+import json
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+from ops.benchmark import benchmark_archive
+from ops.common import ValidationError
+from ops.package_lambda_bundle import get_bundle_regions, process_policies, run
+from tests.ops.fixtures import EXEC_OPTIONS
+
+ROLE = "arn:aws:iam::123456789012:role/custodian"
+
+POLICIES_YAML = """
+vars:
+  schedule: &schedule rate(1 day)
+policies:
+  - name: ec2-running
+    resource: ec2
+    mode:
+      type: periodic
+      schedule: *schedule
+    filters:
+      - instance-state-name: running
+  - name: s3-buckets
+    resource: s3
+    mode:
+      type: periodic
+      schedule: *schedule
+  - name: hourly
+    resource: ec2
+    mode:
+      type: periodic
+      schedule: rate(1 hour)
+  - name: ec2-west
+    resource: ec2
+    mode:
+      type: periodic
+      schedule: *schedule
+    conditions:
+      - type: value
+        key: region
+        value: us-west-2
+  - name: s3-east
+    resource: s3
+    mode:
+      type: periodic
+      schedule: *schedule
+    conditions:
+      - type: value
+        key: region
+        op: in
+        value: [us-east-1, eu-west-1]
+"""
+
+
+def bundle_query(names, **kwargs):
+    return dict(
+        {
+            "policies": POLICIES_YAML,
+            "policy_names": json.dumps(names),
+            "execution_options": json.dumps(EXEC_OPTIONS),
+            "function_name": "custodian-bundle",
+            "role": ROLE,
+        },
+        **kwargs,
+    )
+
+
+def test_missing_fields():
+    """Test missing required fields raise ValidationError."""
+    with pytest.raises(ValidationError, match="Missing required fields: policy_names"):
+        run({"policies": POLICIES_YAML, "execution_options": "{}", "function_name": "f"})
+
+
+def test_incompatible_policies():
+    """Test policies with different schedules are rejected."""
+    with pytest.raises(ValidationError, match="mode schedule differ"):
+        run(bundle_query(["ec2-running", "hourly"]))
+
+
+def test_bundle_regions():
+    """Test the enabled regions are looked up once for all bundled policies."""
+    _, _, validated = process_policies(bundle_query(["ec2-west", "s3-east"]))
+    with patch(
+        "ops.package_lambda_bundle.get_regions",
+        return_value=["us-east-1", "us-west-2", "eu-west-1", "ap-south-1"],
+    ) as get_regions:
+        regions = get_bundle_regions(validated)
+
+    get_regions.assert_called_once()
+    assert regions == {"us-east-1", "us-west-2", "eu-west-1"}
+
+
+def test_bundle_regions_mixed_conditions():
+    """Test a bundle mixing policies with and without conditions needs regions."""
+    with pytest.raises(ValidationError, match="Policies ec2-running have no region conditions"):
+        process_policies(bundle_query(["ec2-running", "ec2-west"]))
+
+    policy_list, _, _ = process_policies(
+        bundle_query(["ec2-running", "ec2-west"], regions='["eu-west-1"]')
+    )
+    assert [p["name"] for p in policy_list] == ["ec2-running", "ec2-west"]
+
+
+def test_bundle_regions_invalid():
+    """Test regions must be a JSON list of names."""
+    with pytest.raises(ValidationError, match="regions must be a JSON list"):
+        process_policies(bundle_query(["ec2-running", "ec2-west"], regions='"eu-west-1"'))
+
+
+def test_package_bundle(tmp_path, monkeypatch):
+    """Test the bundle archive holds every policy and runs them all."""
+    monkeypatch.chdir(tmp_path)
+    with patch("ops.package_lambda_bundle.get_regions") as get_regions:
+        result = run(bundle_query(["s3-buckets", "ec2-running"], bundle_concurrency="2"))
+
+    get_regions.assert_not_called()
+    assert json.loads(result["bundle_policies"]) == ["s3-buckets", "ec2-running"]
+    assert json.loads(result["policy_regions"]) == []
+    assert "custodian-info" in json.loads(result["custodian_tags"])
+    with zipfile.ZipFile(result["zip_path"]) as archive:
+        config = json.loads(archive.read("config.json"))
+    assert config["bundle"] == {"concurrency": 2}
+    assert [p["mode"]["role"] for p in config["policies"]] == [ROLE, ROLE]
+
+    report = benchmark_archive(result["zip_path"], runs=1)
+
+    assert report["errors"] == []
+    assert "ec2.DescribeInstances" in report["api_calls"]
+    assert "s3.ListBuckets" in report["api_calls"]
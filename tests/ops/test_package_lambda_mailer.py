@@ -188,3 +188,178 @@ def test_main_runtime_error(capsys):
             assert exc_info.value.code == 1
             captured = capsys.readouterr()
             assert len(captured.err) > 0
+
+
+def test_select_dependency_groups():
+    """Test transport dependency groups follow the mailer config."""
+    from ops.package_lambda_mailer import select_dependency_groups
+
+    config = complete_mailer_config()
+    assert select_dependency_groups(config) == ["core", "requests", "datadog"]
+
+    config["ldap_uri"] = "ldap://example.com"
+    config["sendgrid_api_key"] = "key"
+    groups = select_dependency_groups(config)
+    assert {"ldap", "redis", "sendgrid", "datadog"}.issubset(groups)
+    assert "splunk" not in groups
+
+
+def test_group_modules_and_module_group():
+    """Test mapping between dependency groups and modules."""
+    from ops.package_lambda_mailer import CORE_DEPS, group_modules, module_group
+
+    modules = group_modules(["core", "datadog"])
+    assert "datadog" in modules
+    assert "sendgrid" not in modules
+    assert modules == [m for m in CORE_DEPS if m in modules]
+
+    assert module_group("sendgrid") == "sendgrid"
+    assert module_group("not_a_module") is None
+
+
+def test_resolve_dependencies_restores_eager_imports():
+    """Test groups imported unconditionally by the entry module are restored."""
+    from ops.package_lambda_mailer import resolve_dependencies
+
+    with patch(
+        "ops.package_lambda_mailer.find_missing_module", side_effect=["ldap3", None]
+    ) as mock_find:
+        deps, report = resolve_dependencies(complete_mailer_config())
+
+    assert mock_find.call_count == 2
+    assert "ldap3" in deps
+    assert report["restored"] == {"ldap": "ldap3"}
+    assert "sendgrid" in report["dropped"]
+    assert report["bytes_saved"] > 0
+
+
+def test_resolve_dependencies_unknown_module():
+    """Test a missing module outside CORE_DEPS raises RuntimeError."""
+    from ops.package_lambda_mailer import resolve_dependencies
+
+    with patch("ops.package_lambda_mailer.find_missing_module", return_value="unknown"):
+        with pytest.raises(RuntimeError):
+            resolve_dependencies(complete_mailer_config())
+
+
+def test_find_missing_module_isolated_import():
+    """Test the isolated import succeeds with all deps and reports a missing one."""
+    from ops.package_lambda_mailer import CORE_DEPS, find_missing_module
+
+    assert find_missing_module(CORE_DEPS) is None
+    assert find_missing_module([m for m in CORE_DEPS if m != "jinja2"]) == "jinja2"
+
+
+def test_get_archive_precompiled_templates_render():
+    """Test the archive renders templates from compiled modules without the sources."""
+    import shutil
+    import subprocess
+    import sys
+    import zipfile
+    from ops.package_lambda_mailer import get_archive, CORE_DEPS
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        templates_dir = os.path.join(temp_dir, "templates")
+        os.makedirs(templates_dir)
+        with open(os.path.join(templates_dir, "greeting.j2"), "w") as f:
+            f.write("Hello {{ recipient }}")
+
+        config = complete_mailer_config()
+        config["templates_folders"] = [templates_dir]
+        archive = get_archive(config, CORE_DEPS)
+
+        extract_dir = os.path.join(temp_dir, "extract")
+        with zipfile.ZipFile(archive.path) as zf:
+            zf.extractall(extract_dir)
+        archive.remove()
+
+        assert os.listdir(os.path.join(extract_dir, "msg-templates-compiled"))
+        shutil.rmtree(os.path.join(extract_dir, "msg-templates"))
+
+        script = (
+            "import sys; sys.path.insert(0, '.'); import periodic; "
+            "from c7n_mailer import utils; "
+            "env = utils.get_jinja_env(['msg-templates/']); "
+            "print(env.get_template('greeting.j2').render(recipient='team'))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=extract_dir, capture_output=True, text=True
+        )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "Hello team"
+
+
+def test_process_lambda_package_template_syntax_error():
+    """Test process_lambda_package reports template syntax errors."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with open(os.path.join(temp_dir, "broken.j2"), "w") as f:
+            f.write("{% for %}")
+
+        config = complete_mailer_config()
+        config["templates_folders"] = [temp_dir]
+        query = {
+            "lambda_name": "cloud-custodian-mailer",
+            "mailer_config": json.dumps(config),
+        }
+
+        with (
+            patch("ops.package_lambda_mailer.resolve_dependencies", return_value=([], {})),
+            pytest.raises(RuntimeError, match="Failed to compile mailer templates"),
+        ):
+            process_lambda_package(query)
+
+
+def test_process_lambda_package_cached():
+    """Test an unchanged config and template set reuses the previous archive."""
+    config = complete_mailer_config()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with open(os.path.join(temp_dir, "custom.j2"), "w") as fh:
+            fh.write("{{ subject }}")
+        config["templates_folders"] = [temp_dir]
+        query = {
+            "region": "us-east-1",
+            "lambda_name": "cloud-custodian-mailer-cache",
+            "mailer_config": json.dumps(config),
+        }
+
+        first = process_lambda_package(query)
+        with patch("ops.package_lambda_mailer.get_archive") as mock_get_archive:
+            second = process_lambda_package(query)
+            mock_get_archive.assert_not_called()
+        assert second["zip_path"] == first["zip_path"]
+        assert second["sha256_hex"] == first["sha256_hex"]
+
+        with open(os.path.join(temp_dir, "custom.j2"), "w") as fh:
+            fh.write("{{ subject }} changed")
+        third = process_lambda_package(query)
+        assert third["sha256_hex"] != first["sha256_hex"]
+
+    # The previous archive is kept until its lease expires
+    assert os.path.exists(first["zip_path"])
+    os.unlink(first["zip_path"])
+    os.unlink(third["zip_path"])
+
+
+def test_process_lambda_package_tags_not_in_archive():
+    """Test force-deploy and lambda_tags do not change the archive when kept out of it."""
+    from ops.package_lambda_mailer import get_function_config
+
+    config = complete_mailer_config()
+    config["lambda_tags"] = {"owner": "team"}
+    query = {
+        "region": "us-east-1",
+        "lambda_name": "cloud-custodian-mailer-tags",
+        "mailer_config": json.dumps(config),
+        "tags_in_archive": "false",
+    }
+
+    first = process_lambda_package(query)
+    second = process_lambda_package(dict(query, force_deploy="true"))
+
+    assert second["sha256_hex"] == first["sha256_hex"]
+    assert json.loads(first["custodian_tags"]) == {"owner": "team"}
+    assert "force-deploy" in json.loads(second["custodian_tags"])
+    assert "lambda_tags" not in get_function_config(config, include_tags=False)
+
+    os.unlink(second["zip_path"])
@@ -110,7 +110,7 @@ def test_process_policies_with_packages_and_tags():
     """Test parsing policy data with packages field."""
     query = {"policies": DETAILED_POLICIES_YAML, "role": "test-role", "execution_options": {}}
     with patch("ops.package_lambda_policy.get_regions", return_value=["us-east-1", "eu-west-1"]):
-        policy_list, regions, packages = process_policies(query)
+        policy_list, regions, packages, _ = process_policies(query)
         assert policy_list[0]["name"] == SIMPLE_PERIODIC_POLICY_DICT["name"]
 
         # Check packages
@@ -133,7 +133,7 @@ def test_process_policies_without_packages_and_tags():
 
     with patch("ops.package_lambda_policy.get_regions", return_value=["us-east-1", "eu-west-1"]):
 
-        policy_list, regions, packages = process_policies(query)
+        policy_list, regions, packages, _ = process_policies(query)
         assert policy_list[0]["name"] == SIMPLE_PERIODIC_POLICY_DICT["name"]
 
         # Check packages
@@ -276,6 +276,25 @@ def test_process_lambda_package_checksum_error():
             process_lambda_package(query, policies, regions, exec_options, packages)
 
 
+def test_process_lambda_package_tags_not_in_archive():
+    """Test tags are left out of config.json but kept in custodian_tags."""
+    import copy
+    from ops.package_lambda_policy import add_tags_to_policy, process_lambda_package
+
+    query = {"function_name": "custodian-test-tags", "tags_in_archive": "false"}
+    hashes = set()
+    for tags in ({"custodian-info": "a"}, {"custodian-info": "a", "force-deploy": "b"}):
+        policies = add_tags_to_policy(copy.deepcopy([SIMPLE_PERIODIC_POLICY_DICT]), tags)
+        result = process_lambda_package(query, policies, ["us-east-1"], EXEC_OPTIONS, [])
+        hashes.add(result["sha256_hex"])
+
+        assert json.loads(result["custodian_tags"]) == tags
+        assert "tags" in policies[0]["mode"]
+
+    assert len(hashes) == 1
+    os.unlink(result["zip_path"])
+
+
 def test_process_exec_options_not_dict():
     """Test process_exec_options when execution_options is not a dict."""
     query = {"execution_options": '"not a dict"'}
@@ -358,18 +377,19 @@ def test_main_success():
     }
 
     with patch("sys.stdin", io.StringIO(json.dumps(valid_input))):
-        with patch("ops.package_lambda_policy.process_lambda_package", return_value=mock_result):
+        with patch("ops.package_lambda_policy.package_archive", return_value=mock_result):
             with patch(
                 "ops.package_lambda_policy.process_policies",
-                return_value=([mock_policy], set([]), []),
+                return_value=([mock_policy], None, [], None),
             ):
                 with patch(
                     "ops.package_lambda_policy.process_exec_options",
                     return_value={"log_group": EXEC_OPTIONS["log_group"]},
                 ):
-                    with pytest.raises(SystemExit) as exc_info:
-                        main()
-                    assert exc_info.value.code == 0
+                    with patch("ops.package_lambda_policy.get_policy_regions", return_value=set()):
+                        with pytest.raises(SystemExit) as exc_info:
+                            main()
+                        assert exc_info.value.code == 0
 
 
 def test_main_json_decode_error(capsys):
@@ -438,7 +458,7 @@ def test_main_exec_options_validation_error(capsys):
     with patch("sys.stdin", io.StringIO(json.dumps(invalid_input))):
         with patch(
             "ops.package_lambda_policy.process_policies",
-            return_value=([{"name": "test"}], [], []),
+            return_value=([{"name": "test"}], [], [], None),
         ):
             with pytest.raises(SystemExit) as exc_info:
                 main()
@@ -462,17 +482,138 @@ def test_main_runtime_error(capsys):
     with patch("sys.stdin", io.StringIO(json.dumps(valid_input))):
         with patch(
             "ops.package_lambda_policy.process_policies",
-            return_value=([{"name": "test"}], ["us-east-1"], []),
+            return_value=([{"name": "test"}], ["us-east-1"], [], None),
         ):
             with patch(
                 "ops.package_lambda_policy.process_exec_options", return_value={"log_group": "test"}
             ):
-                with patch("ops.package_lambda_policy.process_lambda_package") as mock_package:
+                with patch("ops.package_lambda_policy.package_archive") as mock_package:
                     mock_package.side_effect = RuntimeError("Mock packaging error")
 
-                    with pytest.raises(SystemExit) as exc_info:
-                        main()
+                    with patch("ops.package_lambda_policy.get_policy_regions", return_value=set()):
+                        with pytest.raises(SystemExit) as exc_info:
+                            main()
 
                     assert exc_info.value.code == 1
                     captured = capsys.readouterr()
                     assert "Failed to package lambda" in captured.err
+
+
+def test_process_lambda_package_canonical_config():
+    """Test equivalent policies written differently produce the same archive."""
+    from ops.package_lambda_policy import process_lambda_package
+
+    reordered = dict(reversed(list(SIMPLE_PERIODIC_POLICY_DICT.items())))
+    queries = [
+        {"policies": SIMPLE_PERIODIC_POLICIES_YAML},
+        {"policies": json.dumps({"vars": {"unused": 1}, "policies": [reordered]})},
+    ]
+
+    hashes = set()
+    for query in queries:
+        query.update({"role": "test-role", "function_name": "custodian-test-canonical"})
+        with patch("ops.package_lambda_policy.get_regions", return_value=["us-east-1"]):
+            policy_list, regions, packages, _ = process_policies(query)
+        result = process_lambda_package(query, policy_list, regions, EXEC_OPTIONS, packages)
+        hashes.add(result["sha256_hex"])
+
+    assert len(hashes) == 1
+    os.unlink(result["zip_path"])
+
+
+def test_process_lambda_package_hash_only():
+    """Test hash_only reports recorded hashes without building the zip."""
+    from ops.package_lambda_policy import process_lambda_package
+
+    query = {"function_name": "custodian-test-hash-only"}
+    policies = [SIMPLE_PERIODIC_POLICY_DICT]
+    built = process_lambda_package(query, policies, ["us-east-1"], EXEC_OPTIONS, [])
+    assert built["materialized"] == "true"
+    os.unlink(built["zip_path"])
+
+    with patch("ops.package_lambda_policy.create_custodian_archive") as mock_create:
+        planned = process_lambda_package(
+            dict(query, hash_only="true"), policies, ["us-east-1"], EXEC_OPTIONS, []
+        )
+        mock_create.assert_not_called()
+    assert planned["materialized"] == "false"
+    assert planned["sha256_base64"] == built["sha256_base64"]
+    assert planned["archive_fingerprint"] == built["archive_fingerprint"]
+
+    with patch("ops.package_lambda_policy.check_prediction") as mock_check:
+        rebuilt = process_lambda_package(query, policies, ["us-east-1"], EXEC_OPTIONS, [])
+        assert mock_check.call_args[0][0]["sha256_hex"] == built["sha256_hex"]
+    assert rebuilt["sha256_hex"] == built["sha256_hex"]
+    os.unlink(rebuilt["zip_path"])
+
+
+def test_process_lambda_package_concurrently():
+    """Test the concurrent pipeline matches the sequential result and reports timings."""
+    from ops.common import validate_with_custodian
+    from ops.package_lambda_policy import (
+        process_lambda_package,
+        process_lambda_package_concurrently,
+    )
+
+    query = {"function_name": "custodian-test-concurrent"}
+    policies = [SIMPLE_PERIODIC_POLICY_DICT]
+    validated_policy = validate_with_custodian(SIMPLE_PERIODIC_POLICIES_DICT)
+
+    with patch("ops.package_lambda_policy.get_regions", return_value=["us-east-1"]):
+        sequential = process_lambda_package(
+            query, policies, set(), EXEC_OPTIONS, [], validated_policy=validated_policy
+        )
+        concurrent = process_lambda_package_concurrently(
+            query, policies, EXEC_OPTIONS, [], validated_policy=validated_policy
+        )
+
+    timings = json.loads(concurrent.pop("stage_timings"))
+    # The second run reuses the archive built by the first
+    assert concurrent.pop("remote_cache") == "local"
+    sequential.pop("remote_cache")
+    assert concurrent == sequential
+    assert set(timings["stages"]) == {"regions", "package_versions", "package"}
+    assert timings["critical_path"]
+
+    os.unlink(concurrent["zip_path"])
+
+
+def test_stage_timer_critical_path():
+    """Test the critical path follows the stages that bounded the total time."""
+    from ops.common import StageTimer
+
+    timer = StageTimer()
+    timer.stages = {
+        "policies": (0.0, 1.0),
+        "regions": (1.0, 1.5),
+        "package": (1.0, 3.0),
+        "package_versions": (1.0, 2.0),
+    }
+
+    report = timer.report()
+    assert report["critical_path"] == ["policies", "package"]
+    assert report["total_seconds"] == 3.0
+    assert list(report["stages"]) == ["policies", "regions", "package_versions", "package"]
+
+
+def test_process_lambda_package_remote_cache(build_root):
+    """Test a runner without a local build fetches the archive from the remote cache."""
+    import shutil
+    from ops.package_lambda_policy import process_lambda_package
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        query = {"function_name": "custodian-test-remote", "remote_cache": temp_dir}
+        policies = [SIMPLE_PERIODIC_POLICY_DICT]
+
+        built = process_lambda_package(query, policies, set(), EXEC_OPTIONS, [])
+        assert built["remote_cache"] == "miss"
+        shutil.rmtree(build_root / "custodian-test-remote")
+
+        with patch("ops.package_lambda_policy.create_custodian_archive") as mock_create:
+            fetched = process_lambda_package(query, policies, set(), EXEC_OPTIONS, [])
+            mock_create.assert_not_called()
+
+    assert fetched["remote_cache"] == "hit"
+    assert fetched["sha256_base64"] == built["sha256_base64"]
+    assert os.path.exists(fetched["zip_path"])
+    os.unlink(fetched["zip_path"])
@@ -0,0 +1,76 @@
+"""
+Unit tests for policy_cost.py.
+"""
+
+from ops.common import validate_with_custodian
+from ops.policy_cost import estimate_policy, info_messages
+
+
+def periodic_mode(**kwargs):
+    return dict({"type": "periodic", "schedule": "rate(1 day)"}, **kwargs)
+
+
+def estimate(policy, count=100):
+    policy = dict({"name": "test", "mode": periodic_mode()}, **policy)
+    return estimate_policy(validate_with_custodian({"policies": [policy]}), count)
+
+
+def test_estimate_plain_policy():
+    """Test a value filter adds no calls to the paginated list."""
+    result = estimate({"resource": "ec2", "filters": [{"tag:team": "absent"}]}, count=250)
+
+    assert result["breakdown"] == [
+        {"call": "ec2.describe_instances", "calls": 3, "per_resource": False}
+    ]
+    assert result["calls"] == 3
+    assert result["warnings"] == []
+    assert result["suggested"]["timeout"] == 60
+    assert result["suggested"]["memory"] == 512
+
+
+def test_estimate_flags_per_resource_calls():
+    """Test detail, augment and metrics calls are flagged as N+1."""
+    role = estimate({"resource": "iam-role"})
+    assert "iam.get_role makes 1 call(s) per resource (100 for 100)" in role["warnings"]
+
+    s3 = estimate({"resource": "s3"}, count=200)
+    assert any("may be throttled" in w for w in s3["warnings"])
+    assert s3["suggested"]["memory"] == 1024
+
+    metrics = estimate(
+        {
+            "resource": "ec2",
+            "filters": [{"type": "metrics", "name": "CPUUtilization", "value": 1, "op": "lt"}],
+            "actions": ["stop"],
+        }
+    )
+    assert metrics["calls"] == 201
+    assert metrics["warnings"] == ["filter metrics makes 1 call(s) per resource (100 for 100)"]
+
+
+def test_estimate_related_filters_without_cache():
+    """Test repeated related lookups suggest enabling the cache."""
+    filters = [
+        {"type": "security-group", "key": "GroupName", "value": "a"},
+        {"not": [{"type": "security-group", "key": "GroupName", "value": "b"}]},
+    ]
+    result = estimate({"resource": "ec2", "filters": filters})
+    assert any("2 filters look up SecurityGroup" in w for w in result["warnings"])
+
+    cached = estimate(
+        {
+            "resource": "ec2",
+            "filters": filters,
+            "mode": periodic_mode(**{"execution-options": {"cache": "memory", "cache_period": 15}}),
+        }
+    )
+    assert cached["warnings"] == []
+
+
+def test_info_messages():
+    """Test the estimate is summarised with the current mode settings."""
+    messages = info_messages(estimate({"resource": "iam-role", "mode": periodic_mode(timeout=30)}))
+
+    assert messages[0].startswith("Performance: about 101 API calls for 100 resources")
+    assert "suggested timeout 60 (mode.timeout 30)" in messages[0]
+    assert messages[1].startswith("Performance warning: iam.get_role")
@@ -0,0 +1,70 @@
+"""
+Unit tests for policy_snapshot.py.
+"""
+
+import json
+import zipfile
+
+from ops.benchmark import benchmark_archive
+from ops.package_lambda_policy import get_archive_contents
+from ops.policy_snapshot import (
+    SNAPSHOT_HANDLER_TEMPLATE,
+    SNAPSHOT_PATH,
+    get_resource_types,
+    get_snapshot,
+    policy_snapshot,
+)
+from ops.watch import policy_query, run_package
+from tests.ops.fixtures import EXEC_OPTIONS, SIMPLE_PERIODIC_POLICIES_DICT
+
+ROLE = "arn:aws:iam::123456789012:role/custodian"
+
+
+def test_policy_snapshot_flag():
+    """Test the snapshot is opt-in."""
+    assert policy_snapshot({}) is False
+    assert policy_snapshot({"policy_snapshot": "TRUE"}) is True
+    assert policy_snapshot({"policy_snapshot": "false"}) is False
+
+
+def test_get_snapshot():
+    """Test the snapshot lists the resolved resource types."""
+    policy_list = [{"name": "p", "resource": "ec2"}, {"name": "q", "resource": "aws.s3"}]
+
+    assert get_resource_types(policy_list) == ["aws.ec2", "aws.s3"]
+    snapshot = json.loads(get_snapshot(policy_list))
+    assert snapshot["resource_types"] == ["aws.ec2", "aws.s3"]
+    assert snapshot["c7n_version"]
+
+
+def test_archive_contents_with_snapshot():
+    """Test the snapshot handler replaces the stock handler only when enabled."""
+    policy_list = SIMPLE_PERIODIC_POLICIES_DICT["policies"]
+
+    stock = get_archive_contents(policy_list, EXEC_OPTIONS)
+    snapshot = get_archive_contents(policy_list, EXEC_OPTIONS, snapshot=True)
+
+    assert SNAPSHOT_PATH not in stock
+    assert stock["custodian_policy.py"] != SNAPSHOT_HANDLER_TEMPLATE
+    assert snapshot["custodian_policy.py"] == SNAPSHOT_HANDLER_TEMPLATE
+    assert snapshot["config.json"] == stock["config.json"]
+    compile(snapshot["custodian_policy.py"], "custodian_policy.py", "exec")
+
+
+def test_snapshot_archive_runs_without_sts(tmp_path, monkeypatch):
+    """Test a snapshot archive invokes the policy without looking up the account."""
+    monkeypatch.chdir(tmp_path)
+    query = policy_query(
+        SIMPLE_PERIODIC_POLICIES_DICT,
+        {"role": ROLE, "execution_options": "{}", "policy_snapshot": "true"},
+    )
+    result = run_package(query, EXEC_OPTIONS)
+    with zipfile.ZipFile(result["zip_path"]) as archive:
+        assert SNAPSHOT_PATH in archive.namelist()
+
+    report = benchmark_archive(result["zip_path"], runs=1)
+
+    assert report["errors"] == []
+    assert "ec2.DescribeInstances" in report["api_calls"]
+    assert "sts.GetCallerIdentity" not in report["api_calls"]
+    assert "c7n" not in report["imports_ms"]["invoke"]
@@ -0,0 +1,370 @@
+"""
+Unit tests for prune.py.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+import pytest
+
+from unittest.mock import patch
+from ops.prune import (
+    PackagePruner,
+    PrunedPackageArchive,
+    ValidationError,
+    package_name,
+    parse_prune_options,
+)
+from tests.ops.fixtures import CONFIG_RULE_POLICY_DICT
+
+
+def create_fake_package(root, name="fakepkg"):
+    """Create an importable package with runtime and non-runtime files."""
+    files = {
+        f"{name}/__init__.py": "VALUE = 1\n",
+        f"{name}/core.py": "def run():\n    return 1\n",
+        f"{name}/core.pyi": "def run() -> int: ...\n",
+        f"{name}/README.md": "# readme\n",
+        f"{name}/tests/test_core.py": "def test_run():\n    pass\n",
+        f"{name}/docs/index.rst": "docs\n",
+        f"{name}/api/docs/__init__.py": "",
+        f"{name}/api/docs/docstring.py": "DOC = 1\n",
+    }
+    for rel, content in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fh:
+            fh.write(content)
+    return files
+
+
+def build_archive(pruner, name="fakepkg"):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        create_fake_package(temp_dir, name)
+        sys.path.insert(0, temp_dir)
+        try:
+            archive = PrunedPackageArchive([name], pruner=pruner)
+            archive.close()
+            filenames = archive.get_filenames()
+            archive.remove()
+        finally:
+            sys.path.remove(temp_dir)
+            sys.modules.pop(name, None)
+    return filenames
+
+
+def test_parse_prune_options_disabled():
+    """Test missing, null and disabled options turn pruning off."""
+    assert parse_prune_options({}) is None
+    assert parse_prune_options({"package_pruning": "null"}) is None
+    assert parse_prune_options({"package_pruning": json.dumps({"enabled": False})}) is None
+
+
+def test_parse_prune_options_defaults():
+    """Test an empty object enables pruning with defaults."""
+    assert parse_prune_options({"package_pruning": "{}"}) == {}
+
+
+def test_parse_prune_options_invalid():
+    """Test invalid pruning options raise ValidationError."""
+    with pytest.raises(ValidationError):
+        parse_prune_options({"package_pruning": "not json"})
+    with pytest.raises(ValidationError):
+        parse_prune_options({"package_pruning": "[]"})
+    with pytest.raises(ValidationError):
+        parse_prune_options({"package_pruning": json.dumps({"packages": []})})
+
+
+def test_package_name():
+    """Test top-level package extraction from archive paths."""
+    assert package_name("numpy/core/tests/test_x.py") == "numpy"
+    assert package_name("six.py") == "six.py"
+
+
+def test_should_prune_default_rules():
+    """Test the default ruleset drops non-runtime files only."""
+    pruner = PackagePruner()
+    assert pruner.should_prune("pkg/tests/test_core.py")
+    assert pruner.should_prune("pkg/core.pyi")
+    assert pruner.should_prune("pkg/docs/index.rst")
+    assert pruner.should_prune("pkg-1.0.dist-info/RECORD")
+    assert not pruner.should_prune("pkg/core.py")
+    assert not pruner.should_prune("pkg/data/schema.json")
+
+
+def test_should_prune_keeps_package_dirs():
+    """Test directory rules never prune a directory that is a package."""
+    pruner = PackagePruner()
+    pruner.add_package_dirs(["botocore/docs/__init__.py", "pkg/tests/unit/__init__.py"])
+
+    assert not pruner.should_prune("botocore/docs/docstring.py")
+    assert not pruner.should_prune("botocore/docs/bcdoc/restdoc.py")
+    assert not pruner.should_prune("pkg/tests/unit/test_core.py")
+    assert pruner.should_prune("pkg/tests/conftest.py")
+    assert pruner.should_prune("botocore/docs/index.rst")
+    assert pruner.should_prune("botocore/docs/stub.pyi")
+
+
+def test_should_prune_package_overrides():
+    """Test per-package keep, drop and enabled overrides."""
+    pruner = PackagePruner(
+        {
+            "packages": {
+                "keeper": {"keep": ["*/tests/*"]},
+                "dropper": {"drop": ["*/data/*"]},
+                "skipped": {"enabled": False},
+            }
+        }
+    )
+    assert not pruner.should_prune("keeper/tests/test_core.py")
+    assert pruner.should_prune("dropper/data/schema.json")
+    assert not pruner.should_prune("skipped/tests/test_core.py")
+    assert pruner.should_prune("other/tests/test_core.py")
+
+
+def test_pruned_archive_drops_files():
+    """Test the archive excludes pruned files and reports savings."""
+    pruner = PackagePruner()
+    filenames = build_archive(pruner)
+
+    assert "fakepkg/__init__.py" in filenames
+    assert "fakepkg/core.py" in filenames
+    assert "fakepkg/core.pyi" not in filenames
+    assert "fakepkg/README.md" not in filenames
+    assert not [f for f in filenames if "/tests/" in f or f.startswith("fakepkg/docs/")]
+    assert "fakepkg/api/docs/__init__.py" in filenames
+    assert "fakepkg/api/docs/docstring.py" in filenames
+
+    report = pruner.report()
+    assert report["fakepkg"]["files_pruned"] == 4
+    assert report["fakepkg"]["bytes_saved"] > 0
+    assert "pruned" not in report["fakepkg"]
+
+
+def test_pruned_archive_dry_run():
+    """Test a dry run keeps every file but lists what would be pruned."""
+    pruner = PackagePruner({"dry_run": True})
+    filenames = build_archive(pruner)
+
+    assert "fakepkg/core.pyi" in filenames
+    assert "fakepkg/tests/test_core.py" in filenames
+
+    report = pruner.report()
+    assert "fakepkg/core.pyi" in report["fakepkg"]["pruned"]
+    assert "fakepkg/core.py" not in report["fakepkg"]["pruned"]
+
+
+def test_pruned_sdk_archive_imports(tmp_path):
+    """Test boto3 and botocore pruned with the default rules still create a client."""
+    pruner = PackagePruner()
+    archive = PrunedPackageArchive(["botocore", "boto3"], pruner=pruner)
+    archive.close()
+    with zipfile.ZipFile(archive.path) as zf:
+        zf.extractall(tmp_path)
+    archive.remove()
+
+    assert pruner.report()["boto3"]["files_pruned"] > 0
+    assert (tmp_path / "botocore" / "docs" / "docstring.py").exists()
+
+    script = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import boto3; "
+        "assert boto3.__file__.startswith(sys.argv[1]), boto3.__file__; "
+        "boto3.client('ec2', region_name='us-east-1')"
+    )
+    # The client must not depend on a profile, make test-python sets an empty one
+    env = {k: v for k, v in os.environ.items() if k != "AWS_PROFILE"}
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(tmp_path)], capture_output=True, text=True, env=env
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_process_contents_strips_elf():
+    """Test ELF objects are stripped and the saving recorded."""
+    pruner = PackagePruner()
+    pruner.strip_command = "/usr/bin/strip"
+    contents = b"\x7fELF" + b"\x00" * 100
+
+    with patch("ops.prune.strip_debug_symbols", return_value=b"\x7fELF" + b"\x00" * 40):
+        result = pruner.process_contents("pkg/_native.so", contents)
+
+    assert len(result) == 44
+    assert pruner.report()["pkg"]["objects_stripped"] == 1
+    assert pruner.report()["pkg"]["bytes_saved"] == 60
+
+
+def test_process_contents_skips_non_elf_and_disabled():
+    """Test non-ELF files and packages with stripping disabled are untouched."""
+    pruner = PackagePruner({"packages": {"pkg": {"strip_debug": False}}})
+    pruner.strip_command = "/usr/bin/strip"
+    elf = b"\x7fELF" + b"\x00" * 100
+
+    with patch("ops.prune.strip_debug_symbols") as mock_strip:
+        assert pruner.process_contents("other/core.py", b"print(1)") == b"print(1)"
+        assert pruner.process_contents("pkg/_native.so", elf) == elf
+        mock_strip.assert_not_called()
+
+
+def test_create_custodian_archive_with_pruner():
+    """Test create_custodian_archive uses the pruned archive when given a pruner."""
+    from ops.package_lambda_policy import create_custodian_archive
+
+    archive = create_custodian_archive(packages=["json"], pruner=PackagePruner())
+    assert isinstance(archive, PrunedPackageArchive)
+
+    archive.close()
+    filenames = archive.get_filenames()
+    assert [f for f in filenames if f.startswith("c7n/")]
+    assert [f for f in filenames if f.startswith("json/")]
+
+    archive.remove()
+
+
+def test_get_required_services():
+    """Test required services come from the resource type and permissions."""
+    from ops.common import validate_with_custodian
+    from ops.prune import BASE_SERVICES, get_required_services
+    from tests.ops.fixtures import SIMPLE_PERIODIC_POLICIES_DICT
+
+    policy_instance = validate_with_custodian(SIMPLE_PERIODIC_POLICIES_DICT)
+
+    services = get_required_services(policy_instance, allowlist=["sqs"])
+
+    assert "ec2" in services
+    assert "sqs" in services
+    assert BASE_SERVICES.issubset(services)
+    assert "dynamodb" not in services
+
+
+NOTIFY_POLICY = {
+    "name": "notify-policy",
+    "resource": "ec2",
+    "mode": {"type": "periodic", "schedule": "rate(1 day)", "packages": ["boto3", "botocore"]},
+    "actions": [
+        {
+            "type": "notify",
+            "to": ["someone@example.com"],
+            "transport": {"type": "sqs", "queue": "https://sqs.us-east-1.amazonaws.com/1/q"},
+        }
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "policy, service",
+    [
+        (NOTIFY_POLICY, "iam"),
+        (NOTIFY_POLICY, "sqs"),
+        (CONFIG_RULE_POLICY_DICT, "config"),
+    ],
+)
+def test_service_models_kept_for_undeclared_calls(policy, service):
+    """Test models c7n calls without declaring a permission survive pruning."""
+    from ops.common import validate_with_custodian
+    from ops.package_lambda_policy import get_pruner
+    from ops.prune import latest_api_version
+
+    policy_instance = validate_with_custodian({"policies": [policy]})
+    pruner = get_pruner({}, ["boto3", "botocore"], policy_instance)
+
+    version = latest_api_version("botocore", service)
+    assert not pruner.should_prune(f"botocore/data/{service}/{version}/service-2.json.gz")
+    assert pruner.should_prune("botocore/data/dynamodb/2012-08-10/service-2.json.gz")
+
+
+def test_service_prefixes():
+    """Test IAM prefixes map onto the botocore services that exist."""
+    from ops.prune import service_prefixes
+
+    prefixes = service_prefixes()
+    assert prefixes["access-analyzer"] == ["accessanalyzer"]
+    assert prefixes["elasticloadbalancing"] == ["elb", "elbv2"]
+    assert prefixes["servicequotas"] == ["service-quotas"]
+    assert prefixes["mobiletargeting"] == ["pinpoint"]
+    assert prefixes["tag"] == ["resourcegroupstaggingapi"]
+    assert prefixes["timestream"] == ["timestream-query", "timestream-write"]
+    assert {"s3", "s3control"}.issubset(prefixes["s3"])
+
+
+def test_should_prune_service_models():
+    """Test unused service models and older API versions are pruned."""
+    pruner = PackagePruner()
+    pruner.set_services({"ec2", "sts"})
+
+    with patch("ops.prune.latest_api_version", return_value="2016-11-15"):
+        assert not pruner.should_prune("botocore/data/ec2/2016-11-15/service-2.json.gz")
+        assert pruner.should_prune("botocore/data/ec2/2015-10-01/service-2.json.gz")
+        assert pruner.should_prune("botocore/data/dynamodb/2012-08-10/service-2.json.gz")
+        assert pruner.should_prune("boto3/data/dynamodb/2012-08-10/resources-1.json")
+        assert not pruner.should_prune("boto3/data/ec2/2016-11-15/resources-1.json")
+        assert not pruner.should_prune("botocore/data/endpoints.json.gz")
+        assert not pruner.should_prune("botocore/client.py")
+
+
+def test_should_prune_service_models_disabled():
+    """Test service models are kept without a service set or when overridden."""
+    pruner = PackagePruner()
+    assert not pruner.should_prune("botocore/data/dynamodb/2012-08-10/service-2.json.gz")
+
+    pruner = PackagePruner({"packages": {"botocore": {"enabled": False}}})
+    pruner.set_services({"ec2"})
+    assert not pruner.should_prune("botocore/data/dynamodb/2012-08-10/service-2.json.gz")
+
+
+def test_latest_api_version():
+    """Test the newest installed API version is found for a service."""
+    from ops.prune import latest_api_version
+
+    version = latest_api_version("botocore", "ec2")
+    assert version is not None
+    assert latest_api_version("botocore", "not-a-service") is None
+
+
+def test_get_pruner_service_models():
+    """Test get_pruner only restricts service models when botocore is bundled."""
+    from ops.common import validate_with_custodian
+    from ops.package_lambda_policy import get_pruner
+    from tests.ops.fixtures import SIMPLE_PERIODIC_POLICIES_DICT
+
+    policy_instance = validate_with_custodian(SIMPLE_PERIODIC_POLICIES_DICT)
+
+    assert get_pruner(None, ["boto3"], policy_instance) is None
+    assert get_pruner({}, ["requests"], policy_instance).services is None
+    assert get_pruner({"service_models": False}, ["boto3"], policy_instance).services is None
+
+    pruner = get_pruner({"botocore_services": ["sqs"]}, ["boto3"], policy_instance)
+    assert {"ec2", "sqs"}.issubset(pruner.services)
+
+
+def test_strip_tool_version(tmp_path):
+    """Test the strip tool is identified by its version, or its digest without one."""
+    from ops.prune import strip_tool_version
+
+    assert strip_tool_version(None) is None
+
+    tool = tmp_path / "strip"
+    tool.write_text("#!/bin/sh\necho 'GNU strip (GNU Binutils) 2.40'\necho more\n")
+    tool.chmod(0o755)
+    assert strip_tool_version(str(tool)) == "GNU strip (GNU Binutils) 2.40"
+
+    broken = tmp_path / "broken-strip"
+    broken.write_text("#!/bin/sh\nexit 1\n")
+    broken.chmod(0o755)
+    assert len(strip_tool_version(str(broken))) == 64
+
+
+def test_fingerprint_options_include_strip_version():
+    """Test a different strip tool changes the fingerprint options."""
+    from ops.package_lambda_policy import get_fingerprint_options
+
+    pruner = PackagePruner()
+    pruner.strip_command = "/usr/bin/strip"
+    with patch("ops.package_lambda_policy.strip_tool_version", side_effect=["2.40", "2.42"]):
+        first = get_fingerprint_options(pruner)
+        second = get_fingerprint_options(pruner)
+
+    assert first["strip_command"] == "2.40"
+    assert first != second
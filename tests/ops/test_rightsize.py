@@ -0,0 +1,104 @@
+"""
+Unit tests for rightsize.py.
+"""
+
+import json
+
+import pytest
+
+from ops.common import ValidationError
+from ops.rightsize import parse_report, percentile, read_records, recommend, rightsize
+
+
+def report_line(duration, max_memory, memory_size=512, extra=""):
+    return (
+        f"REPORT RequestId: 3f1c0a2e-0000-4000-8000-000000000000\tDuration: {duration} ms\t"
+        f"Billed Duration: {int(duration) + 1} ms\tMemory Size: {memory_size} MB\t"
+        f"Max Memory Used: {max_memory} MB\t{extra}"
+    )
+
+
+def test_parse_report():
+    """Test REPORT lines are parsed, other lines are ignored."""
+    record = parse_report(report_line(1234.5, 150, extra="Init Duration: 612.3 ms"))
+    assert record == {
+        "duration_ms": 1234.5,
+        "memory_size_mb": 512,
+        "max_memory_mb": 150,
+        "init_ms": 612.3,
+        "timed_out": False,
+    }
+    assert parse_report(report_line(900000, 300, extra="Status: timeout"))["timed_out"]
+    assert parse_report("START RequestId: 1 Version: $LATEST") is None
+
+
+def test_read_records_formats(tmp_path):
+    """Test text, filter-log-events, Insights and c7n metadata files are read."""
+    text = tmp_path / "custodian-a.log"
+    text.write_text("START RequestId: 1\n" + report_line(1000, 100) + "\n")
+    assert [name for name, _ in read_records(str(text))] == ["custodian-a"]
+
+    events = tmp_path / "export.json"
+    events.write_text(json.dumps({"events": [{"message": report_line(1000, 100)}]}))
+    assert [name for name, _ in read_records(str(events))] == ["export"]
+
+    insights = tmp_path / "insights.json"
+    insights.write_text(
+        json.dumps(
+            [{"@log": "123456789012:/aws/lambda/custodian-b", "@message": report_line(1, 1)}]
+        )
+    )
+    assert [name for name, _ in read_records(str(insights))] == ["custodian-b"]
+
+    metadata = tmp_path / "metadata.json"
+    metadata.write_text(json.dumps({"policy": {"name": "c"}, "execution": {"duration": 2.5}}))
+    assert read_records(str(metadata)) == [("c", {"duration_ms": 2500.0, "policy": True})]
+
+    with pytest.raises(ValidationError, match="Could not read"):
+        read_records(str(tmp_path / "missing.log"))
+
+
+def test_recommend():
+    """Test memory and timeout follow the p99 with headroom and limits."""
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+
+    records = [parse_report(report_line(20000 + i * 100, 200 + i)) for i in range(20)]
+    result = recommend(records, 512, 900)
+    assert result["duration_ms"]["p50"] == 20900
+    assert result["recommended"] == {"memory": 320, "timeout": 60}
+    assert result["gb_seconds_per_invocation"]["recommended"] < (
+        result["gb_seconds_per_invocation"]["current"]
+    )
+
+    small = [parse_report(report_line(100, 60)) for _ in range(10)]
+    assert recommend(small, 512, 900)["recommended"] == {"memory": 256, "timeout": 60}
+
+    timed_out = small + [parse_report(report_line(120000, 90, extra="Status: timeout"))]
+    assert recommend(timed_out, 512, 120)["recommended"]["timeout"] == 240
+
+    assert recommend(small[:2], 512, 900)["recommended"] is None
+
+
+def test_rightsize_keys_by_policy(tmp_path):
+    """Test the report is keyed by policy name through the function prefix."""
+    log = tmp_path / "ops-a.log"
+    log.write_text("\n".join(report_line(300000, 700, memory_size=1024) for _ in range(5)))
+    other = tmp_path / "custodian-b.log"
+    other.write_text(report_line(1000, 100))
+
+    policies = {
+        "policies": [
+            {
+                "name": "a",
+                "resource": "ec2",
+                "mode": {"type": "periodic", "function-prefix": "ops-", "timeout": 600},
+            }
+        ]
+    }
+    report = rightsize([str(log), str(other)], policies)
+
+    assert report["a"]["function_name"] == "ops-a"
+    assert report["a"]["current"] == {"memory": 1024, "timeout": 600}
+    assert report["a"]["patch"] == {"mode": {"memory": 960, "timeout": 600}}
+    assert report["b"]["recommended"] is None
+    assert "patch" not in report["b"]
@@ -0,0 +1,110 @@
+"""
+Unit tests for rule_plan.py.
+"""
+
+from ops.event_match import compile_pattern
+from ops.rule_plan import (
+    canonical_pattern,
+    format_report,
+    overlap_event,
+    plan_rules,
+    verify_rule,
+    witness_events,
+)
+
+
+def policy(name, **mode):
+    return {"name": name, "resource": "ec2", "mode": mode}
+
+
+def test_canonical_pattern():
+    """Test value order, duplicates and empty objects do not change the pattern."""
+    first = {"source": ["aws.ec2", "aws.s3"], "detail": {"state": ["running"]}, "x": {}}
+    second = {"detail": {"state": ["running", "running"]}, "source": ["aws.s3", "aws.ec2"]}
+    assert canonical_pattern(first) == canonical_pattern(second)
+    assert canonical_pattern({"$or": [{"a": ["1"]}, {"b": ["2"]}]}) == canonical_pattern(
+        {"$or": [{"b": ["2"]}, {"a": ["1"]}]}
+    )
+    assert canonical_pattern({"a": [{"numeric": [">", 1, "<", 5]}]}) == {
+        "a": [{"numeric": [">", 1, "<", 5]}]
+    }
+
+
+def test_witness_events():
+    """Test built events use every value and match their pattern."""
+    pattern = {
+        "source": ["aws.ec2"],
+        "detail": {
+            "eventName": ["RunInstances", "StartInstances", "StopInstances"],
+            "count": [{"numeric": [">", 10]}],
+            "ip": [{"cidr": "10.0.0.0/8"}],
+            "arn": [{"wildcard": "arn:*:role/*"}],
+        },
+        "$or": [{"region": ["eu-west-1"]}, {"account": [{"prefix": "1"}]}],
+    }
+    events = witness_events(pattern)
+    match = compile_pattern(pattern)
+    assert all(match(event) for event in events)
+    assert {e["detail"]["eventName"] for e in events} == {
+        "RunInstances",
+        "StartInstances",
+        "StopInstances",
+    }
+    assert any("account" in e for e in events) and any("region" in e for e in events)
+
+
+def test_overlap_event():
+    """Test an event both patterns match is found only when one exists."""
+    run = {"detail": {"eventName": ["RunInstances"]}}
+    both = {"detail": {"eventName": ["RunInstances", "StopInstances"], "errorCode": [None]}}
+    stop = {"detail": {"eventName": [{"anything-but": "RunInstances"}]}}
+    assert overlap_event(run, both) == {"detail": {"errorCode": None, "eventName": "RunInstances"}}
+    assert overlap_event(run, stop) is None
+    assert overlap_event(both, stop)["detail"]["eventName"] == "StopInstances"
+
+
+def test_plan_rules():
+    """Test equivalent patterns share rules, up to five targets, and overlaps are reported."""
+    policies = {
+        "policies": [
+            policy(f"run-{i}", type="cloudtrail", events=["RunInstances"]) for i in range(6)
+        ]
+        + [
+            policy("state-a", type="ec2-instance-state", events=["running", "stopped"]),
+            policy("state-b", type="ec2-instance-state", events=["stopped", "running"]),
+            policy("run-start", type="cloudtrail", events=["RunInstances", "StartInstances"]),
+            policy("daily", type="periodic", schedule="rate(1 day)"),
+        ]
+    }
+    plan = plan_rules(policies, regions=["us-east-1", "eu-west-1"])
+
+    targets = sorted(rule["targets"] for rule in plan["rules"])
+    assert targets == [
+        ["run-0", "run-1", "run-2", "run-3", "run-4"],
+        ["run-5"],
+        ["run-start"],
+        ["state-a", "state-b"],
+    ]
+    assert plan["rules_per_region"] == {"before": 9, "after": 4, "quota": 300}
+    assert plan["rules_total"] == {"before": 18, "after": 8}
+    assert plan["reduction"] == 10
+    assert plan["overlaps"] == [
+        {
+            "policies": [
+                ["run-start"],
+                ["run-0", "run-1", "run-2", "run-3", "run-4", "run-5"],
+            ],
+            "example": "ec2.amazonaws.com:RunInstances",
+        }
+    ]
+    assert plan["verification"]["mismatches"] == 0
+
+    lines = format_report(plan)
+    assert "rules per region: 9 -> 4 (quota 300), 10 fewer across 2 region(s)" in lines
+
+
+def test_verify_rule_counts_mismatches():
+    """Test verification counts events a rule and a policy disagree on."""
+    events = [{"source": "aws.ec2"}, {"source": "aws.s3"}]
+    assert verify_rule({"source": ["aws.ec2"]}, [{"source": ["aws.ec2"]}], events) == 0
+    assert verify_rule({"source": ["aws.ec2"]}, [{"source": ["aws.s3"]}], events) == 2
@@ -0,0 +1,115 @@
+"""
+Unit tests for schedule_plan.py.
+"""
+
+import pytest
+
+from ops.common import ValidationError
+from ops.schedule_plan import (
+    expand_field,
+    firing_minutes,
+    plan_schedule,
+    plan_schedules,
+    spread_cron,
+    spread_rate,
+)
+
+
+def policy(name, schedule, resource="ec2", mode_type="periodic"):
+    return {"name": name, "resource": resource, "mode": {"type": mode_type, "schedule": schedule}}
+
+
+def test_expand_field():
+    """Test cron minute and hour fields are expanded."""
+    assert expand_field("*", 0, 3) == [0, 1, 2, 3]
+    assert expand_field("5", 0, 59) == [5]
+    assert expand_field("0/15", 0, 59) == [0, 15, 30, 45]
+    assert expand_field("*/12", 0, 23) == [0, 12]
+    assert expand_field("1-3,10", 0, 59) == [1, 2, 3, 10]
+    assert expand_field("L", 0, 59) is None
+    assert expand_field("61", 0, 59) is None
+
+
+def test_firing_minutes():
+    """Test rates start at midnight and cron minutes and hours are combined."""
+    assert len(firing_minutes("rate(1 hour)")) == 24
+    assert firing_minutes("rate(2 days)") == [0]
+    assert firing_minutes("cron(30 */12 ? * MON *)") == [30, 750]
+    assert firing_minutes("at(2030-01-01T00:00:00)") is None
+
+
+def test_spread_rate():
+    """Test rates with a period cron can express become cron expressions."""
+    assert spread_rate(15, 7) == "cron(7/15 * * * ? *)"
+    assert spread_rate(60, 42) == "cron(42 * * * ? *)"
+    assert spread_rate(360, 130) == "cron(10 2/6 * * ? *)"
+    assert spread_rate(1440, 75) == "cron(15 1 * * ? *)"
+    assert spread_rate(7, 3) is None
+    assert spread_rate(1, 0) is None
+    assert spread_rate(2880, 10) is None
+
+
+def test_spread_cron():
+    """Test the offset moves the minute without leaving the hour or step."""
+    assert spread_cron(["50", "11", "?", "*", "3", "*"], 123, 60) == (
+        "cron(53 11 ? * 3 *)",
+        3,
+    )
+    assert spread_cron(["0/15", "*", "*", "*", "?", "*"], 22, 60) == (
+        "cron(7/15 * * * ? *)",
+        7,
+    )
+    assert spread_cron(["0", "11", "?", "*", "3", "*"], 100, 5)[1] == 0
+    assert spread_cron(["*", "*", "*", "*", "?", "*"], 1, 60) is None
+    assert spread_cron(["0/7", "*", "*", "*", "?", "*"], 1, 60) is None
+
+
+def test_plan_schedule_is_deterministic():
+    """Test the same name always gets the same schedule."""
+    mode = {"type": "periodic", "schedule": "rate(1 hour)"}
+    assert plan_schedule("a", mode) == plan_schedule("a", mode)
+    assert plan_schedule("a", mode)["planned"].startswith("cron(")
+    assert 0 <= plan_schedule("a", mode, max_offset=10)["offset"] < 10
+
+
+def test_plan_schedule_flexible_window():
+    """Test schedule mode expressions that cannot be rewritten get a window."""
+    schedule_mode = {"type": "schedule", "schedule": "rate(7 days)"}
+    periodic_mode = {"type": "periodic", "schedule": "rate(7 days)"}
+
+    assert plan_schedule("a", schedule_mode)["flexible_time_window"] == 15
+    assert plan_schedule("a", schedule_mode, window=0)["flexible_time_window"] is None
+    assert plan_schedule("a", periodic_mode) == {
+        "schedule": "rate(7 days)",
+        "planned": "rate(7 days)",
+        "offset": 0,
+        "flexible_time_window": None,
+    }
+
+
+def test_plan_schedules_lowers_peaks():
+    """Test spreading hourly policies lowers the predicted peak per service."""
+    policies = [policy(f"ec2-{i}", "rate(1 hour)") for i in range(20)]
+    policies += [policy(f"ami-{i}", "rate(1 hour)", resource="ami") for i in range(5)]
+    policies += [policy("s3", "cron(0 11 ? * 3 *)", resource="s3")]
+    policies += [{"name": "trail", "resource": "ec2", "mode": {"type": "cloudtrail"}}]
+
+    plan = plan_schedules({"policies": policies}, regions=["us-east-1", "eu-west-1"])
+
+    assert set(plan["policies"]) == {p["name"] for p in policies} - {"trail"}
+    assert plan["policies"]["ami-0"]["service"] == "ec2"
+    assert plan["peaks"]["ec2"]["before"]["peak"] == 25
+    assert plan["peaks"]["ec2"]["before"]["at"] == "00:00"
+    assert plan["peaks"]["ec2"]["after"]["peak"] < 5
+    assert plan["peaks"]["s3"]["after"]["peak"] == 1
+    assert plan["schedule_plan"]["ec2-0"] == {
+        "schedule": plan["policies"]["ec2-0"]["planned"],
+        "flexible_time_window_minutes": None,
+    }
+    assert plan["not_modelled"] == []
+
+
+def test_plan_schedules_invalid_options():
+    """Test invalid options raise ValidationError."""
+    with pytest.raises(ValidationError):
+        plan_schedules({"policies": []}, max_offset=0)
@@ -111,3 +111,19 @@ def test_main_validation_error(capsys):
         assert exc_info.value.code == 1
         captured = capsys.readouterr()
         assert len(captured.err) > 0
+
+
+def test_process_templates_syntax_error():
+    """Test process_templates fails on template syntax errors."""
+    import os
+    import tempfile
+    from ops.validate_lambda_mailer import process_templates
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with open(os.path.join(temp_dir, "broken.j2"), "w") as fh:
+            fh.write("{% if resources %}unterminated")
+
+        with pytest.raises(ValidationError) as exc_info:
+            process_templates(valid_mailer_config(), temp_dir)
+
+    assert "broken.j2" in str(exc_info.value)
@@ -34,6 +34,8 @@ def test_process_policies_success():
 
     assert result["valid"] == "true"
     assert result["policy_name"] == "test-policy"
+    messages = json.loads(result["info_messages"])
+    assert any(m.startswith("Performance: about") for m in messages)
 
 
 def test_process_policies_failure():
@@ -0,0 +1,127 @@
+"""
+Unit tests for watch.py.
+"""
+
+import os
+
+import pytest
+
+from ops.common import ValidationError
+from ops.watch import PolicyWatcher, format_report, load_policy_file, stage_inputs
+from tests.ops.fixtures import EXEC_OPTIONS, ROLE, write_editable_policies
+
+
+@pytest.fixture
+def policy_file(tmp_path):
+    path = str(tmp_path / "policies.yml")
+    write_editable_policies(path)
+    return path
+
+
+def test_load_policy_file(policy_file):
+    """Test a policy file is split into single-policy documents."""
+    documents = load_policy_file(policy_file)
+
+    assert list(documents) == ["periodic-policy", "event-policy"]
+    assert documents["event-policy"]["policies"][0]["mode"]["type"] == "cloudtrail"
+
+
+def test_load_policy_file_duplicate_names(tmp_path):
+    """Test duplicate policy names in a file raise ValidationError."""
+    path = tmp_path / "dup.yml"
+    path.write_text("policies:\n  - name: a\n    resource: ec2\n  - name: a\n    resource: ec2\n")
+
+    with pytest.raises(ValidationError, match="multiple policies"):
+        load_policy_file(str(path))
+
+
+def test_stage_inputs_narrow_for_event_pattern(policy_file):
+    """Test a filter change does not change the event pattern input."""
+    before = stage_inputs(load_policy_file(policy_file)["event-policy"])
+    write_editable_policies(policy_file, state="stopped")
+    after = stage_inputs(load_policy_file(policy_file)["event-policy"])
+
+    assert "config_rule" not in before
+    assert before["event_pattern"] == after["event_pattern"]
+    assert before["validate"] == after["validate"]
+    write_editable_policies(policy_file, event="StartInstances")
+    assert stage_inputs(load_policy_file(policy_file)["event-policy"]) != before
+
+
+def test_watcher_reruns_changed_stages_only(policy_file):
+    """Test only the stages of the edited policy run again."""
+    watcher = PolicyWatcher(
+        [policy_file],
+        role=ROLE,
+        execution_options=EXEC_OPTIONS,
+        stages=["validate", "event_pattern"],
+    )
+
+    first = watcher.check()
+    assert set(first) == {"periodic-policy", "event-policy"}
+    assert set(first["event-policy"]) == {"validate", "event_pattern"}
+    assert first["event-policy"]["event_pattern"]["old"] is None
+    assert watcher.check() == {}
+
+    write_editable_policies(policy_file, event="StartInstances")
+    second = watcher.check()
+
+    assert set(second) == {"event-policy"}
+    pattern = second["event-policy"]["event_pattern"]
+    assert pattern["old"] == first["event-policy"]["event_pattern"]["new"]
+    assert pattern["new"] != pattern["old"]
+    assert second["event-policy"]["validate"]["old"] == second["event-policy"]["validate"]["new"]
+    assert "event-policy: validate" in format_report(second)[0]
+
+
+def test_watcher_reports_errors_and_removals(policy_file):
+    """Test an invalid policy stops its later stages and removed policies are reported."""
+    watcher = PolicyWatcher([policy_file], role=ROLE, stages=["validate", "event_pattern"])
+    watcher.check()
+
+    with open(policy_file, "w") as fh:
+        fh.write("policies:\n  - name: periodic-policy\n    resource: ec2\n    mode:\n")
+        fh.write("      type: not-a-mode\n")
+    report = watcher.check()
+
+    assert report["event-policy"] == {"removed": {}}
+    assert "error" in report["periodic-policy"]["validate"]
+    assert "FAILED" in "\n".join(format_report(report))
+
+    write_editable_policies(policy_file)
+    report = watcher.check()
+    assert set(report) == {"periodic-policy", "event-policy"}
+    assert "error" not in report["periodic-policy"]["validate"]
+
+
+def test_watcher_packages_policy(policy_file):
+    """Test the package stage reports the archive hash delta."""
+    watcher = PolicyWatcher(
+        [policy_file], role=ROLE, execution_options=EXEC_OPTIONS, stages=["package"]
+    )
+
+    first = watcher.check()["periodic-policy"]["package"]
+    write_editable_policies(policy_file, state="stopped")
+    report = watcher.check()
+
+    assert set(report) == {"periodic-policy"}
+    assert report["periodic-policy"]["package"]["old"] == first["new"]
+    assert report["periodic-policy"]["package"]["new"] != first["new"]
+    assert os.path.isdir(os.path.join("build", "custodian-periodic-policy"))
+
+
+def test_watcher_rejects_unknown_stages(policy_file, capsys):
+    """Test a misspelt stage fails with the valid stage names."""
+    from unittest.mock import patch
+    from ops.watch import main
+
+    with pytest.raises(ValidationError, match="Unknown stages: pakage"):
+        PolicyWatcher([policy_file], stages=["validate", "pakage"])
+
+    with patch("sys.argv", ["watch", policy_file, "--stages", "pakage", "--once"]):
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+    assert exc_info.value.code == 1
+    assert (
+        "Valid stages are: validate, package, event_pattern, config_rule" in capsys.readouterr().err
+    )
@@ -58,3 +58,96 @@ variable "force_deploy" {
   type        = bool
   default     = false
 }
+
+variable "package_pruning" {
+  description = <<EOT
+    Optional: Prune non-runtime files (tests, type stubs, docs, dist-info) and debug symbols from packages in `mode.packages`. Directories with an `__init__.py` are never pruned.
+    Set to `{}` to enable with the default ruleset. Supports `rules`, `strip_debug`, `dry_run` and per-package overrides under `packages`.
+    When `boto3` or `botocore` are bundled, service models the policy does not use are dropped; keep extra ones with `botocore_services` or disable with `service_models = false`.
+  EOT
+  type        = any
+  default     = null
+}
+
+variable "archive_size_budget" {
+  description = <<EOT
+    Optional: Size limits checked against an estimate of the archive before it is built, `compressed_mb` (default 50) and `uncompressed_mb` (default 250).
+    Packaging fails early with the size of each package when the estimate exceeds them. Set `enabled = false` to skip the check.
+  EOT
+  type        = any
+  default     = null
+}
+
+variable "tags_in_archive" {
+  description = <<EOT
+    Write tags, including custodian-info and force-deploy, to the archived config.json.
+    Set to false to apply tags to the Lambda function only, so tag and force_deploy changes do not change source_code_hash.
+  EOT
+  type        = bool
+  default     = true
+}
+
+variable "hash_only" {
+  description = <<EOT
+    For speculative plans that are never applied: report the archive hash recorded for unchanged inputs without building the zip.
+    An archive is still built when no hash has been recorded for the inputs.
+  EOT
+  type        = bool
+  default     = false
+}
+
+variable "bundle_name" {
+  description = "Optional: Name of the bundle, used for the function name in place of the policy name. Defaults to `bundle-` and the first bundled policy name."
+  type        = string
+  default     = ""
+}
+
+variable "bundle_policy_names" {
+  description = <<EOT
+    Optional: Deploy these periodic or schedule policies as one function running them in one interpreter, instead of `policy_name`.
+    The policies must have the same mode apart from tags, `python3 -m ops.bundle` lists the groups that do.
+  EOT
+  type        = list(string)
+  default     = []
+}
+
+variable "bundle_concurrency" {
+  description = "Number of bundled policies run at once. With 1 they run one after another in the listed order."
+  type        = number
+  default     = 1
+
+  validation {
+    condition     = var.bundle_concurrency >= 1 && var.bundle_concurrency <= 32
+    error_message = "bundle_concurrency must be between 1 and 32."
+  }
+}
+
+variable "schedule" {
+  description = "Optional: Schedule expression replacing `mode.schedule`, such as one planned by `python3 -m ops.schedule_plan` to spread policies that fire at the same time."
+  type        = string
+  default     = ""
+}
+
+variable "flexible_time_window_minutes" {
+  description = "Optional: For schedule mode, let the scheduler invoke the function up to this many minutes after the scheduled time."
+  type        = number
+  default     = null
+}
+
+variable "policy_snapshot" {
+  description = <<EOT
+    Package a pre-resolved snapshot of the policy with a handler that uses it.
+    Resource modules are imported while the function initializes and the account id is read from the function ARN instead of an STS call.
+  EOT
+  type        = bool
+  default     = false
+}
+
+variable "remote_cache" {
+  description = <<EOT
+    Optional: Shared archive cache for CI runners, either a directory (path or file:// URL) or an HTTP URL accepting GET and PUT.
+    Archives are fetched on a hit, verified against their recorded hash, and uploaded after a build on a miss.
+  EOT
+  type        = string
+  default     = ""
+}